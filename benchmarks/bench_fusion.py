@@ -0,0 +1,55 @@
+"""
+Measures the per-element overhead of asynchronous iterations through chains of
+stateless stages, as a function of the chain length, with and without link fusion.
+
+    python benchmarks/bench_fusion.py [num_elements]
+"""
+import asyncio
+from functools import reduce
+from operator import or_
+from pathlib import Path
+import sys
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from itercat import Chain, filter, map  # noqa
+
+
+async def _count(n: int):
+    for i in range(n):
+        yield i
+
+
+def stages(length: int) -> Chain:
+    return reduce(
+        or_,
+        [
+            map(lambda x: x + 1) if i % 2 == 0 else filter(lambda x: x >= 0)
+            for i in range(length)
+        ]
+    )
+
+
+def time_per_element(chain: Chain, num_elements: int) -> float:
+    async def _consume() -> None:
+        async for _ in _count(num_elements) > chain:
+            pass
+
+    start = perf_counter()
+    asyncio.run(_consume())
+    return (perf_counter() - start) / num_elements
+
+
+def main(num_elements: int) -> None:
+    for length in [1, 2, 5, 10, 20]:
+        chain = stages(length)
+        unfused = time_per_element(chain.unfused(), num_elements)
+        fused = time_per_element(chain, num_elements)
+        print(
+            f"{length:>3} stages: unfused {unfused * 1e9:8.0f} ns/element | "
+            f"fused {fused * 1e9:8.0f} ns/element | speedup {unfused / fused:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
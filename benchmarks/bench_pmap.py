@@ -0,0 +1,42 @@
+"""
+Compares pmap with plain map on a CPU-bound function.
+
+    python benchmarks/bench_pmap.py [num_elements]
+"""
+import os
+from pathlib import Path
+import sys
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from itercat import map, pmap  # noqa
+
+
+def burn(n: int) -> int:
+    total = 0
+    for i in range(20_000):
+        total += (n * i) % 7
+    return total
+
+
+def elapsed(chain, num_elements: int) -> float:
+    start = perf_counter()
+    for _ in range(num_elements) > chain:
+        pass
+    return perf_counter() - start
+
+
+def main(num_elements: int) -> None:
+    baseline = elapsed(map(burn), num_elements)
+    print(f"map:                         {baseline:7.3f} s")
+    for workers in sorted({2, os.cpu_count() or 1}):
+        for chunksize in [1, 16, 128]:
+            t = elapsed(pmap(burn, workers, chunksize), num_elements)
+            print(
+                f"pmap {workers:>2} workers, chunks of {chunksize:>3}: {t:7.3f} s "
+                f"(speedup {baseline / t:5.2f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,45 @@
+"""
+Measures the overhead of iterating synchronously over short asynchronous chains,
+with a thread and event loop started per iteration versus a shared runtime.
+
+    python benchmarks/bench_runtime.py [num_iterations]
+"""
+from pathlib import Path
+import sys
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from itercat import map, Runtime  # noqa
+
+
+async def _few(n: int):
+    for i in range(n):
+        yield i
+
+
+def time_per_iteration(num_iterations: int, num_elements: int) -> float:
+    chain = map(lambda x: x + 1)
+    start = perf_counter()
+    for _ in range(num_iterations):
+        for _ in _few(num_elements) > chain:
+            pass
+    return (perf_counter() - start) / num_iterations
+
+
+def main(num_iterations: int) -> None:
+    for num_elements in [0, 10, 1000]:
+        dedicated = time_per_iteration(num_iterations, num_elements)
+        with Runtime():
+            shared = time_per_iteration(num_iterations, num_elements)
+        with Runtime(num_loops=4):
+            pool = time_per_iteration(num_iterations, num_elements)
+        print(
+            f"{num_elements:>5} elements per iteration: "
+            f"dedicated thread {dedicated * 1e6:9.1f} us | "
+            f"shared loop {shared * 1e6:9.1f} us | "
+            f"pool of 4 loops {pool * 1e6:9.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
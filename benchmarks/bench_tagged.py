@@ -0,0 +1,72 @@
+"""
+Measures the memory and time it takes to tag elements, comparing the slotted Tagged
+with the plain dataclass it replaced, tagged through a subscripted generic on every
+call as tag() used to, and the time to sort tagged elements through their
+comparison methods versus by label.
+
+    python benchmarks/bench_tagged.py [num_elements]
+"""
+from dataclasses import dataclass
+from pathlib import Path
+import sys
+from time import perf_counter
+import tracemalloc
+from typing import Any, Generic, TypeVar
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from itercat import Chain, map, sort, Tagged  # noqa
+
+L = TypeVar("L")
+U = TypeVar("U")
+
+
+@dataclass
+class TaggedDict(Generic[L, U]):
+    label: L
+    data: U
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, type(self)):
+            return False
+        return self.label == other.label
+
+    def __lt__(self, other: "TaggedDict[L, U]") -> bool:
+        return self.label < other.label
+
+
+def bytes_per_element(tagging: Chain, num_elements: int) -> float:
+    elements = list(range(num_elements))
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    kept = list(elements > tagging)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return (after - before) / num_elements
+
+
+def time_per_element(chain: Chain, num_elements: int) -> float:
+    start = perf_counter()
+    for _ in range(num_elements) > chain:
+        pass
+    return (perf_counter() - start) / num_elements
+
+
+def main(num_elements: int) -> None:
+    tagging_before = map(lambda n: TaggedDict[int, int](n % 1000, n))
+    tagging_after = map(lambda n: Tagged(n % 1000, n))
+    for name, tagging in [("dataclass", tagging_before), ("slotted", tagging_after)]:
+        size = bytes_per_element(tagging, num_elements)
+        duration = time_per_element(tagging, num_elements)
+        print(
+            f"{name:>10}: {size:6.1f} bytes/element | "
+            f"{duration * 1e9:6.0f} ns/element to tag"
+        )
+
+    for name, tagging in [("__lt__", tagging_before), ("by label", tagging_after)]:
+        duration = time_per_element(tagging | sort, num_elements)
+        print(f"{name:>10}: {duration * 1e9:6.0f} ns/element to tag and sort")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,322 @@
+"""
+Measures the throughput (elements per second) and peak memory of each core stage,
+fed synchronous and asynchronous sources of various sizes, next to equivalent code
+written with itertools and builtins. Also measures how throughput evolves with
+the length of chains, and the cost of handing off an asynchronous iteration to a
+synchronous consumer through a thread.
+
+Results go out as JSON, which a later run can compare against:
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --compare before.json
+"""
+from argparse import ArgumentParser
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import functools
+import itertools as it
+import json
+from operator import add, or_
+from pathlib import Path
+import platform
+import subprocess
+import sys
+from time import perf_counter
+import tracemalloc
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from itercat import (  # noqa
+    batch,
+    Chain,
+    concurrently,
+    cumulate,
+    dispatch,
+    extend,
+    filter,
+    iter_through_thread,
+    map,
+    ngrams,
+    reduce,
+    reverse,
+    slice_,
+    sort,
+    tail,
+)
+
+
+Baseline = Callable[[Iterable[int]], Iterable[Any]]
+
+
+def _batched(elements: Iterable[int], n: int) -> Iterator[tuple[int, ...]]:
+    elements_ = iter(elements)
+    return iter(lambda: tuple(it.islice(elements_, n)), ())
+
+
+def _triples(elements: Iterable[int]) -> Iterator[tuple[int, ...]]:
+    window: deque[int] = deque(maxlen=3)
+    for x in elements:
+        window.append(x)
+        if len(window) == 3:
+            yield tuple(window)
+
+
+def _reduced(elements: Iterable[int]) -> list[int]:
+    return [functools.reduce(add, elements)]
+
+
+@dataclass
+class Case:
+    name: str
+    chain: Callable[[int], Chain]
+    baseline: Callable[[int], Baseline]
+
+
+CASES = [
+    Case("map", lambda n: map(lambda x: x + 1), lambda n: lambda xs: (x + 1 for x in xs)),
+    Case(
+        "filter",
+        lambda n: filter(lambda x: x % 2 == 0),
+        lambda n: lambda xs: (x for x in xs if x % 2 == 0)
+    ),
+    Case("batch", lambda n: batch(16), lambda n: lambda xs: _batched(xs, 16)),
+    Case("ngrams", lambda n: ngrams(3), lambda n: _triples),
+    Case(
+        "slice_",
+        lambda n: slice_(10, n - 10, 2),
+        lambda n: lambda xs: it.islice(xs, 10, n - 10, 2)
+    ),
+    Case("tail", lambda n: tail(100), lambda n: lambda xs: deque(xs, maxlen=100)),
+    Case("sort", lambda n: sort, lambda n: sorted),
+    Case("reverse", lambda n: reverse, lambda n: lambda xs: reversed(list(xs))),
+    Case("cumulate", lambda n: cumulate(add, None), lambda n: lambda xs: it.accumulate(xs, add)),
+    Case("reduce", lambda n: reduce(add, None), lambda n: _reduced),
+    Case(
+        "extend",
+        lambda n: extend(range(n)),
+        lambda n: lambda xs: it.chain(xs, range(n))
+    ),
+]
+
+
+def values(n: int) -> list[int]:
+    return [i * 7919 % n for i in range(n)]
+
+
+async def _each_async(elements: Iterable[int]) -> Any:
+    for x in elements:
+        yield x
+
+
+def source(elements: list[int], kind: str) -> Any:
+    # Plain iterators rather than lists, so positional stages don't get pushed down.
+    return iter(elements) if kind == "sync" else _each_async(elements)
+
+
+def consume(elements: Iterable[Any]) -> int:
+    n = 0
+    for _ in elements:
+        n += 1
+    return n
+
+
+def best_elapsed(run: Callable[[], Any], repeat: int) -> float:
+    elapsed = []
+    for _ in range(repeat):
+        start = perf_counter()
+        run()
+        elapsed.append(perf_counter() - start)
+    return min(elapsed)
+
+
+def peak_memory(run: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure(run: Callable[[], Any], num_elements: int, repeat: int) -> dict[str, float]:
+    return {
+        "elements_per_sec": num_elements / best_elapsed(run, repeat),
+        "peak_bytes": peak_memory(run),
+    }
+
+
+def bench_stages(sizes: list[int], repeat: int) -> Iterator[dict[str, Any]]:
+    for case in CASES:
+        for n in sizes:
+            elements = values(n)
+            for kind in ["sync", "async"]:
+                chain = case.chain(n)
+                yield {
+                    "bench": "stage",
+                    "stage": case.name,
+                    "source": kind,
+                    "num_elements": n,
+                    **measure(lambda: consume(source(elements, kind) > chain), n, repeat),
+                }
+            baseline = case.baseline(n)
+            yield {
+                "bench": "stage",
+                "stage": case.name,
+                "source": "baseline",
+                "num_elements": n,
+                **measure(lambda: consume(baseline(iter(elements))), n, repeat),
+            }
+
+
+def bench_dispatch(sizes: list[int], repeat: int) -> Iterator[dict[str, Any]]:
+    chain = dispatch(map(lambda x: x + 1), filter(lambda x: x % 2 == 0))
+
+    def _dispatched(n: int) -> int:
+        iterations: Any = concurrently(_each_async(range(n)), _each_async(range(n))) > chain
+        return sum(consume(iteration) for iteration in iterations)
+
+    def _baseline(n: int) -> int:
+        return consume(x + 1 for x in range(n)) + consume(x for x in range(n) if x % 2 == 0)
+
+    for n in sizes:
+        for kind, run in [("async", _dispatched), ("baseline", _baseline)]:
+            yield {
+                "bench": "stage",
+                "stage": "dispatch",
+                "source": kind,
+                "num_elements": 2 * n,
+                **measure(functools.partial(run, n), 2 * n, repeat),
+            }
+
+
+def bench_lengths(sizes: list[int], repeat: int) -> Iterator[dict[str, Any]]:
+    n = max(sizes)
+    elements = values(n)
+    for length in [1, 2, 5, 10, 20]:
+        chain: Chain = functools.reduce(or_, [map(lambda x: x + 1)] * length)
+
+        def _baseline() -> int:
+            xs: Iterable[int] = iter(elements)
+            for _ in range(length):
+                xs = (x + 1 for x in xs)
+            return consume(xs)
+
+        for kind in ["sync", "async"]:
+            yield {
+                "bench": "length",
+                "length": length,
+                "source": kind,
+                "num_elements": n,
+                **measure(lambda: consume(source(elements, kind) > chain), n, repeat),
+            }
+        yield {
+            "bench": "length",
+            "length": length,
+            "source": "baseline",
+            "num_elements": n,
+            **measure(_baseline, n, repeat),
+        }
+
+
+def bench_bridge(sizes: list[int], repeat: int) -> Iterator[dict[str, Any]]:
+    async def _consume_async(elements: list[int]) -> int:
+        n = 0
+        async for _ in _each_async(elements):
+            n += 1
+        return n
+
+    for n in sizes:
+        elements = values(n)
+        for kind, run in [
+            ("event loop", lambda: asyncio.run(_consume_async(elements))),
+            ("thread", lambda: consume(iter_through_thread(_each_async(elements)))),
+        ]:
+            yield {
+                "bench": "bridge",
+                "source": kind,
+                "num_elements": n,
+                **measure(run, n, repeat),
+            }
+
+
+def key_of(result: dict[str, Any]) -> tuple:
+    return tuple(
+        result.get(field)
+        for field in ["bench", "stage", "length", "source", "num_elements"]
+    )
+
+
+def describe(result: dict[str, Any]) -> str:
+    return " ".join(
+        str(result[field])
+        for field in ["bench", "stage", "length", "source", "num_elements"]
+        if field in result
+    )
+
+
+def commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict[str, Any]], path: Path) -> None:
+    before = {key_of(r): r for r in json.loads(path.read_text())["results"]}
+    for result in results:
+        previous = before.get(key_of(result))
+        if previous is None:
+            continue
+        speed = result["elements_per_sec"] / previous["elements_per_sec"]
+        memory = result["peak_bytes"] / max(previous["peak_bytes"], 1)
+        print(
+            f"{describe(result):<40} speed {speed:5.2f}x | memory {memory:5.2f}x",
+            file=sys.stderr
+        )
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000", help="Comma-separated counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs kept at best")
+    parser.add_argument("--output", type=Path, help="JSON file (default: standard output)")
+    parser.add_argument("--compare", type=Path, help="JSON file of an earlier run")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = []
+    for bench in [bench_stages, bench_dispatch, bench_lengths, bench_bridge]:
+        for result in bench(sizes, args.repeat):
+            print(
+                f"{describe(result):<40} {result['elements_per_sec']:14,.0f} elements/s "
+                f"| {result['peak_bytes']:12,} bytes",
+                file=sys.stderr
+            )
+            results.append(result)
+
+    report = {
+        "commit": commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": datetime.now(timezone.utc).isoformat(),
+        "results": results,
+    }
+    if args.compare is not None:
+        compare(results, args.compare)
+    if args.output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,56 @@
+from array import array
 import asyncio
+from asyncio import FIRST_COMPLETED
+import builtins
+from collections import deque
 from collections.abc import (
     AsyncIterable,
     AsyncIterator,
+    Awaitable,
     Callable,
+    Coroutine,
+    Generator,
     Hashable,
     Iterable,
     Iterator,
+    Mapping,
+    Sequence,
 )
-from dataclasses import dataclass
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait as wait_futures,
+)
+from contextlib import contextmanager, ExitStack
+from contextvars import ContextVar, Token
+import copy
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+import hashlib
+import heapq
 import itertools as it
+import math
+import mmap
+import multiprocessing
+import operator
+import os
+from pathlib import Path
+import pickle
 from queue import Queue
-from threading import Thread
+import random
+import re
+import sys
+import tempfile
+from threading import current_thread, Event, get_ident, Lock, Thread
+from time import monotonic, perf_counter
+import weakref
 from typing import (
     Any,
     cast,
     Generic,
+    IO,
     Never,
     Optional,
     Protocol,
@@ -23,6 +59,11 @@ from typing import (
     Union
 )
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
 
 S = TypeVar("S", contravariant=True)
 T = TypeVar("T", covariant=True)
@@ -36,32 +77,318 @@ class _EndOfIteration:
 _end_of_iteration = _EndOfIteration()
 
 
-def iter_through_thread(it: AsyncIterable[T]) -> Iterator[T]:
-    q: Queue[T | _ExceptionInIteration | _EndOfIteration] = Queue()
+@dataclass
+class _ExceptionInIteration:
+    exception: Exception
+
+
+@dataclass(frozen=True)
+class Handoff:
+    """
+    Settings for moving elements from an asynchronous iteration run in a thread to
+    its synchronous consumer. Elements are moved in chunks of up to `size_chunk`
+    elements, and at most `capacity` chunks wait for the consumer, past which the
+    producer blocks. An incomplete chunk is nonetheless handed off once its first
+    element has waited `latency` seconds.
+    """
+    capacity: int = 16
+    size_chunk: int = 128
+    latency: float = 0.01
+
+    def __post_init__(self) -> None:
+        if self.capacity < 1:
+            raise ValueError(f"Capacity must be at least 1 (got {self.capacity})")
+        if self.size_chunk < 1:
+            raise ValueError(f"Chunk size must be at least 1 (got {self.size_chunk})")
+        if self.latency < 0.0:
+            raise ValueError(f"Latency cannot be negative (got {self.latency})")
+
+
+HANDOFF_DEFAULT = Handoff()
+
+
+class Runtime:
+    """
+    Pool of long-lived event loop threads onto which synchronous iterations schedule
+    the transfer of their elements, instead of starting a thread and an event loop
+    for each iteration. A runtime is used by iterations started while it is active,
+    which it is within a `with` block:
+
+        with Runtime(num_loops=2):
+            for x in iteration:
+                ...
+
+    Leaving the block that started the runtime shuts it down, cancelling the transfers
+    still running. Other threads (or tasks) share a running runtime by activating it
+    for themselves, through `with runtime.activate()` or another `with runtime`
+    block, neither of which shuts it down. A runtime made the default through
+    `set_runtime_default` is active wherever no other is.
+    """
+
+    def __init__(self, num_loops: int = 1) -> None:
+        if num_loops < 1:
+            raise ValueError(f"A runtime needs at least one loop (got {num_loops})")
+        self._num_loops = num_loops
+        self._loops: list[asyncio.AbstractEventLoop] = []
+        self._threads: list[Thread] = []
+        self._round_robin: Iterator[asyncio.AbstractEventLoop] = iter(())
+        self._lock = Lock()
 
-    async def transfer_to_queue():
+    @property
+    def is_running(self) -> bool:
+        return bool(self._loops)
+
+    def start(self) -> "Runtime":
+        self._start()
+        return self
+
+    def _start(self) -> bool:
+        with self._lock:
+            if self._loops:
+                return False
+            for i in range(self._num_loops):
+                loop = asyncio.new_event_loop()
+                th = Thread(
+                    target=self._run_loop,
+                    args=(loop,),
+                    name=f"itercat-runtime-{i}",
+                    daemon=True
+                )
+                th.start()
+                self._loops.append(loop)
+                self._threads.append(th)
+            self._round_robin = it.cycle(self._loops)
+            return True
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+        asyncio.set_event_loop(loop)
+        loop.run_forever()
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for loop in self._loops:
+                loop.call_soon_threadsafe(loop.stop)
+            for th in self._threads:
+                th.join()
+            self._loops.clear()
+            self._threads.clear()
+            self._round_robin = iter(())
+
+    def is_running_here(self) -> bool:
+        return current_thread() in self._threads
+
+    def submit(self, coro: Coroutine[Any, Any, U]) -> Future[U]:
+        with self._lock:
+            if not self._loops:
+                raise RuntimeError("This runtime is not running")
+            loop = next(self._round_robin)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    @contextmanager
+    def activate(self) -> Iterator["Runtime"]:
+        """
+        Makes this runtime the active one in the current context for the duration of
+        the block, without starting it nor shutting it down.
+        """
+        token = _runtime_active.set(self)
         try:
-            async for x in aiter(it):
-                q.put(x)
-            q.put(_end_of_iteration)
-        except Exception as ex:
-            q.put(_ExceptionInIteration(ex))
+            yield self
+        finally:
+            _runtime_active.reset(token)
+
+    def __enter__(self) -> "Runtime":
+        owning = self._start()
+        _runtime_entered.set(
+            _runtime_entered.get() + ((self, _runtime_active.set(self), owning),)
+        )
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        *entered, (runtime, token, owning) = _runtime_entered.get()
+        if runtime is not self:
+            raise RuntimeError("Runtimes must be exited in the reverse order of entry")
+        _runtime_entered.set(tuple(entered))
+        _runtime_active.reset(token)
+        if owning:
+            self.shutdown()
+
+
+# Each thread (and each asyncio task) sees the runtime it activated, if any.
+_runtime_active: ContextVar[Optional[Runtime]] = ContextVar("_runtime_active", default=None)
+# Runtimes entered as context managers in the current context, innermost last, along
+# with the token resetting their activation and whether their block started them.
+_runtime_entered: ContextVar[tuple[tuple[Runtime, Token[Optional[Runtime]], bool], ...]] = (
+    ContextVar("_runtime_entered", default=())
+)
+_runtime_default: Optional[Runtime] = None
 
-    def run_transfer():
-        asyncio.run(transfer_to_queue())
 
-    th = Thread(target=run_transfer)
-    th.start()
-    while (_x := q.get()) is not _end_of_iteration:
-        if isinstance(_x, _ExceptionInIteration):
-            raise cast(_ExceptionInIteration, _x).exception
-        yield cast(T, _x)
-    th.join()
+def runtime_active() -> Optional[Runtime]:
+    runtime = _runtime_active.get()
+    return _runtime_default if runtime is None else runtime
 
 
-@dataclass
-class _ExceptionInIteration:
-    exception: Exception
+def set_runtime_default(runtime: Optional[Runtime]) -> Optional[Runtime]:
+    """
+    Makes the given runtime active in every thread where no other runtime is, for
+    services that share one runtime across threads they don't start themselves.
+    Returns the previous default. The owner of the runtime still shuts it down.
+    """
+    global _runtime_default
+    runtime_previous, _runtime_default = _runtime_default, runtime
+    return runtime_previous
+
+
+class _Transfer(Generic[U]):
+    """
+    Moves the elements of an asynchronous iteration, run on some event loop, to a
+    synchronous consumer in another thread, following given hand-off settings.
+    """
+
+    def __init__(self, handoff: Handoff) -> None:
+        self._handoff = handoff
+        # One extra slot for reporting the transfer's cancellation.
+        self._queue: Queue[list[U] | _ExceptionInIteration | _EndOfIteration] = Queue(
+            handoff.capacity + 1
+        )
+        self._stopping = Event()
+        self._done = Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._room = asyncio.Event()
+        self.high_water = 0
+
+    async def _put(self, item: list[U] | _ExceptionInIteration | _EndOfIteration) -> None:
+        while not self._stopping.is_set():
+            self._room.clear()
+            if self._queue.qsize() < self._handoff.capacity:
+                self._queue.put_nowait(item)
+                self.high_water = max(self.high_water, self._queue.qsize())
+                return
+            await self._room.wait()
+
+    async def run(self, aiterable: AsyncIterable[U]) -> None:
+        self._loop = loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        capacity, size_chunk, latency = (
+            self._handoff.capacity,
+            self._handoff.size_chunk,
+            self._handoff.latency
+        )
+        chunk: list[U] = []
+        timer: Optional[asyncio.TimerHandle] = None
+        iterator = aiter(aiterable)
+
+        def flush_on_time():
+            nonlocal chunk, timer
+            if self._queue.qsize() < capacity:
+                self._queue.put_nowait(chunk)
+                self.high_water = max(self.high_water, self._queue.qsize())
+                chunk = []
+                timer = None
+            else:
+                timer = loop.call_later(latency, flush_on_time)
+
+        async def flush():
+            nonlocal chunk, timer
+            if timer is not None:
+                timer.cancel()
+                timer = None
+            if chunk:
+                chunk_full, chunk = chunk, []
+                await self._put(chunk_full)
+
+        try:
+            async for x in iterator:
+                if self._stopping.is_set():
+                    return
+                chunk.append(x)
+                if len(chunk) >= size_chunk:
+                    await flush()
+                elif timer is None:
+                    timer = loop.call_later(latency, flush_on_time)
+            await flush()
+            await self._put(_end_of_iteration)
+        except asyncio.CancelledError:
+            if not self._stopping.is_set():
+                raise
+        except Exception as ex:
+            await flush()
+            await self._put(_ExceptionInIteration(ex))
+        finally:
+            if timer is not None:
+                timer.cancel()
+            try:
+                # Close the iteration here, on its own loop, whether it ended or the
+                # consumer stopped early.
+                if (aclose := getattr(iterator, "aclose", None)) is not None:
+                    await aclose()
+            finally:
+                self._done.set()
+
+    def on_cancelled(self, future: Future) -> None:
+        if future.cancelled():
+            self._queue.put_nowait(
+                _ExceptionInIteration(RuntimeError("Iteration cancelled by its runtime"))
+            )
+            self._done.set()
+
+    def wait(self) -> None:
+        """
+        Waits until the asynchronous iteration is over and closed.
+        """
+        self._done.wait()
+
+    def _call_on_loop(self, fn: Callable[[], Any]) -> None:
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(fn)
+            except RuntimeError:
+                pass  # The event loop is already closed: the transfer is over.
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._call_on_loop(self._task.cancel)
+
+    def __iter__(self) -> Iterator[U]:
+        threshold_notify = self._handoff.capacity - 1
+        try:
+            while (_x := self._queue.get()) is not _end_of_iteration:
+                if self._queue.qsize() >= threshold_notify:
+                    self._call_on_loop(self._room.set)
+                if isinstance(_x, _ExceptionInIteration):
+                    raise cast(_ExceptionInIteration, _x).exception
+                yield from cast(list[U], _x)
+        finally:
+            self.stop()
+
+
+def iter_through_thread(
+    it: AsyncIterable[T],
+    handoff: Handoff = HANDOFF_DEFAULT
+) -> Iterator[T]:
+    return _iter_through_transfer(it, _Transfer[T](handoff))
+
+
+def _iter_through_transfer(it: AsyncIterable[T], transfer: _Transfer[T]) -> Iterator[T]:
+    runtime = runtime_active()
+    if runtime is None or runtime.is_running_here():
+        th = Thread(target=asyncio.run, args=(transfer.run(it),))
+        th.start()
+        yield from transfer
+        th.join()
+    else:
+        future = runtime.submit(transfer.run(it))
+        future.add_done_callback(transfer.on_cancelled)
+        yield from transfer
 
 
 class IteratorBicolor(Protocol[T]):
@@ -82,6 +409,7 @@ def is_iterator_bicolor(x: Any) -> bool:
 @dataclass
 class WrapperBicolor(Generic[T]):
     _aiterable: AsyncIterable[T]
+    handoff: Handoff = HANDOFF_DEFAULT
 
     @property
     def _aiter(self) -> AsyncIterator[T]:
@@ -91,12 +419,13 @@ class WrapperBicolor(Generic[T]):
         return self._aiter
 
     def __iter__(self) -> Iterator[T]:
-        yield from iter_through_thread(self._aiter)
+        yield from iter_through_thread(self._aiter, self.handoff)
 
 
 Input = (
     AsyncIterable[T] | AsyncIterator[T] | Iterable[T] | Iterator[T] | IteratorBicolor[T]
 )
+Path_ = Union[str, os.PathLike]
 
 
 def as_iterator_bicolor(input: Input[T]) -> IteratorBicolor[T]:
@@ -113,49 +442,827 @@ def as_iterator_bicolor(input: Input[T]) -> IteratorBicolor[T]:
 
 
 Link = Callable[[AsyncIterable[S]], AsyncIterator[T]]
+LinkSync = Callable[[Iterable[S]], Iterator[T]]
+
+
+class Resumable(Protocol):
+    """
+    Stateful processing of a single iteration, that takes in elements one at a time
+    and keeps its state up to date after each, so that the state can be snapshot
+    between any two elements, and restored into a fresh instance to resume from
+    there. Snapshots must pickle. They get pickled in the background as the
+    iteration goes on, so they must not share anything that later elements change.
+    """
+
+    def snapshot(self) -> Any:
+        ...
+
+    def restore(self, state: Any) -> None:
+        ...
+
+    def run(self, elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        ...
+
+    def run_sync(self, elements: Iterable[Any]) -> Iterator[Any]:
+        ...
+
+
+@dataclass
+class Stage(Generic[S, T]):
+    """
+    Link that also knows how to process a synchronous iteration, so that a chain
+    fed a plain iterable can run entirely in the calling thread.
+
+    Stateless stages built by this module's factories also describe their operation
+    as `fusion`, so that consecutive such stages can be fused into a single loop.
+    Positional stages describe as `seek` how they select among the indices of their
+    input, so that they can be pushed down to sequence inputs. Stateful stages that
+    can be checkpointed make a `Resumable` for each iteration through `resumable`.
+    """
+    asynchronous: Link[S, T]
+    synchronous: Optional[LinkSync[S, T]] = None
+    fusion: Optional[tuple[str, Callable[..., Any]]] = None
+    seek: Optional[Callable[[range], range]] = None
+    resumable: Optional[Callable[[], Resumable]] = None
+
+    def __call__(self, elements: AsyncIterable[S]) -> AsyncIterator[T]:
+        return self.asynchronous(elements)
+
+
+_STATEMENTS_FUSION = {
+    "map": "x = f{}(x)",
+    "mapargs": "x = f{}(*x)",
+    "filter": "if not f{}(x): continue",
+    "cut": "if not f{}(x): break",
+}
+
+
+@lru_cache
+def _compile_fusion(operations: tuple[str, ...]) -> Callable[..., Link]:
+    names = [f"f{i}" for i in range(len(operations))]
+    body = "\n".join(
+        f"            {_STATEMENTS_FUSION[op].format(i)}"
+        for i, op in enumerate(operations)
+    )
+    source = f"""
+def make_fused({", ".join(names)}):
+    async def _fused(elements):
+        async for x in aiter(elements):
+{body}
+            yield x
+
+    return _fused
+"""
+    namespace: dict[str, Any] = {}
+    exec(compile(source, f"<fused {'|'.join(operations)}>", "exec"), namespace)
+    return namespace["make_fused"]
+
+
+def _fuse_links(links: list[Link]) -> list[Link]:
+    """
+    Replaces each run of consecutive stateless stages with a single stage whose
+    asynchronous loop body applies all their operations inline. Synchronous
+    iterations need no fusion, as their stages already run as itertools iterators.
+    """
+    fused: list[Link] = []
+    run: list[Stage] = []
+
+    def close_run() -> None:
+        if len(run) == 1:
+            fused.append(run[0])
+        elif run:
+            operations, functions = builtins.zip(*[cast(tuple, stage.fusion) for stage in run])
+            fused.append(Stage(_compile_fusion(operations)(*functions)))
+        run.clear()
+
+    for link in links:
+        if isinstance(link, Stage) and link.fusion is not None:
+            run.append(link)
+        else:
+            close_run()
+            fused.append(link)
+    close_run()
+    return fused
+
+
+def _is_asynchronous(input: Any) -> bool:
+    return any(hasattr(input, attr) for attr in ["__anext__", "__aiter__"])
+
+
+@dataclass
+class LinkMetrics:
+    """
+    Measurements on one link of an instrumented chain iteration. Times are in
+    seconds: `time_inside` covers all the link takes to produce its elements,
+    including `time_upstream` waiting on the elements it consumes. `high_water` is
+    the largest number of elements the link held at once, for links that buffer.
+    """
+    name: str
+    num_in: int = 0
+    num_out: int = 0
+    time_inside: float = 0.0
+    time_upstream: float = 0.0
+    time_first: Optional[float] = None
+    high_water: Optional[int] = None
+
+    @property
+    def time_self(self) -> float:
+        return self.time_inside - self.time_upstream
+
+
+@dataclass
+class Report:
+    """
+    Measurements on each link of an instrumented chain iteration, in chain order.
+    When the iteration got handed off from a thread, `high_water_handoff` is the
+    largest number of chunks of elements that waited for the consumer at once.
+    """
+    links: list[LinkMetrics]
+    time_total: float = 0.0
+    high_water_handoff: Optional[int] = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "links": [
+                {**asdict(metrics), "time_self": metrics.time_self}
+                for metrics in self.links
+            ],
+            "time_total": self.time_total,
+            "high_water_handoff": self.high_water_handoff,
+        }
+
+
+OnReport = Callable[[Report], Any]
+_metrics_link: ContextVar[Optional[LinkMetrics]] = ContextVar("_metrics_link", default=None)
+
+
+def _note_buffered(num_elements: int) -> None:
+    """
+    Notes, for the link being run in an instrumented iteration, that it holds some
+    number of elements at once. Buffering stages call this once per buffer rather
+    than once per element, so it costs nothing noticeable when not instrumented.
+    """
+    metrics = _metrics_link.get()
+    if metrics is not None and (metrics.high_water or 0) < num_elements:
+        metrics.high_water = num_elements
+
+
+def _name_of(link: Link) -> str:
+    fn = link.asynchronous if isinstance(link, Stage) else link
+    return getattr(fn, "__name__", type(fn).__name__).lstrip("_")
+
+
+async def _metered_in(elements: AsyncIterable[Any], metrics: LinkMetrics) -> AsyncIterator[Any]:
+    elements_ = aiter(elements)
+    while True:
+        start = perf_counter()
+        try:
+            x = await anext(elements_)
+        except StopAsyncIteration:
+            return
+        finally:
+            metrics.time_upstream += perf_counter() - start
+        metrics.num_in += 1
+        yield x
+
+
+async def _metered_out(
+    elements: AsyncIterable[Any],
+    metrics: LinkMetrics,
+    start_iteration: float
+) -> AsyncIterator[Any]:
+    elements_ = aiter(elements)
+    while True:
+        metrics_previous = _metrics_link.get()
+        _metrics_link.set(metrics)
+        start = perf_counter()
+        try:
+            x = await anext(elements_)
+        except StopAsyncIteration:
+            return
+        finally:
+            metrics.time_inside += perf_counter() - start
+            _metrics_link.set(metrics_previous)
+        if metrics.time_first is None:
+            metrics.time_first = perf_counter() - start_iteration
+        metrics.num_out += 1
+        yield x
+
+
+async def _run_instrumented(
+    elements: AsyncIterable[Any],
+    links: list[Link],
+    report: Report,
+    on_report: Optional[OnReport]
+) -> AsyncIterator[Any]:
+    start = perf_counter()
+    for link, metrics in builtins.zip(links, report.links):
+        elements = _metered_out(link(_metered_in(elements, metrics)), metrics, start)
+    try:
+        async for x in aiter(elements):
+            yield x
+    finally:
+        report.time_total = perf_counter() - start
+        if on_report is not None:
+            on_report(report)
+
+
+def _metered_in_sync(elements: Iterable[Any], metrics: LinkMetrics) -> Iterator[Any]:
+    elements_ = iter(elements)
+    while True:
+        start = perf_counter()
+        try:
+            x = next(elements_)
+        except StopIteration:
+            return
+        finally:
+            metrics.time_upstream += perf_counter() - start
+        metrics.num_in += 1
+        yield x
+
+
+def _metered_out_sync(
+    elements: Iterable[Any],
+    metrics: LinkMetrics,
+    start_iteration: float
+) -> Iterator[Any]:
+    elements_ = iter(elements)
+    while True:
+        metrics_previous = _metrics_link.get()
+        _metrics_link.set(metrics)
+        start = perf_counter()
+        try:
+            x = next(elements_)
+        except StopIteration:
+            return
+        finally:
+            metrics.time_inside += perf_counter() - start
+            _metrics_link.set(metrics_previous)
+        if metrics.time_first is None:
+            metrics.time_first = perf_counter() - start_iteration
+        metrics.num_out += 1
+        yield x
+
+
+def _run_instrumented_sync(
+    elements: Iterable[Any],
+    links: list[Link],
+    report: Report,
+    on_report: Optional[OnReport]
+) -> Iterator[Any]:
+    start = perf_counter()
+    for link, metrics in builtins.zip(links, report.links):
+        # Links that are not generators may consume their input as soon as called.
+        token = _metrics_link.set(metrics)
+        try:
+            elements = cast(LinkSync, cast(Stage, link).synchronous)(
+                _metered_in_sync(elements, metrics)
+            )
+        finally:
+            _metrics_link.reset(token)
+        elements = _metered_out_sync(elements, metrics, start)
+    try:
+        yield from elements
+    finally:
+        report.time_total = perf_counter() - start
+        if on_report is not None:
+            on_report(report)
+
+
+@dataclass(frozen=True)
+class Checkpointing:
+    """
+    Where and how often the iterations of a chain checkpoint their progress.
+    """
+    path: Path_
+    every: int
+
+
+_NUM_RECORDS_COMPACTION = 64
+
+
+class _Checkpoints:
+    """
+    Checkpoints of an iteration, each made of the number of input elements it has
+    processed and the state of each of its stateful stages. Checkpoints get taken
+    as the first link pulls an element from the input, when every stage is done
+    with the elements before, since only stateless stages and `Resumable` ones
+    (which keep their state up to date after each element) may be checkpointed.
+
+    Checkpoints are logged to a file: a header naming the links of the chain, then
+    one record per checkpoint, holding only the states that changed since the
+    previous one. Every so often, the log gets compacted into a single record, by
+    atomically replacing the file. States get pickled as the checkpoint is taken,
+    and written and synced to disk by a thread; a checkpoint that comes while the
+    previous one is still being written gets skipped, so as to never stall the
+    iteration.
+    """
+
+    def __init__(self, checkpointing: Checkpointing, links: list[Link]) -> None:
+        _check_resumable(links)
+        self._path = Path(checkpointing.path)
+        self._every = checkpointing.every
+        self._names = [_name_of(link) for link in links]
+        self._links = links
+        self._resumables: list[Optional[Resumable]] = []
+        self._written: list[Optional[bytes]] = [None] * len(links)
+        # The first checkpoint rewrites the log, dropping what a crash may have torn.
+        self._num_records = _NUM_RECORDS_COMPACTION
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._writing: Optional[Future] = None
+
+    def _load(self) -> tuple[int, list[Any]]:
+        try:
+            file = open(self._path, "rb")
+        except FileNotFoundError:
+            return 0, [None] * len(self._names)
+        with file:
+            names = pickle.load(file)
+            if names != self._names:
+                raise ValueError(
+                    f"Checkpoint {str(self._path)} is of another chain: {', '.join(names)}"
+                )
+            position = 0
+            states: list[Optional[bytes]] = [None] * len(names)
+            while True:
+                try:
+                    position, changed = pickle.load(file)
+                except (EOFError, pickle.UnpicklingError):
+                    # Past the last record, or into a record torn by a crash.
+                    break
+                for i, state in changed.items():
+                    states[i] = state
+        return position, [None if state is None else pickle.loads(state) for state in states]
+
+    def _resume(self) -> tuple[int, list[Link]]:
+        position, states = self._load()
+        links: list[Link] = []
+        for link, state in builtins.zip(self._links, states):
+            make = cast(Stage, link).resumable
+            if make is None:
+                self._resumables.append(None)
+                links.append(link)
+                continue
+            resumable = make()
+            if state is not None:
+                resumable.restore(state)
+            self._resumables.append(resumable)
+            links.append(Stage(resumable.run, resumable.run_sync))
+        return position, links
+
+    def _take(self, position: int) -> None:
+        if self._writing is not None:
+            if not self._writing.done():
+                return
+            self._writing.result()
+        # Snapshots are cheap copies; pickling them is left to the writer.
+        snapshots = [None if r is None else r.snapshot() for r in self._resumables]
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(1, thread_name_prefix="itercat-checkpoint")
+        self._writing = self._writer.submit(self._record, position, snapshots)
+
+    def _record(self, position: int, snapshots: list[Any]) -> None:
+        # Only ever runs on the writer thread, one record at a time.
+        states = [
+            None if r is None else pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+            for r, snapshot in builtins.zip(self._resumables, snapshots)
+        ]
+        compact = self._num_records >= _NUM_RECORDS_COMPACTION
+        changed = {
+            i: state
+            for i, (state, written) in enumerate(builtins.zip(states, self._written))
+            if state is not None and (compact or state != written)
+        }
+        self._written = states
+        self._num_records = 1 if compact else self._num_records + 1
+        self._write(pickle.dumps((position, changed), pickle.HIGHEST_PROTOCOL), compact)
+
+    def _write(self, record: bytes, compact: bool) -> None:
+        path = self._path.with_name(self._path.name + ".new") if compact else self._path
+        with open(path, "wb" if compact else "ab") as file:
+            if compact:
+                pickle.dump(self._names, file, pickle.HIGHEST_PROTOCOL)
+            file.write(record)
+            file.flush()
+            os.fsync(file.fileno())
+        if compact:
+            os.replace(path, self._path)
+
+    def _close(self, done: bool) -> None:
+        if self._writer is not None:
+            self._writer.shutdown()
+        if done:
+            self._path.unlink(missing_ok=True)
+
+    def resume_sync(self, elements: Iterable[Any]) -> tuple[Iterator[Any], list[Link]]:
+        position, links = self._resume()
+        if isinstance(elements, Sequence) and not isinstance(elements, deque):
+            # Sequences seek straight to the position, rather than reading up to it.
+            view = (
+                elements
+                if isinstance(elements, _SequenceView)
+                else _SequenceView(elements, range(len(elements)))
+            )
+            elements = view[position:]
+        else:
+            elements = it.islice(elements, position, None)
+        return self._positioned_sync(elements, position), links
+
+    def _positioned_sync(self, elements: Iterable[Any], position: int) -> Iterator[Any]:
+        elements_ = iter(elements)
+        while True:
+            # Elements up to the next checkpoint go through at the speed of islice.
+            num_elements = self._every - position % self._every
+            yield from it.islice(elements_, num_elements - 1)
+            x = next(elements_, _end_of_iteration)
+            if x is _end_of_iteration:
+                return
+            yield x
+            position += num_elements
+            self._take(position)
+
+    def resume(self, elements: AsyncIterable[Any]) -> tuple[AsyncIterator[Any], list[Link]]:
+        position, links = self._resume()
+        return self._positioned(elements, position), links
+
+    async def _positioned(self, elements: AsyncIterable[Any], position: int) -> AsyncIterator[Any]:
+        elements_ = aiter(elements)
+        for _ in range(position):
+            try:
+                await anext(elements_)
+            except StopAsyncIteration:
+                return
+        every = self._every
+        async for x in elements_:
+            yield x
+            position += 1
+            if position % every == 0:
+                self._take(position)
+
+    def completing_sync(self, elements: Iterable[Any]) -> Iterator[Any]:
+        """
+        Passes on the output of the iteration, then drops its checkpoints once it
+        completes. They stay when it gets interrupted.
+        """
+        done = False
+        try:
+            yield from elements
+            done = True
+        finally:
+            self._close(done)
+
+    async def completing(self, elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        done = False
+        try:
+            async for x in aiter(elements):
+                yield x
+            done = True
+        finally:
+            self._close(done)
+
+
+def _check_resumable(links: list[Link]) -> None:
+    for link in links:
+        if not isinstance(link, Stage) or (link.fusion is None and link.resumable is None):
+            raise ValueError(f"Can't checkpoint the state of link {_name_of(link)}")
+
+
+class ChainIteration(Generic[S, T]):
+    """
+    Iteration resulting from feeding an input to a chain. Iterating over it
+    synchronously runs without any thread nor event loop when the input is a plain
+    iterable and every link of the chain has a synchronous implementation; the
+    asynchronous machinery is only brought up when something is really asynchronous.
+
+    When instrumented, each run of the iteration measures each link into a fresh
+    `report`, which it also passes to `on_report` once the run ends. When given a
+    `checkpointing`, each run resumes from the last checkpoint, if any.
+    """
+
+    def __init__(
+        self,
+        input: Input[S],
+        links: list[Link],
+        handoff: Handoff = HANDOFF_DEFAULT,
+        fuse: bool = True,
+        instrument: bool = False,
+        on_report: Optional[OnReport] = None,
+        checkpointing: Optional[Checkpointing] = None
+    ) -> None:
+        self._input = input
+        self._links = links
+        self.handoff = handoff
+        self.fuse = fuse
+        self.instrument = instrument
+        self._on_report = on_report
+        self.checkpointing = checkpointing
+        self.report: Optional[Report] = None
+
+    @property
+    def is_synchronous(self) -> bool:
+        if isinstance(self._input, ChainIteration):
+            if not self._input.is_synchronous:
+                return False
+        elif _is_asynchronous(self._input):
+            return False
+        return all(
+            isinstance(link, Stage) and link.synchronous is not None
+            for link in self._links
+        )
+
+    def _report_new(self, links: list[Link]) -> Report:
+        self.report = Report([LinkMetrics(_name_of(link)) for link in links])
+        return self.report
+
+    def _aiter(self, on_report: Optional[OnReport]) -> AsyncIterator[T]:
+        input, links_run = _push_down(self._input, self._links)
+        i_: AsyncIterable = as_iterator_bicolor(input)
+        links = links_run
+        checkpoints = None
+        if self.checkpointing is not None:
+            checkpoints = _Checkpoints(self.checkpointing, links)
+            i_, links = checkpoints.resume(i_)
+        if self.instrument:
+            # Links get measured one by one, so they must not get fused.
+            report = self._report_new(links_run)
+            i_ = _run_instrumented(i_, links, report, on_report)
+        else:
+            for link in (_fuse_links(links) if self.fuse else links):
+                i_ = link(i_)
+        return aiter(i_ if checkpoints is None else checkpoints.completing(i_))
+
+    def __aiter__(self) -> AsyncIterator[T]:
+        return self._aiter(self._on_report)
+
+    def __iter__(self) -> Iterator[T]:
+        if not self.is_synchronous:
+            if not self.instrument:
+                yield from iter_through_thread(aiter(self), self.handoff)
+                return
+            transfer = _Transfer[T](self.handoff)
+
+            def _on_report(report: Report) -> None:
+                # Runs on the loop as the iteration ends, so the report has one writer.
+                report.high_water_handoff = transfer.high_water
+                if self._on_report is not None:
+                    self._on_report(report)
+
+            try:
+                yield from _iter_through_transfer(self._aiter(_on_report), transfer)
+            finally:
+                # Even when stopping early, the report is only complete once reported.
+                transfer.wait()
+            return
+
+        input, links_run = _push_down(self._input, self._links)
+        i_: Iterable = cast(Iterable[S], input)
+        links = links_run
+        checkpoints = None
+        if self.checkpointing is not None:
+            checkpoints = _Checkpoints(self.checkpointing, links)
+            i_, links = checkpoints.resume_sync(i_)
+        if self.instrument:
+            report = self._report_new(links_run)
+            i_ = _run_instrumented_sync(i_, links, report, self._on_report)
+        else:
+            for link in links:
+                i_ = cast(LinkSync, cast(Stage, link).synchronous)(i_)
+        yield from (i_ if checkpoints is None else checkpoints.completing_sync(i_))
+
+
+class _SequenceView(Sequence[T]):
+    """
+    Elements of a sequence at a range of its indices, fetched only as needed.
+    """
+
+    def __init__(self, source: Sequence[T], indices: range) -> None:
+        self._source = source
+        self._indices = indices
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    @overload
+    def __getitem__(self, index: int) -> T:
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "_SequenceView[T]":
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _SequenceView(self._source, self._indices[index])
+        return self._source[self._indices[index]]
+
+    def __iter__(self) -> Iterator[T]:
+        return builtins.map(self._source.__getitem__, self._indices)
+
+
+def _push_down(input: Input[S], links: list[Link]) -> tuple[Input[S], list[Link]]:
+    """
+    When the input is a sequence, turns the leading positional links of a chain
+    (slices, head, tail, reverse) into arithmetic on the indices of the input, so
+    the elements these links would skip are never read.
+
+    Any input that is a `collections.abc.Sequence` (by inheritance or registration)
+    is taken to support fast random access, save for deques. User-defined sources
+    (such as a record file with an offset index) declare their support for seeking
+    by implementing `__len__` and `__getitem__` and registering as a Sequence.
+
+    Pushing down happens as an iteration starts, so the sequence may change size
+    until then. Sequences too long for `len` are left to iterate over.
+    """
+    if (
+        not links
+        or not isinstance(links[0], Stage)
+        or links[0].seek is None
+        or not isinstance(input, Sequence)
+        or isinstance(input, deque)
+    ):
+        return input, links
+    if isinstance(input, _SequenceView):
+        source, indices = input._source, input._indices
+    else:
+        try:
+            source, indices = input, range(len(input))
+        except OverflowError:
+            return input, links
+    num_pushed = 0
+    for link in links:
+        if not isinstance(link, Stage) or link.seek is None:
+            break
+        indices = link.seek(indices)
+        num_pushed += 1
+    if num_pushed == 0:
+        return input, links
+    return _SequenceView(source, indices), links[num_pushed:]
 
 
 @dataclass
 class Chain(Generic[S, T]):
     links: list[Link]
+    fuse: bool = True
+    instrument: bool = False
+    on_report: Optional[OnReport] = None
+    checkpointing: Optional[Checkpointing] = None
 
     def __or__(self, tail: "Chain[T, U]") -> "Chain[S, U]":
         if not isinstance(tail, Chain):
             return NotImplemented
-        return Chain[S, U](self.links + tail.links)
+        return Chain[S, U](
+            self.links + tail.links,
+            self.fuse and tail.fuse,
+            self.instrument or tail.instrument,
+            self.on_report or tail.on_report,
+            self.checkpointing or tail.checkpointing
+        )
 
     def __lt__(self, input: Input[S]) -> IteratorBicolor[T]:
-        i_: AsyncIterable = as_iterator_bicolor(input)
-        for link in self.links:
-            i_ = link(i_)
-        return WrapperBicolor(i_)
+        if not hasattr(input, "__iter__") and not _is_asynchronous(input):
+            raise ValueError(f"Can't iterate over input: {repr(input)}")
+        return ChainIteration(
+            input,
+            self.links,
+            fuse=self.fuse,
+            instrument=self.instrument,
+            on_report=self.on_report,
+            checkpointing=self.checkpointing
+        )
+
+    def unfused(self) -> "Chain[S, T]":
+        """
+        Same chain, but running each of its links as a separate generator, which
+        makes it easier to follow while debugging.
+        """
+        return Chain[S, T](
+            self.links, False, self.instrument, self.on_report, self.checkpointing
+        )
+
+    def instrumented(self, on_report: Optional[OnReport] = None) -> "Chain[S, T]":
+        """
+        Same chain, but measuring how many elements go in and out of each of its
+        links, and how long they take. Iterations then expose these measurements
+        as their `report`, and pass this report to `on_report` once they end.
+        """
+        return Chain[S, T](self.links, self.fuse, True, on_report, self.checkpointing)
+
+    def checkpointed(self, path: Path_, every: int = 10_000) -> "Chain[S, T]":
+        """
+        Same chain, but checkpointing the state of its stages, along with how many
+        input elements they have processed, to a local file at `path`, every `every`
+        input elements. An iteration of the chain over the same input then resumes
+        from the last checkpoint in this file, if any: sequence inputs seek past the
+        elements already processed, other inputs have them read and skipped. Output
+        produced between the last checkpoint and an interruption comes out again.
+        The file gets removed once an iteration completes.
+
+        Only chains of stateless stages (such as `map` and `filter`) and of stages
+        that can snapshot their state (such as `cumulate`, `reduce`, `ngrams` and
+        `tail`) can be checkpointed.
+        """
+        if every < 1:
+            raise ValueError(f"Checkpoints must come every element or more (got {every})")
+        _check_resumable(self.links)
+        return Chain[S, T](
+            self.links, self.fuse, self.instrument, self.on_report, Checkpointing(path, every)
+        )
 
 
-def link(fn: Link[S, T]) -> Chain[S, T]:
-    return Chain([fn])
+def link(fn: Link[S, T], sync: Optional[LinkSync[S, T]] = None) -> Chain[S, T]:
+    """
+    Makes a single-link chain out of an asynchronous generator function. Providing
+    the equivalent synchronous generator function as `sync` lets chains involving
+    this link run in the calling thread when fed a synchronous iterable.
+    """
+    return Chain([fn if sync is None else Stage(fn, sync)])
 
 
 def map(function: Callable[[S], T]) -> Chain[S, T]:
-    @link
     async def _map(elements: AsyncIterable[S]) -> AsyncIterator[T]:
         async for x in aiter(elements):
             yield function(x)
 
-    return _map
+    def _map_sync(elements: Iterable[S]) -> Iterator[T]:
+        return builtins.map(function, elements)
+
+    return Chain([Stage(_map, _map_sync, ("map", function))])
 
 
 def mapargs(function: Callable[..., T]) -> Chain[Iterable, T]:
-    @link
     async def _mapargs(elements: AsyncIterable[Iterable]) -> AsyncIterator[T]:
         async for xs in aiter(elements):
             yield function(*xs)
 
-    return _mapargs
+    def _mapargs_sync(elements: Iterable[Iterable]) -> Iterator[T]:
+        return it.starmap(function, elements)
+
+    return Chain([Stage(_mapargs, _mapargs_sync, ("mapargs", function))])
 
 
 Cumulation = Callable[[U, T], U]
 
 
+class _Cumulating:
+    """
+    Cumulation over an iteration, yielding each successive snowball, or only the
+    last one when reducing, unless that one is None.
+    """
+
+    def __init__(self, cumulation: Cumulation, initial: Any, reducing: bool) -> None:
+        self._cumulation = cumulation
+        self._reducing = reducing
+        # Without an initial value, the first element starts the snowball.
+        self._rolling = initial is not None
+        self._snowball = initial
+        self._starting = True
+
+    def snapshot(self) -> Any:
+        # Cumulations may grow their snowball in place, such as a list they append to.
+        return self._rolling, copy.copy(self._snowball), self._starting
+
+    def restore(self, state: Any) -> None:
+        self._rolling, self._snowball, self._starting = state
+
+    async def run(self, elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        if self._starting and self._rolling and not self._reducing:
+            yield self._snowball
+        self._starting = False
+        cumulation = self._cumulation
+        async for x in aiter(elements):
+            self._snowball = snowball = (
+                cumulation(self._snowball, x) if self._rolling else x
+            )
+            self._rolling = True
+            if not self._reducing:
+                yield snowball
+        if self._reducing and self._rolling and self._snowball is not None:
+            yield self._snowball
+
+    def run_sync(self, elements: Iterable[Any]) -> Iterator[Any]:
+        if self._starting and self._rolling and not self._reducing:
+            yield self._snowball
+        self._starting = False
+        elements_ = iter(elements)
+        if not self._rolling:
+            for self._snowball in elements_:
+                self._rolling = True
+                if not self._reducing:
+                    yield self._snowball
+                break
+        # The snowball gets stored before moving on, as the state to snapshot.
+        cumulation = self._cumulation
+        if self._reducing:
+            for x in elements_:
+                self._snowball = cumulation(self._snowball, x)
+            if self._rolling and self._snowball is not None:
+                yield self._snowball
+            return
+        for x in elements_:
+            self._snowball = snowball = cumulation(self._snowball, x)
+            yield snowball
+
+
 @overload
 def cumulate(cumulation: Cumulation[U, T], initial: U) -> Chain[T, U]:
     ...
@@ -167,23 +1274,16 @@ def cumulate(cumulation: Cumulation[T, T], initial: Optional[T]) -> Chain[T, T]:
 
 
 def cumulate(cumulation, initial=None):
-    @link
-    async def _cumulate(elements):
-        elements_ = aiter(elements)
-        try:
-            if initial is None:
-                snowball = await anext(elements_)
-            else:
-                snowball = initial
+    def _cumulating():
+        return _Cumulating(cumulation, initial, False)
 
-            yield snowball
-            async for snowflake in elements_:
-                snowball = cumulation(snowball, snowflake)
-                yield snowball
-        except StopAsyncIteration:
-            pass
+    def _cumulate(elements):
+        return _cumulating().run(elements)
 
-    return _cumulate
+    def _cumulate_sync(elements):
+        return _cumulating().run_sync(elements)
+
+    return Chain([Stage(_cumulate, _cumulate_sync, resumable=_cumulating)])
 
 
 @overload
@@ -197,35 +1297,331 @@ def reduce(cumulation: Cumulation[T, T], initial: Optional[T]) -> Chain[T, T]:
 
 
 def reduce(cumulation, initial=None):
-    @link
-    async def _reduce(elements):
-        last = None
-        async for x in elements > cumulate(cumulation, initial):
-            last = x
-        if last is not None:
-            yield last
+    def _reducing():
+        return _Cumulating(cumulation, initial, True)
 
-    return _reduce
+    def _reduce(elements):
+        return _reducing().run(elements)
+
+    def _reduce_sync(elements):
+        return _reducing().run_sync(elements)
+
+    return Chain([Stage(_reduce, _reduce_sync, resumable=_reducing)])
 
 
 Predicate = Callable[[T], bool]
 
 
 def filter(predicate: Predicate[T]) -> Chain[T, T]:
-    @link
     async def _filter(elements: AsyncIterable[T]) -> AsyncIterator[T]:
         async for x in aiter(elements):
             if predicate(x):
                 yield x
 
-    return _filter
+    def _filter_sync(elements: Iterable[T]) -> Iterator[T]:
+        return builtins.filter(predicate, elements)
+
+    return Chain([Stage(_filter, _filter_sync, ("filter", predicate))])
+
+
+async def _awaiting_concurrently(
+    elements: AsyncIterable[S],
+    call: Callable[[S], Awaitable[T]],
+    concurrency: int,
+    ordered: bool
+) -> AsyncIterator[tuple[S, T]]:
+    """
+    Keeps up to `concurrency` calls awaited concurrently over the elements, yielding
+    each element paired with its result, either in the order of the elements or as
+    the calls complete. Elements are only drawn when a slot frees up, so upstream is
+    not drained faster than results are consumed.
+    """
+    elements_ = aiter(elements)
+    exhausted = False
+    in_order: deque[asyncio.Future[T]] = deque()
+    in_flight: dict[asyncio.Future[T], S] = {}
+    future: asyncio.Future[T]
+    try:
+        while True:
+            while not exhausted and len(in_flight) < concurrency:
+                try:
+                    x = await anext(elements_)
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                future = asyncio.ensure_future(call(x))
+                in_flight[future] = x
+                if ordered:
+                    in_order.append(future)
+            if not in_flight:
+                return
+
+            if ordered:
+                future = in_order.popleft()
+                result = await future
+                yield in_flight.pop(future), result
+            else:
+                done, _ = await asyncio.wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+def _check_concurrency(concurrency: int) -> None:
+    if concurrency < 1:
+        raise ValueError(f"Concurrency must be at least 1 (got {concurrency})")
+
+
+def amap(
+    function: Callable[[S], Awaitable[T]],
+    concurrency: int = 8,
+    ordered: bool = True
+) -> Chain[S, T]:
+    _check_concurrency(concurrency)
+
+    @link
+    async def _amap(elements: AsyncIterable[S]) -> AsyncIterator[T]:
+        async for _, y in _awaiting_concurrently(elements, function, concurrency, ordered):
+            yield y
+
+    return _amap
+
+
+def amapargs(
+    function: Callable[..., Awaitable[T]],
+    concurrency: int = 8,
+    ordered: bool = True
+) -> Chain[Iterable, T]:
+    _check_concurrency(concurrency)
+
+    def _call(xs: Iterable) -> Awaitable[T]:
+        return function(*xs)
+
+    @link
+    async def _amapargs(elements: AsyncIterable[Iterable]) -> AsyncIterator[T]:
+        async for _, y in _awaiting_concurrently(elements, _call, concurrency, ordered):
+            yield y
+
+    return _amapargs
+
+
+def afilter(
+    predicate: Callable[[T], Awaitable[bool]],
+    concurrency: int = 8,
+    ordered: bool = True
+) -> Chain[T, T]:
+    _check_concurrency(concurrency)
+
+    @link
+    async def _afilter(elements: AsyncIterable[T]) -> AsyncIterator[T]:
+        async for x, keep in _awaiting_concurrently(
+            elements,
+            predicate,
+            concurrency,
+            ordered
+        ):
+            if keep:
+                yield x
+
+    return _afilter
+
+
+def _awaiting_concurrently_sync(
+    elements: Iterable[S],
+    submit: Callable[[S], "Future[T]"],
+    concurrency: int,
+    ordered: bool
+) -> Iterator[tuple[S, T]]:
+    """
+    Synchronous counterpart to `_awaiting_concurrently`, for work submitted to an
+    executor.
+    """
+    elements_ = iter(elements)
+    exhausted = False
+    in_order: deque[Future[T]] = deque()
+    in_flight: dict[Future[T], S] = {}
+    future: Future[T]
+    try:
+        while True:
+            while not exhausted and len(in_flight) < concurrency:
+                try:
+                    x = next(elements_)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = submit(x)
+                in_flight[future] = x
+                if ordered:
+                    in_order.append(future)
+            if not in_flight:
+                return
+
+            if ordered:
+                future = in_order.popleft()
+                result = future.result()
+                yield in_flight.pop(future), result
+            else:
+                done, _ = wait_futures(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield in_flight.pop(future), future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+@contextmanager
+def _executor_for_iteration(
+    executor: Optional[Executor],
+    make_executor: Callable[[], Executor]
+) -> Iterator[Executor]:
+    if executor is not None:
+        yield executor
+        return
+    executor_own = make_executor()
+    try:
+        yield executor_own
+    finally:
+        executor_own.shutdown(wait=False, cancel_futures=True)
+
+
+def _context_multiprocessing() -> multiprocessing.context.BaseContext:
+    # Chains iterated synchronously often run in a thread, which makes forking unsafe.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+def _apply_to_chunk(function: Callable[[S], T], chunk: tuple[S, ...]) -> list[T]:
+    return [function(x) for x in chunk]
+
+
+def pmap(
+    function: Callable[[S], T],
+    workers: Optional[int] = None,
+    chunksize: int = 64,
+    ordered: bool = True,
+    executor: Optional[Executor] = None
+) -> Chain[S, T]:
+    """
+    Maps a CPU-bound function over the elements in a pool of worker processes.
+    Elements are sent to the workers in chunks of `chunksize`, with up to two chunks
+    per worker in flight. The function and elements must thus be picklable; an
+    exception raised in a worker comes back with its original traceback as cause.
+
+    Unless a process pool is shared through `executor`, each iteration starts its own
+    pool of `workers` processes (as many as CPUs by default).
+    """
+    if chunksize < 1:
+        raise ValueError(f"Chunk size must be at least 1 (got {chunksize})")
+    if workers is not None and workers < 1:
+        raise ValueError(f"There must be at least one worker (got {workers})")
+    num_chunks_in_flight = 2 * (workers or os.cpu_count() or 1)
+    chunking: Chain[S, tuple[S, ...]] = batch(chunksize)
+
+    def make_pool() -> Executor:
+        return ProcessPoolExecutor(workers, mp_context=_context_multiprocessing())
+
+    async def _pmap(elements: AsyncIterable[S]) -> AsyncIterator[T]:
+        loop = asyncio.get_running_loop()
+        with _executor_for_iteration(executor, make_pool) as pool:
+            def _submit(chunk: tuple[S, ...]) -> Awaitable[list[T]]:
+                return loop.run_in_executor(pool, _apply_to_chunk, function, chunk)
+
+            async for _, ys in _awaiting_concurrently(
+                elements > chunking,
+                _submit,
+                num_chunks_in_flight,
+                ordered
+            ):
+                for y in ys:
+                    yield y
+
+    def _pmap_sync(elements: Iterable[S]) -> Iterator[T]:
+        with _executor_for_iteration(executor, make_pool) as pool:
+            def _submit(chunk: tuple[S, ...]) -> Future[list[T]]:
+                return pool.submit(_apply_to_chunk, function, chunk)
+
+            for _, ys in _awaiting_concurrently_sync(
+                elements > chunking,
+                _submit,
+                num_chunks_in_flight,
+                ordered
+            ):
+                yield from ys
+
+    return link(_pmap, _pmap_sync)
+
+
+_thread_pool_shared: Optional[ThreadPoolExecutor] = None
+_lock_thread_pool_shared = Lock()
+
+
+def shared_thread_pool() -> ThreadPoolExecutor:
+    """
+    Thread pool on which `tmap` runs its calls unless told otherwise. Unless set
+    with `set_shared_thread_pool`, it is started on first use with the default size
+    of a `ThreadPoolExecutor`.
+    """
+    global _thread_pool_shared
+    with _lock_thread_pool_shared:
+        if _thread_pool_shared is None:
+            _thread_pool_shared = ThreadPoolExecutor(thread_name_prefix="itercat-tmap")
+        return _thread_pool_shared
+
+
+def set_shared_thread_pool(executor: ThreadPoolExecutor) -> None:
+    """
+    Replaces the thread pool shared by `tmap` stages. The previous pool, if any, is
+    left for its owner to shut down.
+    """
+    global _thread_pool_shared
+    with _lock_thread_pool_shared:
+        _thread_pool_shared = executor
+
+
+def tmap(
+    function: Callable[[S], T],
+    workers: int = 8,
+    ordered: bool = True,
+    executor: Optional[Executor] = None
+) -> Chain[S, T]:
+    """
+    Maps a blocking function over the elements in a thread pool, keeping up to
+    `workers` calls in flight, so that the event loop (and other iterations running
+    on it) keeps going meanwhile. Calls not yet started get cancelled when the
+    iteration stops early. Runs on the shared thread pool unless given an executor.
+    On free-threaded Python builds, the calls run in parallel even when CPU-bound.
+    """
+    _check_concurrency(workers)
+
+    async def _tmap(elements: AsyncIterable[S]) -> AsyncIterator[T]:
+        loop = asyncio.get_running_loop()
+        pool = executor or shared_thread_pool()
+
+        def _submit(x: S) -> Awaitable[T]:
+            return loop.run_in_executor(pool, function, x)
+
+        async for _, y in _awaiting_concurrently(elements, _submit, workers, ordered):
+            yield y
+
+    def _tmap_sync(elements: Iterable[S]) -> Iterator[T]:
+        pool = executor or shared_thread_pool()
+
+        def _submit(x: S) -> Future[T]:
+            return pool.submit(function, x)
+
+        for _, y in _awaiting_concurrently_sync(elements, _submit, workers, ordered):
+            yield y
+
+    return link(_tmap, _tmap_sync)
 
 
 def batch(n: int) -> Chain[T, tuple[T, ...]]:
     if n < 1:
         raise ValueError(f"The batch size must be at least 1 (got {n})")
 
-    @link
     async def _batch(elements: AsyncIterable[T]) -> AsyncIterator[tuple[T, ...]]:
         b: list[T] = []
         async for x in aiter(elements):
@@ -237,30 +1633,237 @@ def batch(n: int) -> Chain[T, tuple[T, ...]]:
             if b:
                 yield tuple(b)
 
-    return _batch
+    def _batch_sync(elements: Iterable[T]) -> Iterator[tuple[T, ...]]:
+        elements_ = iter(elements)
+        while b := tuple(it.islice(elements_, n)):
+            yield b
+
+    return link(_batch, _batch_sync)
+
 
+Numbers = Any  # numpy.ndarray when NumPy is available, array.array otherwise.
 
-def ngrams(n: int) -> Chain[T, tuple[T, ...]]:
+
+def _as_numbers(elements: Iterable[Any], dtype: str) -> Numbers:
+    if np is None:
+        return array(dtype, elements)
+    return np.fromiter(elements, dtype)
+
+
+def batch_array(n: int, dtype: str = "d") -> Chain[Any, Numbers]:
+    """
+    Groups numeric elements in batches of n, like `batch`, but as contiguous arrays
+    of the given type code: NumPy arrays if NumPy is installed, otherwise
+    `array.array`. Only type codes common to both (such as "d", "f", "l", "q", "b"
+    and their unsigned forms) make chains portable across both.
+    """
+    if n < 1:
+        raise ValueError(f"The batch size must be at least 1 (got {n})")
+
+    async def _batch_array(elements: AsyncIterable[Any]) -> AsyncIterator[Numbers]:
+        b: list[Any] = []
+        async for x in aiter(elements):
+            b.append(x)
+            if len(b) == n:
+                yield _as_numbers(b, dtype)
+                b.clear()
+        if b:
+            yield _as_numbers(b, dtype)
+
+    def _batch_array_sync(elements: Iterable[Any]) -> Iterator[Numbers]:
+        elements_ = iter(elements)
+        while len(b := _as_numbers(it.islice(elements_, n), dtype)):
+            yield b
+
+    return link(_batch_array, _batch_array_sync)
+
+
+def map_batch(function: Callable[[Numbers], Numbers]) -> Chain[Numbers, Numbers]:
+    """
+    Applies a vectorized function to each batch as a whole, rather than to each
+    element.
+    """
+    return map(function)
+
+
+def _compress(b: Numbers, mask: Any) -> Numbers:
+    if isinstance(b, array):
+        return array(b.typecode, it.compress(b, mask))
+    return b[mask]
+
+
+def filter_mask(predicate: Callable[[Numbers], Any]) -> Chain[Numbers, Numbers]:
+    """
+    Applies a vectorized predicate to each batch, keeping the elements for which
+    the resulting mask holds. Batches left empty are dropped.
+    """
+    async def _filter_mask(batches: AsyncIterable[Numbers]) -> AsyncIterator[Numbers]:
+        async for b in aiter(batches):
+            if len(kept := _compress(b, predicate(b))):
+                yield kept
+
+    def _filter_mask_sync(batches: Iterable[Numbers]) -> Iterator[Numbers]:
+        for b in batches:
+            if len(kept := _compress(b, predicate(b))):
+                yield kept
+
+    return link(_filter_mask, _filter_mask_sync)
+
+
+def _elements_of(b: Iterable[T]) -> Iterable[T]:
+    # Arrays convert to lists of plain Python numbers in a single C-level call.
+    return b.tolist() if hasattr(b, "tolist") else b  # type: ignore
+
+
+async def _unbatch(batches: AsyncIterable[Iterable[T]]) -> AsyncIterator[T]:
+    async for b in aiter(batches):
+        for x in _elements_of(b):
+            yield x
+
+
+def _unbatch_sync(batches: Iterable[Iterable[T]]) -> Iterator[T]:
+    return it.chain.from_iterable(builtins.map(_elements_of, batches))
+
+
+unbatch: Chain[Iterable[Any], Any] = link(_unbatch, _unbatch_sync)
+
+
+class _WindowsNumeric:
+    """
+    Buffer of numbers filled one block at a time, so that the last n elements always
+    sit in a single contiguous slice of it. Once a block is full, its last n - 1
+    elements carry over to a fresh block instead of being overwritten, so that the
+    windows handed out remain valid views for as long as they are kept.
+    """
+
+    def __init__(self, n: int, dtype: str) -> None:
+        self._n = n
+        self._dtype = dtype
+        self._size_block = builtins.max(2 * n, 1024)
+        self._block, self._view = self._new_block()
+        # Windows start padded with zeros, until n elements have come.
+        self._end = n
+
+    def _new_block(self) -> tuple[Any, Any]:
+        if np is None:
+            block = array(self._dtype, [0]) * self._size_block
+            return block, memoryview(block).toreadonly()
+        block = np.zeros(self._size_block, self._dtype)
+        view = block.view()
+        view.flags.writeable = False
+        return block, view
+
+    def append(self, x: Any) -> None:
+        if self._end == self._size_block:
+            carried = self._n - 1
+            block, self._view = self._new_block()
+            block[:carried] = self._block[self._end - carried:self._end]
+            self._block, self._end = block, carried
+        self._block[self._end] = x
+        self._end += 1
+
+    def window(self) -> Numbers:
+        return self._view[self._end - self._n:self._end]
+
+
+class _Ngrams:
+    """
+    Windows of n consecutive elements over an iteration, with the last n elements
+    (or fewer, at first) as their state.
+    """
+
+    def __init__(self, n: int, step: int, dtype: Optional[str]) -> None:
+        self._n = n
+        self._step = step
+        self._ngram: Optional[deque[Any]] = None
+        if dtype is None:
+            self._ngram = deque(maxlen=n)
+            self._append, self._window = self._ngram.append, self._tuple
+        else:
+            windows = _WindowsNumeric(n, dtype)
+            self._append, self._window = windows.append, windows.window
+        self._count = 1 - n
+
+    def _tuple(self) -> tuple[Any, ...]:
+        return tuple(cast(deque, self._ngram))
+
+    def snapshot(self) -> Any:
+        window = builtins.list(self._window())
+        num_elements = builtins.min(self._n, self._count + self._n - 1)
+        return self._count, window[len(window) - num_elements:]
+
+    def restore(self, state: Any) -> None:
+        self._count, elements = state
+        for x in elements:
+            self._append(x)
+
+    async def run(self, elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        append, window, step = self._append, self._window, self._step
+        async for x in aiter(elements):
+            append(x)
+            count = self._count
+            self._count = count + 1
+            if count >= 0 and count % step == 0:
+                yield window()
+
+    def run_sync(self, elements: Iterable[Any]) -> Iterator[Any]:
+        append, window, step = self._append, self._window, self._step
+        ngram = self._ngram
+        elements_ = iter(elements)
+        for x in elements_:
+            append(x)
+            count = self._count
+            self._count = count + 1
+            if count >= 0 and count % step == 0:
+                yield window() if ngram is None else tuple(ngram)
+                if ngram is not None and step == 1:
+                    break
+        # Past the first window, windows of tuples sliding by one need no counting.
+        ngram_ = cast(deque, ngram)
+        for x in elements_:
+            append(x)
+            yield tuple(ngram_)
+
+
+@overload
+def ngrams(n: int, step: int = 1, dtype: None = None) -> Chain[T, tuple[T, ...]]:
+    ...
+
+
+@overload
+def ngrams(n: int, step: int, dtype: str) -> Chain[Any, Numbers]:
+    ...
+
+
+@overload
+def ngrams(n: int, *, dtype: str) -> Chain[Any, Numbers]:
+    ...
+
+
+def ngrams(n: int, step: int = 1, dtype: Optional[str] = None) -> Chain[Any, Any]:
+    """
+    Yields the windows of n consecutive elements, sliding by `step` elements from
+    one window to the next; windows in between are not computed.
+
+    When given a numeric type code `dtype` (as for `batch_array`), windows come as
+    read-only views over buffers of that type rather than as tuples. Consecutive
+    windows share their memory, which is never overwritten, so views may be kept.
+    """
     if n < 1:
         raise ValueError(f"The size must be at least 1 (got {n})")
+    if step < 1:
+        raise ValueError(f"Step must be at least 1 (got {step})")
 
-    @link
-    async def _ngrams(elements: AsyncIterable[T]) -> AsyncIterator[tuple[T, ...]]:
-        ngram: list[T] = []
-        elements_ = aiter(elements)
-        try:
-            for _ in range(n):
-                ngram.append(await anext(elements_))
-            yield tuple(ngram)
-
-            async for x in elements_:
-                del ngram[0]
-                ngram.append(x)
-                yield tuple(ngram)
-        except StopAsyncIteration:
-            pass
+    def _ngramming() -> _Ngrams:
+        return _Ngrams(n, step, dtype)
+
+    def _ngrams(elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        return _ngramming().run(elements)
 
-    return _ngrams
+    def _ngrams_sync(elements: Iterable[Any]) -> Iterator[Any]:
+        return _ngramming().run_sync(elements)
+
+    return Chain([Stage(_ngrams, _ngrams_sync, resumable=_ngramming)])
 
 
 async def _enumerate(elements: AsyncIterable[T]) -> AsyncIterator[tuple[int, T]]:
@@ -288,7 +1891,6 @@ def slice_(
     if start < 0:
         raise ValueError(f"Start of the slice must be at least 0; got {start}")
 
-    @link
     async def _slice_(elements: AsyncIterable[T]) -> AsyncIterator[T]:
         enum = _enumerate(elements)
         try:
@@ -304,7 +1906,13 @@ def slice_(
         except StopAsyncIteration:
             pass
 
-    return _slice_
+    def _slice_sync(elements: Iterable[T]) -> Iterator[T]:
+        return it.islice(elements, start, max(start, end), step)
+
+    def _slice_seek(indices: range) -> range:
+        return indices[start:max(start, end):step]
+
+    return Chain([Stage(_slice_, _slice_sync, seek=_slice_seek)])
 
 
 def head(n: int) -> Chain[T, T]:
@@ -314,36 +1922,67 @@ def head(n: int) -> Chain[T, T]:
     return slice_(0, n, 1)
 
 
+class _Tail:
+    """
+    Last n elements of an iteration, which are also its state.
+    """
+
+    def __init__(self, n: int) -> None:
+        self._tail: deque[Any] = deque(maxlen=n)
+
+    def snapshot(self) -> Any:
+        return tuple(self._tail)
+
+    def restore(self, state: Any) -> None:
+        self._tail.extend(state)
+
+    async def run(self, elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        async for x in aiter(elements):
+            self._tail.append(x)
+        _note_buffered(len(self._tail))
+        for x in self._tail:
+            yield x
+
+    def run_sync(self, elements: Iterable[Any]) -> Iterator[Any]:
+        # Extending appends each element in turn, so snapshots in between stay exact.
+        self._tail.extend(elements)
+        _note_buffered(len(self._tail))
+        yield from self._tail
+
+
 def tail(n: int) -> Chain[T, T]:
     if n < 0:
         raise ValueError(f"n must be positive (got {n})")
 
-    @link
-    async def _tail(elements: AsyncIterable[T]) -> AsyncIterator[T]:
-        the_tail: list[T] = []
-        async for x in aiter(elements):
-            the_tail.append(x)
-            if len(the_tail) > n:
-                the_tail.pop(0)
-        for x in the_tail:
-            yield x
+    def _tailing() -> _Tail:
+        return _Tail(n)
+
+    def _tail(elements: AsyncIterable[T]) -> AsyncIterator[T]:
+        return _tailing().run(elements)
+
+    def _tail_sync(elements: Iterable[T]) -> Iterator[T]:
+        return _tailing().run_sync(elements)
 
-    return _tail
+    def _tail_seek(indices: range) -> range:
+        return indices[max(len(indices) - n, 0):]
+
+    return Chain([Stage(_tail, _tail_sync, seek=_tail_seek, resumable=_tailing)])
 
 
 def cut(predicate: Predicate[T]) -> Chain[T, T]:
-    @link
     async def _cut(elements: AsyncIterable[T]) -> AsyncIterator[T]:
         async for x in aiter(elements):
             if not predicate(x):
                 break
             yield x
 
-    return _cut
+    def _cut_sync(elements: Iterable[T]) -> Iterator[T]:
+        return it.takewhile(predicate, elements)
+
+    return Chain([Stage(_cut, _cut_sync, ("cut", predicate))])
 
 
 def clamp(predicate: Predicate[T]) -> Chain[T, T]:
-    @link
     async def _clamp(elements: AsyncIterable[T]) -> AsyncIterator[T]:
         elements_ = aiter(elements)
         async for x in elements_:
@@ -354,7 +1993,10 @@ def clamp(predicate: Predicate[T]) -> Chain[T, T]:
         async for x in elements_:
             yield x
 
-    return _clamp
+    def _clamp_sync(elements: Iterable[T]) -> Iterator[T]:
+        return it.dropwhile(predicate, elements)
+
+    return link(_clamp, _clamp_sync)
 
 
 _Comparable = TypeVar("_Comparable", bound="Comparable")
@@ -376,8 +2018,13 @@ class Label(Comparable, Hashable, Protocol):
 _Label = TypeVar("_Label", bound=Label)
 
 
-@dataclass
+@dataclass(slots=True)
 class Tagged(Generic[_Label, U]):
+    """
+    Datum tagged with a label, by which tagged data compare. Stages that sort, group
+    or join tagged data compare their labels directly rather than through these
+    comparison methods.
+    """
     label: _Label
     data: U
 
@@ -390,11 +2037,15 @@ class Tagged(Generic[_Label, U]):
         return self.label < other.label
 
 
+_label_of: Callable[[Tagged], Any] = operator.attrgetter("label")
+_data_of: Callable[[Tagged], Any] = operator.attrgetter("data")
+
+
 Labeler = Callable[[U], _Label]
 
 
 def tag(labeler: Labeler[U, _Label]) -> Chain[U, Tagged[_Label, U]]:
-    return map(lambda x: Tagged[_Label, U](labeler(x), x))
+    return map(lambda x: Tagged(labeler(x), x))
 
 
 Index = TypeVar("Index", int, str, contravariant=True)
@@ -417,29 +2068,231 @@ def with_name(name: str) -> Labeler[U, str]:
     return lambda _: name
 
 
-strip: Chain[Tagged[_Label, U], U] = map(lambda tagd: tagd.data)  # type: ignore
+strip: Chain[Tagged[_Label, U], U] = map(_data_of)  # type: ignore
 
 
-@link
-async def sort(elements: AsyncIterable[Comparable]) -> AsyncIterator[Comparable]:
-    elems_all: list[Comparable] = []
-    async for x in aiter(elements):
-        elems_all.append(x)
-    for n in sorted(elems_all):
-        yield n
+Key = Callable[[Any], Any]
+_SIZE_POINTER = 8
+_SIZE_BLOCK_SPILL = 4096
+
+
+def _spill(run: list[Any]) -> IO[bytes]:
+    """
+    Writes a sorted run to an anonymous temporary file, in pickled blocks so that it
+    can be read back lazily. The file vanishes once closed.
+    """
+    file = tempfile.TemporaryFile()
+    try:
+        for i in range(0, len(run), _SIZE_BLOCK_SPILL):
+            pickle.dump(run[i:i + _SIZE_BLOCK_SPILL], file, pickle.HIGHEST_PROTOCOL)
+        file.seek(0)
+    except BaseException:
+        file.close()
+        raise
+    return file
+
+
+def _read_spilled(file: IO[bytes]) -> Iterator[Any]:
+    while True:
+        try:
+            block = pickle.load(file)
+        except EOFError:
+            return
+        yield from block
+
+
+class _Runs:
+    """
+    Gathers elements into sorted runs, holding up to about `memory_limit` bytes of
+    them in memory (shallow sizes, as per `sys.getsizeof`) before spilling.
+    """
+
+    def __init__(
+        self,
+        files: ExitStack,
+        key: Optional[Key],
+        reverse: bool,
+        memory_limit: Optional[int]
+    ) -> None:
+        self._files = files
+        self._key = key
+        self._reverse = reverse
+        self._memory_limit = memory_limit
+        self.spilled: list[IO[bytes]] = []
+        self.run: list[Any] = []
+        self._size_run = 0
+
+    def add(self, x: Any) -> Optional[list[Any]]:
+        """
+        Adds an element; returns the sorted run to spill once the budget is spent.
+        """
+        if not self.run and not self.spilled and self._key is None and isinstance(x, Tagged):
+            self._key = _label_of
+        self.run.append(x)
+        if self._memory_limit is None:
+            return None
+        self._size_run += sys.getsizeof(x) + _SIZE_POINTER
+        if self._size_run < self._memory_limit:
+            return None
+        run, self.run, self._size_run = self.run, [], 0
+        _note_buffered(len(run))
+        run.sort(key=self._key, reverse=self._reverse)
+        return run
+
+    def spilled_to(self, file: IO[bytes]) -> None:
+        self.spilled.append(self._files.enter_context(file))
+
+    def merged(self) -> Iterator[Any]:
+        _note_buffered(len(self.run))
+        self.run.sort(key=self._key, reverse=self._reverse)
+        if not self.spilled:
+            return iter(self.run)
+        return heapq.merge(
+            *[_read_spilled(file) for file in self.spilled],
+            self.run,
+            key=self._key,
+            reverse=self._reverse
+        )
+
+
+def _sorting(
+    key: Optional[Key],
+    reverse: bool,
+    memory_limit: Optional[int]
+) -> Chain[Any, Any]:
+    if memory_limit is not None and memory_limit < 1:
+        raise ValueError(f"Memory limit must be at least 1 byte (got {memory_limit})")
+
+    async def _sort(elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        with ExitStack() as files:
+            runs = _Runs(files, key, reverse, memory_limit)
+            async for x in aiter(elements):
+                if (run := runs.add(x)) is not None:
+                    runs.spilled_to(await asyncio.to_thread(_spill, run))
+            for x in runs.merged():
+                yield x
+
+    def _sort_sync(elements: Iterable[Any]) -> Iterator[Any]:
+        with ExitStack() as files:
+            runs = _Runs(files, key, reverse, memory_limit)
+            for x in elements:
+                if (run := runs.add(x)) is not None:
+                    runs.spilled_to(_spill(run))
+            yield from runs.merged()
+
+    return link(_sort, _sort_sync)
+
+
+class Sorting(Chain[Comparable, Comparable]):
+    """
+    Chain that sorts its whole iteration. Calling it yields a sorting chain set up
+    with a key and order like `sorted`. With a `memory_limit` (in bytes), elements
+    are sorted in runs that get spilled to temporary files, and then merged lazily:
+    the first sorted element comes as soon as the merge starts. Elements must then
+    be picklable. Temporary files are removed as soon as the iteration stops.
+    """
+
+    def __call__(
+        self,
+        key: Optional[Key] = None,
+        reverse: bool = False,
+        memory_limit: Optional[int] = None
+    ) -> Chain[Any, Any]:
+        return _sorting(key, reverse, memory_limit)
+
+
+sort = Sorting(_sorting(None, False, None).links)
+
 
+class _Descending:
+    """
+    Sort key ordered the other way around.
+    """
+    __slots__ = ("key",)
 
-@link
-async def reverse(elements: AsyncIterable[U]) -> AsyncIterator[U]:
+    def __init__(self, key: Any) -> None:
+        self.key = key
+
+    def __eq__(self, other: Any) -> bool:
+        return self.key == other.key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
+
+
+def topk(k: int, key: Optional[Key] = None, reverse: bool = False) -> Chain[T, T]:
+    """
+    Yields the k first elements of the sorted iteration, as `sort | head(k)` would,
+    but holding at most k elements at once instead of the whole iteration.
+    """
+    if k < 0:
+        raise ValueError(f"k must be positive (got {k})")
+    order: Callable[[Any], Any] = (lambda k_: k_) if reverse else _Descending
+
+    async def _topk(elements: AsyncIterable[T]) -> AsyncIterator[T]:
+        if k == 0:
+            return
+        # The heap's root is the worst of the k best elements so far, to be replaced
+        # by any better one, in O(log k). Entries compare on their order then on
+        # their negated index, so that ties keep their order and elements never get
+        # compared.
+        heap: list[tuple[Any, int, T]] = []
+        elements_ = aiter(elements)
+        async for x in elements_:
+            heap.append((order(x if key is None else key(x)), -len(heap), x))
+            if len(heap) == k:
+                break
+        if not heap:
+            return
+        heapq.heapify(heap)
+        index_neg = -len(heap)
+        worst = heap[0][0] if reverse else heap[0][0].key
+        async for x in elements_:
+            # Elements no better than the worst kept skip the heap altogether.
+            kx = x if key is None else key(x)
+            if (worst < kx) if reverse else (kx < worst):
+                heapq.heapreplace(heap, (order(kx), index_neg, x))
+                worst = heap[0][0] if reverse else heap[0][0].key
+            index_neg -= 1
+        for _, _, x in sorted(heap, reverse=True):
+            yield x
+
+    def _topk_sync(elements: Iterable[T]) -> Iterator[T]:
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return iter(select(k, elements, key=key))  # type: ignore
+
+    return link(_topk, _topk_sync)
+
+
+def nsmallest(k: int, key: Optional[Key] = None) -> Chain[T, T]:
+    return topk(k, key)
+
+
+def nlargest(k: int, key: Optional[Key] = None) -> Chain[T, T]:
+    return topk(k, key, reverse=True)
+
+
+async def _reverse(elements: AsyncIterable[U]) -> AsyncIterator[U]:
     elems_all: list[U] = []
     async for x in aiter(elements):
         elems_all.append(x)
+    _note_buffered(len(elems_all))
     for x in elems_all[::-1]:
         yield x
 
 
+def _reverse_sync(elements: Iterable[U]) -> Iterator[U]:
+    elems_all = list(elements)
+    _note_buffered(len(elems_all))
+    yield from elems_all[::-1]
+
+
+reverse: Chain[Any, Any] = Chain(
+    [Stage(_reverse, _reverse_sync, seek=lambda indices: indices[::-1])]
+)
+
+
 def extend(*segments: Union[Iterable[U], AsyncIterable[U]]) -> Chain[U, U]:
-    @link
     async def _extend(head: AsyncIterable[U]) -> AsyncIterator[U]:
         for segment in [head, *segments]:
             if hasattr(segment, "__aiter__"):
@@ -454,17 +2307,25 @@ def extend(*segments: Union[Iterable[U], AsyncIterable[U]]) -> Chain[U, U]:
                     segment
                 )
 
-    return _extend
+    def _extend_sync(head: Iterable[U]) -> Iterator[U]:
+        return it.chain(head, *cast(tuple[Iterable[U], ...], segments))
+
+    if any(_is_asynchronous(segment) for segment in segments):
+        return link(_extend)
+    return link(_extend, _extend_sync)
 
 
+@dataclass(eq=False, slots=True)
 class TaggedIterable(Tagged[_Label, AsyncIterable[U]]):
+    handoff: Handoff = field(default=HANDOFF_DEFAULT, repr=False)
 
     def __aiter__(self) -> AsyncIterator[U]:
-        return cast(AsyncIterator[U], self.data)
+        return aiter(cast(AsyncIterable[U], self.data))
 
     def __iter__(self) -> Iterator[U]:
         yield from iter_through_thread(
-            aiter(cast(AsyncIterable[U], self.data))
+            aiter(cast(AsyncIterable[U], self.data)),
+            self.handoff
         )
 
 
@@ -477,22 +2338,30 @@ class concurrently:
     ) -> None:
         self._iterations_anon = iterations_anon
         self._iterations_named = iterations_named
+        self.handoff = HANDOFF_DEFAULT
+
+    def with_handoff(self, handoff: Handoff) -> "concurrently":
+        """
+        Sets how the iterations are handed off to a synchronous consumer, for this
+        iteration of iterations as well as for the named iterations it yields.
+        """
+        self.handoff = handoff
+        return self
 
     async def __aiter__(self) -> AsyncIterator[AsyncIterable[Any]]:
         for iteration in self._iterations_anon:
             yield as_iterator_bicolor(iteration)
         for name, iteration in self._iterations_named.items():
-            yield TaggedIterable(name, as_iterator_bicolor(iteration))
+            yield TaggedIterable(name, as_iterator_bicolor(iteration), self.handoff)
 
     def __iter__(self) -> Iterator[AsyncIterable[Any]]:
-        yield from iter_through_thread(aiter(self))
+        yield from iter_through_thread(aiter(self), self.handoff)
 
 
 drain: Chain[Never, Never] = filter(lambda x: False)
 
 
-@link
-async def truncate(iterable: AsyncIterable[Never]) -> AsyncIterator[Never]:
+async def _truncate(iterable: AsyncIterable[Never]) -> AsyncIterator[Never]:
     x: Never
     async for x in aiter(iterable):
         break
@@ -500,16 +2369,2235 @@ async def truncate(iterable: AsyncIterable[Never]) -> AsyncIterator[Never]:
         yield None
 
 
-def dispatch(*chains: Chain[Any, Any]) -> Chain[Any, AsyncIterator[Any]]:
+def _truncate_sync(iterable: Iterable[Never]) -> Iterator[Never]:
+    next(iter(iterable), None)
+    yield from ()
+
+
+truncate: Chain[Never, Never] = link(_truncate, _truncate_sync)
+
+
+def _check_size_buffer(size_buffer: int) -> None:
+    if size_buffer < 1:
+        raise ValueError(f"Buffer size must be at least 1 (got {size_buffer})")
+
+
+class _Buffer:
+    """
+    Bounded queue between a task that feeds a branch and the consumer of this branch.
+    Once the consumer stops, the buffer discards what it gets fed, so as to hold back
+    none of the other branches.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._queue: asyncio.Queue = asyncio.Queue(size)
+        self.closed = False
+
+    async def put(self, x: Any) -> None:
+        if not self.closed:
+            await self._queue.put(x)
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+    def close(self) -> None:
+        self.closed = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+
+class _BufferSpilling(_Buffer):
+    """
+    Buffer that never makes its feeder wait: past `size` elements held in memory,
+    further elements get pickled to a temporary file in blocks of `size`, and read
+    back in order as the consumer catches up.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._memory: deque[Any] = deque()
+        self._pending: list[Any] = []
+        self._file: Optional[IO[bytes]] = None
+        self._position_read = 0
+        self._num_spilled = 0
+        self._last: Any = None
+        self._available = asyncio.Event()
+        self.closed = False
+
+    async def put(self, x: Any) -> None:
+        if self.closed:
+            return
+        if isinstance(x, (_EndOfIteration, _ExceptionInIteration)):
+            self._last = x
+        elif self._num_spilled == 0 and not self._pending and len(self._memory) < self._size:
+            self._memory.append(x)
+        else:
+            self._pending.append(x)
+            if len(self._pending) >= self._size:
+                self._spill()
+        self._available.set()
+
+    def _spill(self) -> None:
+        if self._file is None:
+            self._file = tempfile.TemporaryFile()
+        self._file.seek(0, os.SEEK_END)
+        pickle.dump(self._pending, self._file, pickle.HIGHEST_PROTOCOL)
+        self._pending = []
+        self._num_spilled += 1
+
+    def _unspill(self) -> None:
+        file = cast(IO[bytes], self._file)
+        file.seek(self._position_read)
+        self._memory.extend(pickle.load(file))
+        self._position_read = file.tell()
+        self._num_spilled -= 1
+
+    async def get(self) -> Any:
+        while True:
+            if self._memory:
+                return self._memory.popleft()
+            if self._num_spilled > 0:
+                self._unspill()
+            elif self._pending:
+                self._memory.extend(self._pending)
+                self._pending = []
+            elif self._last is not None:
+                return self._last
+            else:
+                self._available.clear()
+                await self._available.wait()
+
+    def close(self) -> None:
+        self.closed = True
+        self._memory.clear()
+        self._pending = []
+        if self._file is not None:
+            self._file.close()
+
+
+async def _pour(elements: AsyncIterable[Any], buffers: Sequence[_Buffer]) -> None:
+    try:
+        async for x in aiter(elements):
+            for buffer in buffers:
+                await buffer.put(x)
+    except Exception as ex:
+        for buffer in buffers:
+            await buffer.put(_ExceptionInIteration(ex))
+    else:
+        for buffer in buffers:
+            await buffer.put(_end_of_iteration)
+
+
+async def _elements_of_buffer(buffer: _Buffer) -> AsyncIterator[Any]:
+    while True:
+        x = await buffer.get()
+        if x is _end_of_iteration:
+            return
+        if isinstance(x, _ExceptionInIteration):
+            raise x.exception
+        yield x
+
+
+async def _drain(
+    buffer: _Buffer,
+    on_close: Callable[[], Any],
+    chain: Optional[Chain[Any, Any]] = None
+) -> AsyncIterator[Any]:
+    """
+    Yields the elements of a buffer, through the given chain if any. The buffer gets
+    closed as soon as this ends, including when the chain stops consuming early.
+    """
+    elements = _elements_of_buffer(buffer)
+    try:
+        async for x in elements if chain is None else elements > chain:
+            yield x
+    finally:
+        buffer.close()
+        on_close()
+
+
+def dispatch(
+    *chains: Chain[Any, Any],
+    concurrent: bool = False,
+    size_buffer: int = 16
+) -> Chain[Any, AsyncIterable[Any]]:
+    """
+    Runs each incoming iteration through the chain at the same position, truncating
+    those past the last chain. Dispatched iterations normally run as they get
+    consumed, one after the other. When `concurrent`, each runs as its own task
+    as soon as it is dispatched, up to `size_buffer` elements ahead of its consumer;
+    these iterations must then be consumed asynchronously within the same pipeline,
+    e.g. by `mix` or `zip`.
+    """
+    _check_size_buffer(size_buffer)
+
     @link
     async def _dispatch(
         iterables: AsyncIterable[Any]
-    ) -> AsyncIterator[AsyncIterator[Any]]:
+    ) -> AsyncIterator[AsyncIterable[Any]]:
         each_chain = it.chain(chains, it.repeat(truncate))
         async for iterable in iterables:
-            yield as_iterator_bicolor(iterable) > next(each_chain)
+            chained: AsyncIterable[Any] = as_iterator_bicolor(iterable) > next(each_chain)
+            if concurrent:
+                buffer = _Buffer(size_buffer)
+                pouring = asyncio.create_task(_pour(chained, [buffer]))
+                chained = _drain(buffer, pouring.cancel)
+            if isinstance(iterable, TaggedIterable):
+                # Named iterations keep their name through their chain.
+                chained = TaggedIterable(iterable.label, chained, iterable.handoff)
+            yield chained
 
     return _dispatch
+
+
+def dup(
+    *chains: Chain[Any, Any],
+    size_buffer: int = 16,
+    spill: bool = False
+) -> Chain[Any, AsyncIterable[Any]]:
+    """
+    Fans the iteration out to each of the given chains, yielding the iterations that
+    come out of them. A task feeds every element to each branch, through a buffer of
+    `size_buffer` elements: the slowest branch sets the pace of all, so branches
+    must be consumed concurrently, such as by `mix` or `zip`, within the same
+    pipeline. With `spill`, lagging branches never hold back the others, as their
+    buffer overflows to a temporary file instead; branches may then be consumed one
+    after the other. Branches whose consumer stops early no longer get fed.
+    """
+    _check_size_buffer(size_buffer)
+
+    @link
+    async def _dup(elements: AsyncIterable[Any]) -> AsyncIterator[AsyncIterable[Any]]:
+        buffers = [(_BufferSpilling if spill else _Buffer)(size_buffer) for _ in chains]
+        pouring = asyncio.create_task(_pour(elements, buffers))
+
+        def _on_close() -> None:
+            if all(buffer.closed for buffer in buffers):
+                pouring.cancel()
+
+        for chain, buffer in builtins.zip(chains, buffers):
+            yield _drain(buffer, _on_close, chain)
+
+    return _dup
+
+
+async def _next_or_end(elements: AsyncIterator[T]) -> T | _EndOfIteration:
+    try:
+        return await anext(elements)
+    except StopAsyncIteration:
+        return _end_of_iteration
+
+
+class _Joiner:
+    """
+    Makes the output of a join of some kind out of matched and unmatched elements,
+    keyed either on their label, in which case their data get paired, or on a given
+    key function, in which case they get paired as they are.
+    """
+
+    def __init__(self, kind: str, key: Optional[Key]) -> None:
+        self.kind = kind
+        self.key: Key = key or _label_of
+        self._value: Key = _data_of if key is None else _itself
+
+    def pair(self, k: Any, left: Any, right: Any) -> Tagged:
+        return Tagged(
+            k,
+            (
+                None if left is None else self._value(left),
+                None if right is None else self._value(right)
+            )
+        )
+
+    def left_alone(self, k: Any, left: Any) -> list[Any]:
+        if self.kind == "anti":
+            return [left]
+        if self.kind in ("left", "outer"):
+            return [self.pair(k, left, None)]
+        return []
+
+    def right_alone(self, k: Any, right: Any) -> list[Any]:
+        return [self.pair(k, None, right)] if self.kind == "outer" else []
+
+
+def _itself(x: Any) -> Any:
+    return x
+
+
+class _HashTable:
+    """
+    Hash table built on one side of a join, probed with the elements of the other.
+    """
+
+    def __init__(self, joiner: _Joiner, build_is_left: bool) -> None:
+        self._joiner = joiner
+        self._build_is_left = build_is_left
+        self._table: dict[Any, list[Any]] = {}
+        self._matched: set[Any] = set()
+
+    def build(self, x: Any) -> None:
+        self._table.setdefault(self._joiner.key(x), []).append(x)
+
+    def probe(self, x: Any) -> list[Any]:
+        joiner = self._joiner
+        k = joiner.key(x)
+        matches = self._table.get(k)
+        if not matches:
+            if self._build_is_left:
+                return joiner.right_alone(k, x)
+            return joiner.left_alone(k, x)
+        self._matched.add(k)
+        if self._build_is_left:
+            return [] if joiner.kind == "anti" else [joiner.pair(k, m, x) for m in matches]
+        return [] if joiner.kind == "anti" else [joiner.pair(k, x, m) for m in matches]
+
+    def unmatched(self) -> Iterator[Any]:
+        for k, xs in self._table.items():
+            if k not in self._matched:
+                for x in xs:
+                    if self._build_is_left:
+                        yield from self._joiner.left_alone(k, x)
+                    else:
+                        yield from self._joiner.right_alone(k, x)
+
+
+class _Partitions:
+    """
+    Elements spread over temporary files according to the hash of their key.
+    """
+
+    def __init__(self, files: ExitStack, num: int, key: Key) -> None:
+        self._key = key
+        self._files = [files.enter_context(tempfile.TemporaryFile()) for _ in range(num)]
+        self._blocks: list[list[Any]] = [[] for _ in range(num)]
+        self.sizes = [0] * num
+
+    def add(self, x: Any) -> None:
+        i = hash(self._key(x)) % len(self._files)
+        block = self._blocks[i]
+        block.append(x)
+        self.sizes[i] += 1
+        if len(block) >= _SIZE_BLOCK_SPILL:
+            pickle.dump(block, self._files[i], pickle.HIGHEST_PROTOCOL)
+            block.clear()
+
+    def read(self, i: int) -> Iterator[Any]:
+        file = self._files[i]
+        if self._blocks[i]:
+            pickle.dump(self._blocks[i], file, pickle.HIGHEST_PROTOCOL)
+            self._blocks[i].clear()
+        file.seek(0)
+        return _read_spilled(file)
+
+
+async def _sides_of(iterations: AsyncIterable[Any]) -> tuple[AsyncIterator, AsyncIterator]:
+    sides = [aiter(as_iterator_bicolor(i)) async for i in aiter(iterations)]
+    if len(sides) != 2:
+        raise ValueError(f"A join takes exactly two iterations (got {len(sides)})")
+    return sides[0], sides[1]
+
+
+def _joining(
+    kind: str,
+    key: Optional[Key],
+    strategy: str,
+    memory_limit: Optional[int],
+    num_partitions: int
+) -> Chain[Any, Any]:
+    if strategy not in ("hash", "merge"):
+        raise ValueError(f"Unknown join strategy: {strategy}")
+    if memory_limit is not None and memory_limit < 1:
+        raise ValueError(f"Memory limit must be at least 1 byte (got {memory_limit})")
+    if num_partitions < 1:
+        raise ValueError(f"There must be at least one partition (got {num_partitions})")
+    joiner = _Joiner(kind, key)
+
+    async def _join_hash(iterations: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        sides = await _sides_of(iterations)
+        # Reading both sides in alternance until one ends tells which is the
+        # smaller, having read no more of the larger.
+        buffers: tuple[list[Any], list[Any]] = ([], [])
+        size = 0
+        ended = None
+        while ended is None:
+            for i in (0, 1):
+                if (x := await _next_or_end(sides[i])) is _end_of_iteration:
+                    ended = i
+                    break
+                buffers[i].append(x)
+                size += sys.getsizeof(x) + _SIZE_POINTER
+            if ended is None and memory_limit is not None and size > memory_limit:
+                async for x in _join_grace(sides, buffers):
+                    yield x
+                return
+
+        table = _HashTable(joiner, build_is_left=ended == 0)
+        for x in buffers[ended]:
+            table.build(x)
+        buffers[ended].clear()
+        for x in buffers[1 - ended]:
+            for y in table.probe(x):
+                yield y
+        buffers[1 - ended].clear()
+        async for x in sides[1 - ended]:
+            for y in table.probe(x):
+                yield y
+        for y in table.unmatched():
+            yield y
+
+    async def _join_grace(
+        sides: tuple[AsyncIterator, AsyncIterator],
+        buffers: tuple[list[Any], list[Any]]
+    ) -> AsyncIterator[Any]:
+        with ExitStack() as files:
+            partitions = [_Partitions(files, num_partitions, joiner.key) for _ in (0, 1)]
+            for side, buffer, partitions_side in builtins.zip(sides, buffers, partitions):
+                for x in buffer:
+                    partitions_side.add(x)
+                buffer.clear()
+                async for x in side:
+                    partitions_side.add(x)
+
+            for i in range(num_partitions):
+                build = 0 if partitions[0].sizes[i] <= partitions[1].sizes[i] else 1
+                table = _HashTable(joiner, build_is_left=build == 0)
+                for x in partitions[build].read(i):
+                    table.build(x)
+                for x in partitions[1 - build].read(i):
+                    for y in table.probe(x):
+                        yield y
+                for y in table.unmatched():
+                    yield y
+
+    async def _join_merge(iterations: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        left, right = await _sides_of(iterations)
+        k = joiner.key
+        l_ = await _next_or_end(left)
+        r_ = await _next_or_end(right)
+        while l_ is not _end_of_iteration and r_ is not _end_of_iteration:
+            kl, kr = k(l_), k(r_)
+            if kl < kr:
+                for y in joiner.left_alone(kl, l_):
+                    yield y
+                l_ = await _next_or_end(left)
+            elif kr < kl:
+                for y in joiner.right_alone(kr, r_):
+                    yield y
+                r_ = await _next_or_end(right)
+            else:
+                group = []
+                while r_ is not _end_of_iteration and k(r_) == kr:
+                    group.append(r_)
+                    r_ = await _next_or_end(right)
+                while l_ is not _end_of_iteration and k(l_) == kl:
+                    if joiner.kind != "anti":
+                        for m in group:
+                            yield joiner.pair(kl, l_, m)
+                    l_ = await _next_or_end(left)
+        while l_ is not _end_of_iteration:
+            for y in joiner.left_alone(k(l_), l_):
+                yield y
+            l_ = await _next_or_end(left)
+        while r_ is not _end_of_iteration:
+            for y in joiner.right_alone(k(r_), r_):
+                yield y
+            r_ = await _next_or_end(right)
+
+    return link(_join_hash if strategy == "hash" else _join_merge)
+
+
+class join:
+    """
+    Joins of two iterations, such as two named iterations of `concurrently`, the
+    first taken as the left side. Elements are matched on their label, or on the
+    key computed by the given function. Pairs of matched elements come out as
+    `Tagged(key, (left, right))`, where either side may be None for unmatched
+    elements in outer joins, and holds the data of the element when matching on
+    labels, or the element itself otherwise.
+
+    The hash strategy builds a hash table of the smaller side and yields elements
+    in no set order. Given a `memory_limit` (in bytes, counted shallowly), it spills
+    both sides to `num_partitions` partitions on disk when the elements it holds
+    before either side ends exceed it, joining these partitions one at a time. The
+    merge strategy expects both sides sorted by key, and only holds the elements of
+    one key of the right side at a time.
+    """
+
+    @staticmethod
+    def inner(
+        key: Optional[Key] = None,
+        strategy: str = "hash",
+        memory_limit: Optional[int] = None,
+        num_partitions: int = 16
+    ) -> Chain[Any, Any]:
+        return _joining("inner", key, strategy, memory_limit, num_partitions)
+
+    @staticmethod
+    def left(
+        key: Optional[Key] = None,
+        strategy: str = "hash",
+        memory_limit: Optional[int] = None,
+        num_partitions: int = 16
+    ) -> Chain[Any, Any]:
+        return _joining("left", key, strategy, memory_limit, num_partitions)
+
+    @staticmethod
+    def outer(
+        key: Optional[Key] = None,
+        strategy: str = "hash",
+        memory_limit: Optional[int] = None,
+        num_partitions: int = 16
+    ) -> Chain[Any, Any]:
+        return _joining("outer", key, strategy, memory_limit, num_partitions)
+
+    @staticmethod
+    def anti(
+        key: Optional[Key] = None,
+        strategy: str = "hash",
+        memory_limit: Optional[int] = None,
+        num_partitions: int = 16
+    ) -> Chain[Any, Any]:
+        """
+        Yields the elements of the left side, as they are, that match none of the
+        right side.
+        """
+        return _joining("anti", key, strategy, memory_limit, num_partitions)
+
+
+async def _feed(
+    elements: AsyncIterable[Any],
+    queue: asyncio.Queue,
+    i: int,
+    room: Optional[asyncio.Semaphore] = None
+) -> None:
+    try:
+        async for x in aiter(elements):
+            if room is not None:
+                await room.acquire()
+            await queue.put((i, x))
+    except Exception as ex:
+        await queue.put((i, _ExceptionInIteration(ex)))
+    else:
+        await queue.put((i, _end_of_iteration))
+
+
+class _Feeding:
+    """
+    Drives each of several iterations in its own task, each pushing its elements
+    into a bounded queue ahead of their consumption, tagged with the index of the
+    iteration. Iterations may instead share a single queue, each then bounded by
+    its own semaphore of `rooms`, which the consumer releases for every element it
+    gets from that iteration. Tasks get cancelled as the consumer exits, whether
+    these iterations are exhausted or not.
+    """
+
+    def __init__(
+        self,
+        iterations: list[AsyncIterable[Any]],
+        queues: list[asyncio.Queue],
+        rooms: Optional[list[asyncio.Semaphore]] = None
+    ) -> None:
+        self._iterations = iterations
+        self._queues = queues
+        self._rooms: list[Optional[asyncio.Semaphore]] = (
+            [None] * len(iterations) if rooms is None else builtins.list(rooms)
+        )
+        self._tasks: list[asyncio.Task] = []
+
+    async def __aenter__(self) -> "_Feeding":
+        self._tasks = [
+            asyncio.create_task(_feed(iteration, queue, i, room))
+            for i, (iteration, queue, room) in enumerate(
+                builtins.zip(self._iterations, self._queues, self._rooms)
+            )
+        ]
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    @staticmethod
+    async def get(queue: asyncio.Queue) -> tuple[int, Any]:
+        i, x = await queue.get()
+        if isinstance(x, _ExceptionInIteration):
+            raise x.exception
+        return i, x
+
+
+async def _labeled(
+    iterations: AsyncIterable[Any]
+) -> tuple[list[Any], list[AsyncIterable[Any]]]:
+    labels: list[Any] = []
+    iterables: list[AsyncIterable[Any]] = []
+    async for iteration in aiter(iterations):
+        labels.append(iteration.label if isinstance(iteration, Tagged) else len(labels))
+        iterables.append(as_iterator_bicolor(iteration))
+    return labels, iterables
+
+
+def mix(size_buffer: int = 16) -> Chain[Any, Tagged]:
+    """
+    Yields the elements of all iterations, such as those of `concurrently`, as soon
+    as any comes, tagged with the name of their iteration, or its index if anonymous.
+    Iterations run concurrently, up to `size_buffer` elements each ahead of the
+    consumer.
+    """
+    _check_size_buffer(size_buffer)
+
+    @link
+    async def _mix(iterations: AsyncIterable[Any]) -> AsyncIterator[Tagged]:
+        labels, iterables = await _labeled(iterations)
+        # Elements come out in the order they arrive, so iterations share a queue,
+        # but each may only get `size_buffer` elements ahead in it.
+        queue: asyncio.Queue = asyncio.Queue()
+        rooms = [asyncio.Semaphore(size_buffer) for _ in iterables]
+        num_running = len(iterables)
+        async with _Feeding(iterables, [queue] * len(iterables), rooms):
+            while num_running > 0:
+                i, x = await _Feeding.get(queue)
+                if x is _end_of_iteration:
+                    num_running -= 1
+                else:
+                    rooms[i].release()
+                    yield Tagged(labels[i], x)
+
+    return _mix
+
+
+def interleave(size_buffer: int = 16) -> Chain[Any, Any]:
+    """
+    Yields the elements of all iterations in turn, one of each at a time, skipping
+    over iterations as they end. Iterations run concurrently, up to `size_buffer`
+    elements each ahead of the consumer.
+    """
+    _check_size_buffer(size_buffer)
+
+    @link
+    async def _interleave(iterations: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        _, iterables = await _labeled(iterations)
+        queues: list[asyncio.Queue] = [asyncio.Queue(size_buffer) for _ in iterables]
+        async with _Feeding(iterables, queues):
+            while queues:
+                running = []
+                for queue in queues:
+                    _, x = await _Feeding.get(queue)
+                    if x is not _end_of_iteration:
+                        running.append(queue)
+                        yield x
+                queues = running
+
+    return _interleave
+
+
+def _zipping(fill: bool, fillvalue: Any, size_buffer: int) -> Chain[Any, tuple]:
+    _check_size_buffer(size_buffer)
+
+    @link
+    async def _zip(iterations: AsyncIterable[Any]) -> AsyncIterator[tuple]:
+        _, iterables = await _labeled(iterations)
+        if not iterables:
+            return
+        queues: list[asyncio.Queue] = [asyncio.Queue(size_buffer) for _ in iterables]
+        ended = [False] * len(queues)
+        async with _Feeding(iterables, queues):
+            while True:
+                xs = []
+                for i, queue in enumerate(queues):
+                    x = fillvalue
+                    if not ended[i]:
+                        _, x = await _Feeding.get(queue)
+                        if x is _end_of_iteration:
+                            if not fill:
+                                return
+                            ended[i] = True
+                            x = fillvalue
+                    xs.append(x)
+                if all(ended):
+                    return
+                yield tuple(xs)
+
+    return _zip
+
+
+def zip(size_buffer: int = 16) -> Chain[Any, tuple]:
+    """
+    Yields tuples of the next element of every iteration, until any ends. Iterations
+    run concurrently, up to `size_buffer` elements each ahead of the consumer, so
+    each tuple waits on the slowest iteration rather than on all in sequence.
+    """
+    return _zipping(False, None, size_buffer)
+
+
+def zip_longest(fillvalue: Any = None, size_buffer: int = 16) -> Chain[Any, tuple]:
+    """
+    Like `zip`, but until all iterations end, standing in `fillvalue` for the
+    elements of those that ended.
+    """
+    return _zipping(True, fillvalue, size_buffer)
+
+
+class Sketch(Protocol):
+    """
+    Summary of an iteration in fixed memory, that takes in elements one at a time,
+    and merges with the sketch of another iteration into the sketch of both.
+    """
+
+    def add(self, x: Any) -> "Sketch":
+        ...
+
+    def merge(self, other: Any) -> "Sketch":
+        ...
+
+    def result(self) -> Any:
+        ...
+
+
+class Reservoir:
+    """
+    Sample of `k` elements drawn without replacement, each with a probability
+    proportional to its weight, through the A-Res algorithm of Efraimidis and
+    Spirakis: each element gets the key `u ** (1 / weight)`, for `u` drawn uniformly
+    in [0, 1), and the sample holds the elements of the k largest keys. With equal
+    weights, the sample is uniform. Reservoirs merge by keeping the k largest keys
+    of both.
+    """
+
+    def __init__(self, k: int, seed: Optional[int] = None) -> None:
+        if k < 1:
+            raise ValueError(f"Sample size must be at least 1 (got {k})")
+        self.k = k
+        self._random = random.Random(seed)
+        self._heap: list[tuple[float, int, Any]] = []
+        self._num_added = 0
+
+    def add(self, x: Any, weight: float = 1.0) -> "Reservoir":
+        if weight <= 0.0:
+            return self
+        key = self._random.random() ** (1.0 / weight)
+        self._num_added += 1
+        # The count breaks ties between keys, so elements never get compared.
+        item = (key, self._num_added, x)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif key > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+        return self
+
+    def merge(self, other: "Reservoir") -> "Reservoir":
+        for key, _, x in other._heap:
+            self._num_added += 1
+            item = (key, self._num_added, x)
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, item)
+            elif key > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+        return self
+
+    def result(self) -> list[Any]:
+        return [x for _, _, x in self._heap]
+
+
+_MASK_64 = (1 << 64) - 1
+
+
+def _mix64(h: int) -> int:
+    """
+    Finalizer of the SplitMix64 generator, so that hashes of small integers (which
+    are these integers) spread over all bits.
+    """
+    h = (h + 0x9E3779B97F4A7C15) & _MASK_64
+    h = ((h ^ (h >> 30)) * 0xBF58476D1CE4E5B9) & _MASK_64
+    h = ((h ^ (h >> 27)) * 0x94D049BB133111EB) & _MASK_64
+    return h ^ (h >> 31)
+
+
+def _hash64(x: Any) -> int:
+    """
+    64-bit hash that, unlike `hash`, is the same across processes for strings and
+    bytes, so that sketches made in different processes can merge.
+    """
+    if isinstance(x, str):
+        x = x.encode("utf-8")
+    if isinstance(x, bytes):
+        return int.from_bytes(hashlib.blake2b(x, digest_size=8).digest())
+    return _mix64(hash(x) & _MASK_64)
+
+
+class HyperLogLog:
+    """
+    Estimate of the number of distinct elements, with a relative standard error of
+    about `1.04 / sqrt(2 ** precision)`, in `2 ** precision` bytes. Elements must be
+    hashable; estimates from different processes only merge for elements whose
+    hash is the same across processes, such as numbers, strings and bytes.
+    """
+
+    def __init__(self, precision: int = 14) -> None:
+        if not 4 <= precision <= 18:
+            raise ValueError(f"Precision must be between 4 and 18 (got {precision})")
+        self.precision = precision
+        self._registers = bytearray(1 << precision)
+
+    def add(self, x: Any) -> "HyperLogLog":
+        h = _hash64(x)
+        num_bits_rest = 64 - self.precision
+        i = h >> num_bits_rest
+        rank = num_bits_rest - (h & ((1 << num_bits_rest) - 1)).bit_length() + 1
+        if rank > self._registers[i]:
+            self._registers[i] = rank
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError("Can't merge HyperLogLog sketches of different precisions")
+        self._registers = bytearray(builtins.map(builtins.max, self._registers, other._registers))
+        return self
+
+    def result(self) -> int:
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / builtins.sum(2.0 ** -r for r in self._registers)
+        num_zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and num_zeros > 0:
+            estimate = m * math.log(m / num_zeros)
+        return round(estimate)
+
+
+class TDigest:
+    """
+    Estimates of quantiles, most accurate towards the extremes, from a merging
+    t-digest of Dunning: elements are buffered, then merged into at most about
+    `compression` centroids, each summarizing neighbouring elements by their mean and
+    number, with fewer elements per centroid towards the tails (per the k1 scale
+    function). Digests merge by merging their centroids. Their result is the list of
+    estimates of quantiles `qs`.
+    """
+
+    def __init__(self, compression: float = 100.0, qs: Sequence[float] = (0.5,)) -> None:
+        if compression < 10:
+            raise ValueError(f"Compression must be at least 10 (got {compression})")
+        for q in qs:
+            if not 0.0 <= q <= 1.0:
+                raise ValueError(f"Quantile must be between 0 and 1 (got {q})")
+        self.compression = compression
+        self.qs = tuple(qs)
+        self._centroids: list[tuple[float, float]] = []
+        self._buffer: list[tuple[float, float]] = []
+        self._size_buffer = builtins.max(int(5 * compression), 50)
+        self.count = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float, weight: float = 1.0) -> "TDigest":
+        self._buffer.append((x, weight))
+        self.count += weight
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if len(self._buffer) >= self._size_buffer:
+            self._compress()
+        return self
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        self._buffer.extend(other._centroids)
+        self._buffer.extend(other._buffer)
+        self.count += other.count
+        self.min = builtins.min(self.min, other.min)
+        self.max = builtins.max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k: float) -> float:
+        return (math.sin(k * 2 * math.pi / self.compression) + 1) / 2
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        centroids = []
+        total = self.count
+        q_done = 0.0
+        q_limit = self._q(self._k(q_done) + 1)
+        mean, weight = points[0]
+        for x, w in points[1:]:
+            if q_done + (weight + w) / total <= q_limit:
+                weight += w
+                mean += (x - mean) * w / weight
+            else:
+                centroids.append((mean, weight))
+                q_done += weight / total
+                q_limit = self._q(self._k(q_done) + 1)
+                mean, weight = x, w
+        centroids.append((mean, weight))
+        self._centroids = centroids
+
+    def quantile(self, q: float) -> float:
+        if not 0.0 <= q <= 1.0:
+            raise ValueError(f"Quantile must be between 0 and 1 (got {q})")
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return math.nan
+        if len(centroids) == 1:
+            return centroids[0][0]
+        target = q * self.count
+        # Each centroid stands at the middle of the elements it summarizes.
+        position = 0.0
+        mean_previous, position_previous = self.min, 0.0
+        for mean, weight in centroids:
+            center = position + weight / 2
+            if target < center:
+                if center == position_previous:
+                    return mean
+                fraction = (target - position_previous) / (center - position_previous)
+                return mean_previous + fraction * (mean - mean_previous)
+            mean_previous, position_previous = mean, center
+            position += weight
+        if position == position_previous:
+            return self.max
+        fraction = (target - position_previous) / (position - position_previous)
+        return mean_previous + fraction * (self.max - mean_previous)
+
+    def result(self) -> list[float]:
+        return [self.quantile(q) for q in self.qs]
+
+
+def _sketching(
+    make: Callable[[], Any],
+    add: Callable[[Any, Any], Any],
+    result: Callable[[Any], Any],
+    every: Optional[int],
+    sketch: bool
+) -> Chain[Any, Any]:
+    if every is not None and every < 1:
+        raise ValueError(f"Estimates must come every 1 element at least (got {every})")
+    make()  # Checks the parameters of the sketch right away.
+
+    def _final(s: Any, n: int) -> Iterator[Any]:
+        if sketch:
+            yield s
+        elif every is None or n == 0 or n % every != 0:
+            yield result(s)
+
+    async def _sketch(elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        s = make()
+        n = 0
+        async for x in aiter(elements):
+            add(s, x)
+            n += 1
+            if every is not None and n % every == 0:
+                yield result(s)
+        for y in _final(s, n):
+            yield y
+
+    def _sketch_sync(elements: Iterable[Any]) -> Iterator[Any]:
+        s = make()
+        n = 0
+        for x in elements:
+            add(s, x)
+            n += 1
+            if every is not None and n % every == 0:
+                yield result(s)
+        yield from _final(s, n)
+
+    return link(_sketch, _sketch_sync)
+
+
+def sample(
+    k: int,
+    weight: Optional[Key] = None,
+    seed: Optional[int] = None,
+    every: Optional[int] = None,
+    sketch: bool = False
+) -> Chain[T, list[T]]:
+    """
+    Yields a random sample of k elements, drawn without replacement, at the end of
+    the iteration, as `reduce` would. Elements have equal chances of being picked,
+    or chances proportional to the given `weight`. Given `every`, also yields the
+    sample so far every so many elements, as `cumulate` would. With `sketch`, yields
+    the `Reservoir` at the end rather than its sample, for merging with those of
+    other iterations.
+    """
+    def _add(s: Reservoir, x: Any) -> None:
+        if weight is None:
+            s.add(x)
+        else:
+            s.add(x, weight(x))
+
+    return _sketching(lambda: Reservoir(k, seed), _add, Reservoir.result, every, sketch)
+
+
+def count_distinct(
+    precision: int = 14,
+    key: Optional[Key] = None,
+    every: Optional[int] = None,
+    sketch: bool = False
+) -> Chain[Any, int]:
+    """
+    Yields an estimate of the number of distinct elements, or distinct keys, at the
+    end of the iteration, from a `HyperLogLog` sketch; and given `every`, also every
+    so many elements. With `sketch`, yields the sketch at the end rather than its
+    estimate, for merging with those of other iterations.
+    """
+    def _add(s: HyperLogLog, x: Any) -> None:
+        s.add(x if key is None else key(x))
+
+    return _sketching(lambda: HyperLogLog(precision), _add, HyperLogLog.result, every, sketch)
+
+
+def quantiles(
+    qs: Sequence[float],
+    compression: float = 100.0,
+    every: Optional[int] = None,
+    sketch: bool = False
+) -> Chain[float, list[float]]:
+    """
+    Yields estimates of the given quantiles of the (numeric) elements at the end of
+    the iteration, from a `TDigest`; and given `every`, also every so many elements.
+    With `sketch`, yields the digest at the end rather than its estimates, for
+    merging with those of other iterations.
+    """
+    return _sketching(
+        lambda: TDigest(compression, qs),
+        TDigest.add,
+        TDigest.result,
+        every,
+        sketch
+    )
+
+
+Fold = Callable[[Any, Any], Any]
+
+
+@dataclass(frozen=True)
+class Aggregator:
+    """
+    Aggregation of the elements of a group, folded with `step` into an accumulator
+    that starts as `initial()`, and read out with `result`. Aggregations that must
+    spill to disk also `merge` partial accumulators of a same group.
+    """
+    initial: Callable[[], Any]
+    step: Fold
+    result: Callable[[Any], Any] = _itself
+    merge: Optional[Fold] = None
+
+
+def _min_of(a: Any, b: Any) -> Any:
+    return b if a is None else a if b is None else min(a, b)
+
+
+def _max_of(a: Any, b: Any) -> Any:
+    return b if a is None else a if b is None else max(a, b)
+
+
+class agg:
+    """
+    Aggregators for `groupby` and `window`, each over the elements of a group, or
+    over the values computed by the given `of` function.
+    """
+
+    @staticmethod
+    def count() -> Aggregator:
+        return Aggregator(lambda: 0, lambda n, _: n + 1, merge=operator.add)
+
+    @staticmethod
+    def sum(of: Optional[Key] = None) -> Aggregator:
+        v = of or _itself
+        return Aggregator(lambda: 0, lambda s, x: s + v(x), merge=operator.add)
+
+    @staticmethod
+    def min(of: Optional[Key] = None) -> Aggregator:
+        v = of or _itself
+        return Aggregator(lambda: None, lambda m, x: _min_of(m, v(x)), merge=_min_of)
+
+    @staticmethod
+    def max(of: Optional[Key] = None) -> Aggregator:
+        v = of or _itself
+        return Aggregator(lambda: None, lambda m, x: _max_of(m, v(x)), merge=_max_of)
+
+    @staticmethod
+    def mean(of: Optional[Key] = None) -> Aggregator:
+        v = of or _itself
+        return Aggregator(
+            lambda: (0, 0),
+            lambda sn, x: (sn[0] + v(x), sn[1] + 1),
+            lambda sn: sn[0] / sn[1],
+            lambda a, b: (a[0] + b[0], a[1] + b[1])
+        )
+
+    @staticmethod
+    def list(of: Optional[Key] = None) -> Aggregator:
+        v = of or _itself
+
+        def _append(xs: builtins.list[Any], x: Any) -> builtins.list[Any]:
+            xs.append(v(x))
+            return xs
+
+        return Aggregator(builtins.list, _append, merge=operator.add)
+
+    @staticmethod
+    def fold(step: Fold, initial: Any, merge: Optional[Fold] = None) -> Aggregator:
+        """
+        Folds the elements of a group with `step`, from an immutable `initial` value.
+        """
+        return Aggregator(lambda: initial, step, merge=merge)
+
+    @staticmethod
+    def sketch(make: Callable[[], Sketch], of: Optional[Key] = None) -> Aggregator:
+        """
+        Summarizes the elements of a group into a sketch, such as a `HyperLogLog`,
+        made anew by `make` for each group; the result is that of the sketch.
+        """
+        v = of or _itself
+        return Aggregator(make, lambda s, x: s.add(v(x)), _result_of, _merged)
+
+
+def _result_of(s: Sketch) -> Any:
+    return s.result()
+
+
+def _merged(s: Sketch, other: Sketch) -> Sketch:
+    return s.merge(other)
+
+
+Aggregation = Union[Aggregator, Sequence[Aggregator], Mapping[str, Aggregator]]
+
+
+def _as_aggregator(aggregation: Aggregation) -> Aggregator:
+    """
+    Composes a tuple or a dictionary of aggregators into a single one, that computes
+    them all in the same pass and yields their results in a tuple or a dictionary.
+    """
+    if isinstance(aggregation, Aggregator):
+        return aggregation
+    names = builtins.list(aggregation) if isinstance(aggregation, Mapping) else None
+    aggregators = builtins.list(
+        aggregation.values() if isinstance(aggregation, Mapping) else aggregation
+    )
+
+    def _initial() -> builtins.list[Any]:
+        return [a.initial() for a in aggregators]
+
+    def _step(accs: builtins.list[Any], x: Any) -> builtins.list[Any]:
+        for i, a in enumerate(aggregators):
+            accs[i] = a.step(accs[i], x)
+        return accs
+
+    def _result(accs: builtins.list[Any]) -> Any:
+        results = (a.result(acc) for a, acc in builtins.zip(aggregators, accs))
+        return tuple(results) if names is None else dict(builtins.zip(names, results))
+
+    def _merge(accs: builtins.list[Any], others: builtins.list[Any]) -> builtins.list[Any]:
+        return [cast(Fold, a.merge)(p, q) for a, p, q in builtins.zip(aggregators, accs, others)]
+
+    mergeable = all(a.merge is not None for a in aggregators)
+    return Aggregator(_initial, _step, _result, _merge if mergeable else None)
+
+
+class _Groups:
+    """
+    Accumulators of the groups met so far, holding up to about `memory_limit` bytes
+    of keys and accumulators as they are created (shallow sizes, as per
+    `sys.getsizeof`) before spilling partial accumulators to hashed partitions.
+    """
+
+    def __init__(
+        self,
+        files: ExitStack,
+        key: Optional[Key],
+        aggregator: Aggregator,
+        memory_limit: Optional[int],
+        num_partitions: int
+    ) -> None:
+        self._files = files
+        self._key: Key = key or _label_of
+        self._value: Key = _data_of if key is None else _itself
+        self._aggregator = aggregator
+        self._memory_limit = memory_limit
+        self._num_partitions = num_partitions
+        self._partitions: Optional[_Partitions] = None
+        self._accs: dict[Any, Any] = {}
+        self._size = 0
+
+    def add(self, x: Any) -> bool:
+        """
+        Folds an element into its group; tells whether the budget is spent.
+        """
+        k = self._key(x)
+        accs = self._accs
+        if k in accs:
+            accs[k] = self._aggregator.step(accs[k], self._value(x))
+            return False
+        accs[k] = acc = self._aggregator.step(self._aggregator.initial(), self._value(x))
+        if self._memory_limit is None:
+            return False
+        self._size += sys.getsizeof(k) + sys.getsizeof(acc) + 3 * _SIZE_POINTER
+        return self._size >= self._memory_limit
+
+    def spill(self) -> None:
+        if self._partitions is None:
+            self._partitions = _Partitions(self._files, self._num_partitions, _first)
+        for partial in self._accs.items():
+            self._partitions.add(partial)
+        self._accs, self._size = {}, 0
+
+    def results(self) -> Iterator[Tagged]:
+        result = self._aggregator.result
+        if self._partitions is None:
+            for k, acc in self._accs.items():
+                yield Tagged(k, result(acc))
+            return
+        self.spill()
+        merge = cast(Fold, self._aggregator.merge)
+        for i in range(self._num_partitions):
+            accs: dict[Any, Any] = {}
+            for k, acc in self._partitions.read(i):
+                accs[k] = merge(accs[k], acc) if k in accs else acc
+            for k, acc in accs.items():
+                yield Tagged(k, result(acc))
+
+
+def _first(pair: tuple[Any, Any]) -> Any:
+    return pair[0]
+
+
+def groupby(
+    key: Optional[Key] = None,
+    aggregate: Optional[Aggregation] = None,
+    sorted: bool = False,
+    memory_limit: Optional[int] = None,
+    num_partitions: int = 16
+) -> Chain[Any, Tagged]:
+    """
+    Groups elements by their label, or by the key computed by the given function,
+    and yields `Tagged(key, result)` for each group. The result aggregates the data
+    of the elements when grouping on labels, or the elements themselves otherwise,
+    with one aggregator of `agg`, or several at once given as a tuple or a
+    dictionary. Without an aggregator, groups are gathered into lists.
+
+    Groups come out once the iteration ends, in order of first appearance. With a
+    `memory_limit` (in bytes), partial accumulators get spilled to `num_partitions`
+    partitions on disk when they exceed it, and are merged group by group at the
+    end, in no set order. When elements come sorted by key, `sorted=True` yields
+    each group as soon as the next one starts, holding a single accumulator.
+    """
+    aggregator = _as_aggregator(agg.list() if aggregate is None else aggregate)
+    if memory_limit is not None:
+        if memory_limit < 1:
+            raise ValueError(f"Memory limit must be at least 1 byte (got {memory_limit})")
+        if aggregator.merge is None:
+            raise ValueError("Aggregating under a memory limit requires merging")
+    if num_partitions < 1:
+        raise ValueError(f"There must be at least one partition (got {num_partitions})")
+    key_: Key = key or _label_of
+    value: Key = _data_of if key is None else _itself
+
+    def _groupby_sorted_sync(elements: Iterable[Any]) -> Iterator[Tagged]:
+        k = acc = _end_of_iteration
+        for x in elements:
+            kx = key_(x)
+            if acc is _end_of_iteration or kx != k:
+                if acc is not _end_of_iteration:
+                    yield Tagged(k, aggregator.result(acc))
+                k, acc = kx, aggregator.initial()
+            acc = aggregator.step(acc, value(x))
+        if acc is not _end_of_iteration:
+            yield Tagged(k, aggregator.result(acc))
+
+    async def _groupby_sorted(elements: AsyncIterable[Any]) -> AsyncIterator[Tagged]:
+        k = acc = _end_of_iteration
+        async for x in aiter(elements):
+            kx = key_(x)
+            if acc is _end_of_iteration or kx != k:
+                if acc is not _end_of_iteration:
+                    yield Tagged(k, aggregator.result(acc))
+                k, acc = kx, aggregator.initial()
+            acc = aggregator.step(acc, value(x))
+        if acc is not _end_of_iteration:
+            yield Tagged(k, aggregator.result(acc))
+
+    async def _groupby(elements: AsyncIterable[Any]) -> AsyncIterator[Tagged]:
+        with ExitStack() as files:
+            groups = _Groups(files, key, aggregator, memory_limit, num_partitions)
+            async for x in aiter(elements):
+                if groups.add(x):
+                    await asyncio.to_thread(groups.spill)
+            for tagd in groups.results():
+                yield tagd
+
+    def _groupby_sync(elements: Iterable[Any]) -> Iterator[Tagged]:
+        with ExitStack() as files:
+            groups = _Groups(files, key, aggregator, memory_limit, num_partitions)
+            for x in elements:
+                if groups.add(x):
+                    groups.spill()
+            yield from groups.results()
+
+    if sorted:
+        return link(_groupby_sorted, _groupby_sorted_sync)
+    return link(_groupby, _groupby_sync)
+
+
+@dataclass(slots=True)
+class Window(Generic[U]):
+    """
+    Result of the aggregation of the elements timed within [start, end).
+    """
+    start: Any
+    end: Any
+    result: U
+
+
+class _TwoStacks:
+    """
+    Queue of the accumulators of consecutive panes, aggregated as a whole in amortized
+    constant time as per the Two-Stacks algorithm: the back of the queue is folded as
+    it grows, and the front holds the aggregates of its suffixes, computed anew from
+    the back when it runs out. Merges only update their first argument, which is
+    always either fresh or no longer needed, so the aggregates kept stay intact.
+    """
+
+    def __init__(self, aggregator: Aggregator) -> None:
+        self._aggregator = aggregator
+        self._merge = cast(Fold, aggregator.merge)
+        self._front: builtins.list[tuple[int, Any]] = []
+        self._back: builtins.list[tuple[int, Any]] = []
+        self._back_acc = aggregator.initial()
+
+    def __bool__(self) -> bool:
+        return bool(self._front or self._back)
+
+    def oldest(self) -> int:
+        return self._front[-1][0] if self._front else self._back[0][0]
+
+    def push(self, pane: int, acc: Any) -> None:
+        self._back.append((pane, acc))
+        self._back_acc = self._merge(self._back_acc, acc)
+
+    def evict(self) -> None:
+        if not self._front:
+            suffix: Any = _end_of_iteration
+            for pane, acc in reversed(self._back):
+                suffix = acc if suffix is _end_of_iteration else self._merge(acc, suffix)
+                self._front.append((pane, suffix))
+            self._back.clear()
+            self._back_acc = self._aggregator.initial()
+        self._front.pop()
+
+    def result(self) -> Any:
+        acc = self._aggregator.initial()
+        if self._front:
+            acc = self._merge(acc, self._front[-1][1])
+        return self._aggregator.result(self._merge(acc, self._back_acc))
+
+
+class _Windows:
+    """
+    Windows over the elements of a stream (or of a label), as accumulators of panes
+    `slide` long, each window spanning `num_panes` of them. Panes stay open to
+    elements until closed by the watermark, then join the queue from which windows
+    get aggregated.
+    """
+
+    def __init__(self, aggregator: Aggregator, slide: Any, num_panes: int) -> None:
+        self._aggregator = aggregator
+        self._slide = slide
+        self._num_panes = num_panes
+        self._open: dict[int, Any] = {}
+        self._closed = _TwoStacks(aggregator) if num_panes > 1 else None
+        # Index of the next window to emit, unknown until its panes close.
+        self._next: Union[int, float] = -math.inf
+
+    def __bool__(self) -> bool:
+        return bool(self._open or self._closed)
+
+    def add(self, pane: int, value: Any) -> None:
+        acc = self._open[pane] if pane in self._open else self._aggregator.initial()
+        self._open[pane] = self._aggregator.step(acc, value)
+
+    def close(self, through: Union[int, float]) -> Iterator[Window]:
+        """
+        Closes the panes up to index `through`, and yields the windows they end.
+        """
+        for pane in builtins.sorted(p for p in self._open if p <= through):
+            acc = self._open.pop(pane)
+            if self._closed is None:
+                yield Window(
+                    pane * self._slide, (pane + 1) * self._slide, self._aggregator.result(acc)
+                )
+            else:
+                yield from self._emit(pane - 1)
+                self._closed.push(pane, acc)
+        if self._closed is not None:
+            yield from self._emit(through)
+
+    def _emit(self, through: Union[int, float]) -> Iterator[Window]:
+        # Windows are indexed by their last pane; those holding no element are skipped.
+        closed = cast(_TwoStacks, self._closed)
+        while True:
+            while closed and closed.oldest() <= self._next - self._num_panes:
+                closed.evict()
+            if not closed:
+                return
+            last = builtins.max(self._next, closed.oldest())
+            if last > through:
+                return
+            yield Window(
+                (last - self._num_panes + 1) * self._slide,
+                (last + 1) * self._slide,
+                closed.result()
+            )
+            self._next = last + 1
+
+
+class _Windowing:
+    """
+    Windows of a stream, or of each label of the stream, under a common watermark.
+    """
+
+    def __init__(
+        self,
+        time_key: Key,
+        aggregator: Aggregator,
+        slide: Any,
+        num_panes: int,
+        lateness: Any,
+        by_label: bool
+    ) -> None:
+        self._time_key = time_key
+        self._aggregator = aggregator
+        self._slide = slide
+        self._num_panes = num_panes
+        self._lateness = lateness
+        self._by_label = by_label
+        self._windows: dict[Any, _Windows] = {}
+        self._time_max: Any = None
+        self._closed: Union[int, float] = -math.inf
+
+    def add(self, x: Any) -> Iterator[Any]:
+        label, value = (x.label, x.data) if self._by_label else (None, x)
+        t = self._time_key(value)
+        pane = int(t // self._slide)
+        if pane <= self._closed:
+            return
+        if label not in self._windows:
+            self._windows[label] = _Windows(self._aggregator, self._slide, self._num_panes)
+        self._windows[label].add(pane, value)
+        if self._time_max is None or t > self._time_max:
+            self._time_max = t
+            # Panes ending at or before the watermark get no more elements.
+            through = int((t - self._lateness) // self._slide) - 1
+            if through > self._closed:
+                yield from self._close(through)
+
+    def end(self) -> Iterator[Any]:
+        return self._close(math.inf)
+
+    def _close(self, through: Union[int, float]) -> Iterator[Any]:
+        self._closed = through
+        for label, windows in builtins.list(self._windows.items()):
+            for w in windows.close(through):
+                yield Tagged(label, w) if self._by_label else w
+            if not windows:
+                del self._windows[label]
+
+
+def window(
+    time_key: Key,
+    size: Any,
+    slide: Any = None,
+    aggregate: Optional[Aggregation] = None,
+    lateness: Any = 0,
+    by_label: bool = False
+) -> Chain[Any, Any]:
+    """
+    Aggregates the elements into windows `size` long over the time computed by
+    `time_key` (a number, such as seconds since the epoch), with a window starting
+    at every multiple of `slide`; by default, `slide` is `size`, so windows tumble.
+    Yields a `Window` for each window that holds elements, with the result of an
+    aggregator of `agg`, or of several given as a tuple or a dictionary, as for
+    `groupby`. Without an aggregator, elements are gathered into lists.
+
+    Elements may come out of time order by up to `lateness`. Windows come out in
+    order as soon as the watermark, the latest time met minus `lateness`, passes
+    their end, and the rest once the iteration ends; elements timed within a window
+    that already came out are dropped. Sliding windows are aggregated incrementally,
+    merging the accumulators of panes `slide` long rather than folding each window
+    anew, so `size` must be a multiple of `slide` and the aggregators must merge. A
+    merge may update its first argument in place, as long as it returns it.
+
+    With `by_label=True`, each label of tagged elements gets its own windows over
+    their data (under the common watermark), which come out as `Tagged(label, w)`.
+    """
+    aggregator = _as_aggregator(agg.list() if aggregate is None else aggregate)
+    slide_ = size if slide is None else slide
+    if size <= 0:
+        raise ValueError(f"Window size must be positive (got {size})")
+    if slide_ <= 0:
+        raise ValueError(f"Slide must be positive (got {slide_})")
+    num_panes = round(size / slide_)
+    if num_panes < 1 or not math.isclose(num_panes * slide_, size):
+        raise ValueError(f"Window size must be a multiple of the slide (got {size}, {slide_})")
+    if num_panes > 1 and aggregator.merge is None:
+        raise ValueError("Sliding windows require aggregators that merge")
+    if lateness < 0:
+        raise ValueError(f"Lateness must not be negative (got {lateness})")
+
+    def _windowing() -> _Windowing:
+        return _Windowing(time_key, aggregator, slide_, num_panes, lateness, by_label)
+
+    async def _window(elements: AsyncIterable[Any]) -> AsyncIterator[Any]:
+        windowing = _windowing()
+        async for x in aiter(elements):
+            for w in windowing.add(x):
+                yield w
+        for w in windowing.end():
+            yield w
+
+    def _window_sync(elements: Iterable[Any]) -> Iterator[Any]:
+        windowing = _windowing()
+        for x in elements:
+            yield from windowing.add(x)
+        yield from windowing.end()
+
+    return link(_window, _window_sync)
+
+
+def uniq(key: Optional[Key] = None) -> Chain[T, T]:
+    """
+    Drops the elements equal to the one just before, or with the same key, so that
+    runs of consecutive duplicates come out as their first element.
+    """
+    async def _uniq(elements: AsyncIterable[T]) -> AsyncIterator[T]:
+        k_last: Any = _end_of_iteration
+        async for x in aiter(elements):
+            k = x if key is None else key(x)
+            if k_last is _end_of_iteration or k != k_last:
+                k_last = k
+                yield x
+
+    def _uniq_sync(elements: Iterable[T]) -> Iterator[T]:
+        return (next(run) for _, run in it.groupby(elements, key))
+
+    return link(_uniq, _uniq_sync)
+
+
+class _Bloom:
+    """
+    Bloom filter over a bit array of `num_bits`, setting `num_hashes` bits per key,
+    derived from two halves of a mixed hash of the key.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int) -> None:
+        self._bits = bytearray((num_bits + 7) // 8)
+        self._num_bits = num_bits
+        self._num_hashes = num_hashes
+
+    @staticmethod
+    def sized(
+        capacity: Optional[int],
+        error_rate: float,
+        max_bytes: Optional[int]
+    ) -> "_Bloom":
+        """
+        Filter sized for `capacity` keys at the given false positive rate, within
+        `max_bytes`; or using up `max_bytes` if the capacity is unknown.
+        """
+        ln2 = math.log(2)
+        if capacity is None:
+            num_bits = 8 * cast(int, max_bytes)
+            return _Bloom(num_bits, max(1, round(-math.log(error_rate) / ln2)))
+        num_bits = math.ceil(-capacity * math.log(error_rate) / ln2 ** 2)
+        if max_bytes is not None:
+            num_bits = min(num_bits, 8 * max_bytes)
+        return _Bloom(num_bits, max(1, round(num_bits / capacity * ln2)))
+
+    def add(self, key: Any) -> bool:
+        """
+        Adds a key; tells whether it was new, as far as the filter can tell.
+        """
+        h = _mix64(hash(key) & _MASK_64)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        bits = self._bits
+        new = False
+        for i in range(self._num_hashes):
+            j = (h1 + i * h2) % self._num_bits
+            mask = 1 << (j & 7)
+            if not bits[j >> 3] & mask:
+                bits[j >> 3] |= mask
+                new = True
+        return new
+
+
+class _Seen:
+    """
+    Keys seen so far, all of them, or only the `max_size` seen most recently, and
+    only if seen within the last `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int],
+        ttl: Optional[float],
+        clock: Callable[[], float]
+    ) -> None:
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._seen: dict[Any, float] = {}
+
+    def add(self, key: Any) -> bool:
+        """
+        Adds a key, or refreshes it; tells whether it was new.
+        """
+        seen = self._seen
+        if self._max_size is None and self._ttl is None:
+            if key in seen:
+                return False
+            seen[key] = 0.0
+            return True
+        now = self._clock() if self._ttl is not None else 0.0
+        if self._ttl is not None:
+            while seen:
+                oldest = next(iter(seen))
+                if now - seen[oldest] <= self._ttl:
+                    break
+                del seen[oldest]
+        new = seen.pop(key, None) is None
+        seen[key] = now
+        if self._max_size is not None and len(seen) > self._max_size:
+            del seen[next(iter(seen))]
+        return new
+
+
+def distinct(
+    key: Optional[Key] = None,
+    mode: str = "exact",
+    max_size: Optional[int] = None,
+    ttl: Optional[float] = None,
+    capacity: Optional[int] = None,
+    error_rate: float = 0.01,
+    max_bytes: Optional[int] = None,
+    clock: Callable[[], float] = monotonic
+) -> Chain[T, T]:
+    """
+    Drops the elements equal to one seen before, or with the same key as one seen
+    before; keys must be hashable. In exact mode, keys seen are held in a set, which
+    grows with the number of distinct keys, unless it keeps only the `max_size` keys
+    seen most recently, or only the keys seen within the last `ttl` seconds (as per
+    `clock`): past that, keys seen again count as new.
+
+    In bloom mode, keys seen are held in a Bloom filter sized for `capacity` keys
+    with the given `error_rate`, within `max_bytes`. New elements then get dropped
+    once in a while, at about this rate, but elements seen before never pass. With
+    no known capacity, the filter takes up `max_bytes`.
+    """
+    if mode not in ("exact", "bloom"):
+        raise ValueError(f"Unknown distinct mode: {mode}")
+    if max_size is not None and max_size < 1:
+        raise ValueError(f"Maximum size must be at least 1 (got {max_size})")
+    if ttl is not None and ttl <= 0:
+        raise ValueError(f"Time to live must be positive (got {ttl})")
+    if mode == "bloom":
+        if capacity is None and max_bytes is None:
+            raise ValueError("A Bloom filter needs a capacity or a memory limit")
+        if capacity is not None and capacity < 1:
+            raise ValueError(f"Capacity must be at least 1 (got {capacity})")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError(f"Memory limit must be at least 1 byte (got {max_bytes})")
+        if not 0.0 < error_rate < 1.0:
+            raise ValueError(f"Error rate must be between 0 and 1 (got {error_rate})")
+
+    def _seen() -> Callable[[Any], bool]:
+        if mode == "bloom":
+            return _Bloom.sized(capacity, error_rate, max_bytes).add
+        return _Seen(max_size, ttl, clock).add
+
+    async def _distinct(elements: AsyncIterable[T]) -> AsyncIterator[T]:
+        is_new = _seen()
+        async for x in aiter(elements):
+            if is_new(x if key is None else key(x)):
+                yield x
+
+    def _distinct_sync(elements: Iterable[T]) -> Iterator[T]:
+        is_new = _seen()
+        for x in elements:
+            if is_new(x if key is None else key(x)):
+                yield x
+
+    return link(_distinct, _distinct_sync)
+
+
+Block = Union[str, bytes, memoryview]
+SIZE_BUFFER_DEFAULT = 1 << 16
+
+
+def _blocks_text(file: IO[str], size_buffer: int) -> Iterator[str]:
+    while block := file.read(size_buffer):
+        yield block
+
+
+def _blocks_binary(file: IO[bytes], size_buffer: int) -> Iterator[memoryview]:
+    while True:
+        buffer = bytearray(size_buffer)
+        num_read = file.readinto(buffer)  # type: ignore
+        if not num_read:
+            return
+        if num_read < size_buffer:
+            del buffer[num_read:]
+        yield memoryview(buffer)
+
+
+def _blocks_mmap(file: IO[bytes], size_buffer: int) -> Iterator[memoryview]:
+    if os.fstat(file.fileno()).st_size == 0:
+        return
+    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        with memoryview(mapped) as view:
+            for i in range(0, len(view), size_buffer):
+                yield view[i:i + size_buffer]
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            pass  # Blocks are still in use: the mapping goes once they are all freed.
+
+
+def _open_blocks(
+    path: Path_,
+    size_buffer: int,
+    binary: bool,
+    encoding: str,
+    use_mmap: bool
+) -> tuple[IO, Iterator[Block]]:
+    if not binary:
+        file_text = open(path, "r", encoding=encoding)
+        return file_text, _blocks_text(file_text, size_buffer)
+    file = open(path, "rb", buffering=0)
+    return file, (_blocks_mmap if use_mmap else _blocks_binary)(file, size_buffer)
+
+
+def read(
+    size_buffer: int = SIZE_BUFFER_DEFAULT,
+    binary: bool = False,
+    encoding: str = "utf-8",
+    mmap: bool = False
+) -> Chain[Path_, Block]:
+    """
+    Reads the files named by the incoming paths, yielding their contents in blocks of
+    `size_buffer` characters (or bytes, in binary mode); pair with `lines` or `split`
+    to get records. Binary blocks are memoryviews over the buffers they were read
+    into, or over the file mapped in memory if `mmap` is set. Asynchronous
+    iterations read from a worker thread, so as not to stall the event loop.
+    """
+    if size_buffer < 1:
+        raise ValueError(f"Buffer size must be at least 1 (got {size_buffer})")
+    if mmap and not binary:
+        raise ValueError("Only binary files can be mapped in memory")
+
+    async def _read(paths: AsyncIterable[Path_]) -> AsyncIterator[Block]:
+        async for path in aiter(paths):
+            file, blocks = await asyncio.to_thread(
+                _open_blocks, path, size_buffer, binary, encoding, mmap
+            )
+            with file:
+                while (block := await asyncio.to_thread(next, blocks, None)) is not None:
+                    yield block
+
+    def _read_sync(paths: Iterable[Path_]) -> Iterator[Block]:
+        for path in paths:
+            file, blocks = _open_blocks(path, size_buffer, binary, encoding, mmap)
+            with file:
+                yield from blocks
+
+    return link(_read, _read_sync)
+
+
+class _Splitter:
+    """
+    Cuts blocks of text or bytes into records, carrying incomplete records over to
+    the next block. Records cut from memoryview blocks are themselves memoryviews
+    over these blocks, save for those straddling two blocks.
+    """
+
+    def __init__(self, separator: Optional[str | bytes]) -> None:
+        self._separator = separator
+        self._carry: Any = None
+
+    def _separator_for(self, block: Block) -> str | bytes:
+        if self._separator is not None:
+            return self._separator
+        return "\n" if isinstance(block, str) else b"\n"
+
+    def feed(self, block: Block) -> list[Block]:
+        separator = self._separator_for(block)
+        if isinstance(block, memoryview):
+            return self._feed_view(block, cast(bytes, separator))
+        carry = self._carry
+        if carry and len(separator) > 1:
+            block = cast(Any, carry) + block
+            carry = None
+        records = cast(Any, block).split(separator)
+        if carry:
+            records[0] = carry + records[0]
+        self._carry = records.pop()
+        return records
+
+    def _feed_view(self, block: memoryview, separator: bytes) -> list[Block]:
+        if self._carry and len(separator) > 1:
+            block = memoryview(bytes(self._carry) + bytes(block))
+            self._carry = None
+        records: list[Block] = []
+        start = 0
+        for match in re.finditer(re.escape(separator), block):
+            records.append(block[start:match.start()])
+            start = match.end()
+        if self._carry:
+            if records:
+                records[0] = bytes(self._carry) + bytes(cast(memoryview, records[0]))
+                self._carry = block[start:]
+            else:
+                self._carry = bytes(self._carry) + bytes(block)
+        else:
+            self._carry = block[start:]
+        return records
+
+    def end(self) -> list[Block]:
+        carry, self._carry = self._carry, None
+        return [carry] if carry else []
+
+
+def split(separator: Optional[str | bytes] = None) -> Chain[Block, Block]:
+    """
+    Cuts a stream of text or binary blocks into the records they hold between
+    separators; a newline by default. A trailing separator does not start an
+    empty record.
+    """
+    if separator is not None and not separator:
+        raise ValueError("The separator cannot be empty")
+
+    async def _split(blocks: AsyncIterable[Block]) -> AsyncIterator[Block]:
+        splitter = _Splitter(separator)
+        async for block in aiter(blocks):
+            for record in splitter.feed(block):
+                yield record
+        for record in splitter.end():
+            yield record
+
+    def _split_sync(blocks: Iterable[Block]) -> Iterator[Block]:
+        splitter = _Splitter(separator)
+        for block in blocks:
+            yield from splitter.feed(block)
+        yield from splitter.end()
+
+    return link(_split, _split_sync)
+
+
+lines: Chain[Block, Block] = split()
+
+
+def glue(
+    separator: Optional[str | bytes] = None,
+    size_batch: int = 1024
+) -> Chain[Block, Block]:
+    """
+    Joins records back into large blocks of up to `size_batch` records, each record
+    followed by the separator (a newline by default): the inverse of `split`.
+    """
+    if size_batch < 1:
+        raise ValueError(f"Batch size must be at least 1 (got {size_batch})")
+
+    def _glued(records: tuple[Block, ...]) -> Block:
+        sep = separator
+        if sep is None:
+            sep = "\n" if isinstance(records[0], str) else b"\n"
+        return cast(Any, sep).join(records) + sep
+
+    batching: Chain[Block, tuple[Block, ...]] = batch(size_batch)
+    return batching | map(_glued)
+
+
+def _open_for_writing(path: Path_, binary: bool, encoding: str, append: bool) -> IO:
+    mode = "a" if append else "w"
+    if binary:
+        return open(path, mode + "b")
+    return open(path, mode, encoding=encoding)
+
+
+def write(
+    path: Path_,
+    binary: bool = False,
+    encoding: str = "utf-8",
+    append: bool = False,
+    size_batch: int = 1024
+) -> Chain[Block, Never]:
+    """
+    Writes the incoming blocks or records, as they are, to a file, handing them over
+    in batches of `size_batch` to `writelines`; use `glue` first to separate records.
+    Asynchronous iterations write from a worker thread. Yields nothing.
+    """
+    if size_batch < 1:
+        raise ValueError(f"Batch size must be at least 1 (got {size_batch})")
+    batching: Chain[Block, tuple[Block, ...]] = batch(size_batch)
+
+    async def _write(elements: AsyncIterable[Block]) -> AsyncIterator[Never]:
+        file = await asyncio.to_thread(_open_for_writing, path, binary, encoding, append)
+        try:
+            async for b in aiter(elements > batching):
+                await asyncio.to_thread(file.writelines, b)
+        finally:
+            await asyncio.to_thread(file.close)
+        if False:
+            yield None
+
+    def _write_sync(elements: Iterable[Block]) -> Iterator[Never]:
+        with _open_for_writing(path, binary, encoding, append) as file:
+            for b in elements > batching:
+                file.writelines(b)
+        yield from ()
+
+    return link(_write, _write_sync)
+
+
+_Block = Union[list[Any], tuple[int, int]]
+
+
+class _Recording:
+    """
+    Elements of a stream recorded in blocks, as it runs, for replaying it as many
+    times as needed, even while it is still being recorded. Blocks are lists held in
+    memory until the recording gets spilled; from then on, they are pickled to a
+    temporary file, and referred to by their offset and length in this file. The
+    file gets closed, which frees its space, once the recording is closed or no
+    longer referred to, such as by a replay.
+    """
+
+    def __init__(self, spill_dir: Optional[Path_]) -> None:
+        self._spill_dir = spill_dir
+        self.thread = get_ident()
+        self._lock = Lock()
+        self._blocks: list[_Block] = []
+        self._current: list[Any] = []
+        self._file: Optional[IO[bytes]] = None
+        self._waiters: list[Callable[[], Any]] = []
+        self._close_file: Optional[Callable[[], Any]] = None
+        self.size_memory = 0
+        self.size_disk = 0
+        self.done = False
+        self.abandoned = False
+        self.error: Optional[Exception] = None
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def _write(self, block: list[Any]) -> tuple[int, int]:
+        file = cast(IO[bytes], self._file)
+        data = pickle.dumps(block, pickle.HIGHEST_PROTOCOL)
+        offset = file.seek(0, os.SEEK_END)
+        file.write(data)
+        file.flush()
+        self.size_disk += len(data)
+        return offset, len(data)
+
+    def _notify(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter()
+
+    def append(self, x: Any) -> None:
+        with self._lock:
+            self._current.append(x)
+            if not self.spilled:
+                self.size_memory += sys.getsizeof(x) + _SIZE_POINTER
+            if len(self._current) >= _SIZE_BLOCK_SPILL:
+                block, self._current = self._current, []
+                self._blocks.append(self._write(block) if self.spilled else block)
+            self._notify()
+
+    def spill(self) -> None:
+        """
+        Moves the blocks recorded so far to a temporary file, as will be all further
+        blocks.
+        """
+        with self._lock:
+            if self.spilled:
+                return
+            self._file = tempfile.TemporaryFile(dir=cast(Any, self._spill_dir))
+            self._close_file = weakref.finalize(self, self._file.close)
+            self._blocks = [self._write(cast(list, block)) for block in self._blocks]
+            self.size_memory = 0
+
+    def end(self, error: Optional[Exception] = None, abandoned: bool = False) -> None:
+        with self._lock:
+            self.done = True
+            self.error = error
+            self.abandoned = abandoned
+            self._notify()
+
+    def close(self) -> None:
+        if self._close_file is not None:
+            self._close_file()
+
+    def _read(self, block: _Block) -> list[Any]:
+        if isinstance(block, list):
+            return block
+        offset, length = block
+        return pickle.loads(os.pread(cast(IO[bytes], self._file).fileno(), length, offset))
+
+    def take(self, k: int, j: int, waiter: Callable[[], Any]) -> Optional[list[Any]]:
+        """
+        Elements from index j of block k, as far as recorded; none when the recording
+        is over past this position. Empty when there are none yet, in which case the
+        waiter gets called once there are.
+        """
+        with self._lock:
+            if k < len(self._blocks):
+                block = self._blocks[k]
+            elif j < len(self._current):
+                return self._current[j:]
+            elif self.done:
+                return None
+            else:
+                self._waiters.append(waiter)
+                return []
+        return self._read(block)[j:]
+
+
+class Cache:
+    """
+    Store of the streams recorded by `cache` stages, under their keys. Once streams
+    take up more than `max_bytes` of memory (counted shallowly, as per
+    `sys.getsizeof`), the least recently used are evicted. Streams that take up more
+    than `max_bytes` on their own are spilled to temporary files in `spill_dir`
+    instead, and replayed from there lazily. Once spilled streams take up more than
+    `max_bytes_disk` (by default, 16 times `max_bytes`), the least recently used are
+    evicted too, and their files deleted as soon as no replay reads them anymore.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        spill_dir: Optional[Path_] = None,
+        max_bytes_disk: Optional[int] = None
+    ) -> None:
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError(f"Memory limit must be at least 1 byte (got {max_bytes})")
+        if max_bytes_disk is not None and max_bytes_disk < 1:
+            raise ValueError(f"Disk limit must be at least 1 byte (got {max_bytes_disk})")
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        if max_bytes_disk is None and max_bytes is not None:
+            max_bytes_disk = 16 * max_bytes
+        self.max_bytes_disk = max_bytes_disk
+        self._lock = Lock()
+        self._streams: dict[Hashable, _Recording] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._streams
+
+    def _recording(self, key: Hashable) -> tuple[_Recording, bool]:
+        """
+        Recording of the stream with the given key, and whether it's for the caller
+        to record, as none is already recorded or underway.
+        """
+        with self._lock:
+            recording = self._streams.pop(key, None)
+            leading = recording is None or (recording.done and recording.error is not None)
+            if leading:
+                recording = _Recording(self.spill_dir)
+            self._streams[key] = cast(_Recording, recording)
+            return cast(_Recording, recording), leading
+
+    def _recorded(self, recording: _Recording) -> None:
+        if self.max_bytes is None:
+            return
+        if not recording.spilled and recording.size_memory > self.max_bytes:
+            recording.spill()
+        with self._lock:
+            size = builtins.sum(r.size_memory for r in self._streams.values())
+            for key in builtins.list(self._streams):
+                if size <= self.max_bytes:
+                    break
+                r = self._streams[key]
+                if r.done and r is not recording and r.size_memory > 0:
+                    del self._streams[key]
+                    size -= r.size_memory
+                    r.close()
+            if self.max_bytes_disk is None:
+                return
+            size_disk = builtins.sum(r.size_disk for r in self._streams.values())
+            for key in builtins.list(self._streams):
+                if size_disk <= self.max_bytes_disk:
+                    break
+                r = self._streams[key]
+                if r.done and r is not recording and r.size_disk > 0:
+                    # Replays still underway keep the file open until they let go.
+                    del self._streams[key]
+                    size_disk -= r.size_disk
+
+    def _forget(self, key: Hashable, recording: _Recording) -> None:
+        with self._lock:
+            if self._streams.get(key) is recording:
+                del self._streams[key]
+        recording.close()
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            recording = self._streams.pop(key, None)
+        if recording is not None and recording.done:
+            recording.close()
+
+    def clear(self) -> None:
+        for key in builtins.list(self._streams):
+            self.discard(key)
+
+
+def _replay_sync(recording: _Recording) -> Generator[Any, None, int]:
+    """
+    Replays a recording, waiting for its elements as they get recorded. Returns how
+    many elements it yielded, in case the recording got abandoned along the way.
+    """
+    k = j = 0
+    available = Event()
+    while (xs := recording.take(k, j, available.set)) is not None:
+        if not xs:
+            available.wait()
+            available.clear()
+            continue
+        yield from xs
+        j += len(xs)
+        if j >= _SIZE_BLOCK_SPILL:
+            k, j = k + 1, 0
+    return k * _SIZE_BLOCK_SPILL + j
+
+
+async def _replay(recording: _Recording, num_yielded: list[int]) -> AsyncIterator[Any]:
+    loop = asyncio.get_running_loop()
+    available = asyncio.Event()
+
+    def _wake() -> None:
+        try:
+            loop.call_soon_threadsafe(available.set)
+        except RuntimeError:
+            pass  # The event loop is already closed: nobody's waiting anymore.
+
+    k = j = 0
+    while (xs := recording.take(k, j, _wake)) is not None:
+        if not xs:
+            await available.wait()
+            available.clear()
+            continue
+        for x in xs:
+            yield x
+            num_yielded[0] += 1
+        j += len(xs)
+        if j >= _SIZE_BLOCK_SPILL:
+            k, j = k + 1, 0
+
+
+def cache(
+    key: Hashable = None,
+    max_bytes: Optional[int] = None,
+    spill_dir: Optional[Path_] = None,
+    store: Optional[Cache] = None,
+    max_bytes_disk: Optional[int] = None
+) -> Chain[T, T]:
+    """
+    Records the elements that go through on the first iteration, and replays them
+    on later iterations instead of running upstream stages again. Streams are
+    recorded under the given key, in a store of their own, unless stages share a
+    `store`, which then sets their memory and disk limits and spill directory. Iterations
+    that start while a stream is being recorded follow this recording instead of
+    making another pass upstream. Should the recording iteration stop early, they
+    go on upstream on their own; should it fail, they fail too, and the stream gets
+    recorded anew on the next iteration.
+    """
+    if store is None:
+        store = Cache(max_bytes, spill_dir, max_bytes_disk)
+    elif max_bytes is not None or spill_dir is not None or max_bytes_disk is not None:
+        raise ValueError("Set the limits and spill directory on the shared store")
+    store_ = store
+
+    def _record_sync(elements: Iterable[T], recording: _Recording) -> Iterator[T]:
+        try:
+            for n, x in enumerate(elements, start=1):
+                recording.append(x)
+                if n % _SIZE_BLOCK_SPILL == 0:
+                    store_._recorded(recording)
+                yield x
+        except Exception as ex:
+            recording.end(error=ex)
+            raise
+        except BaseException:
+            recording.end(abandoned=True)
+            store_._forget(key, recording)
+            raise
+        recording.end()
+        store_._recorded(recording)
+
+    def _cache_sync(elements: Iterable[T]) -> Iterator[T]:
+        recording, leading = store_._recording(key)
+        if leading:
+            yield from _record_sync(elements, recording)
+            return
+        if recording.thread == get_ident() and not recording.done:
+            # Waiting on a recording made in this very thread would never end.
+            yield from elements
+            return
+        num_yielded = yield from _replay_sync(recording)
+        if recording.error is not None:
+            raise recording.error
+        if recording.abandoned:
+            yield from it.islice(elements, num_yielded, None)
+
+    async def _cache(elements: AsyncIterable[T]) -> AsyncIterator[T]:
+        recording, leading = store_._recording(key)
+        if leading:
+            n = 0
+            try:
+                async for x in aiter(elements):
+                    recording.append(x)
+                    n += 1
+                    if n % _SIZE_BLOCK_SPILL == 0:
+                        await asyncio.to_thread(store_._recorded, recording)
+                    yield x
+            except Exception as ex:
+                recording.end(error=ex)
+                raise
+            except BaseException:
+                recording.end(abandoned=True)
+                store_._forget(key, recording)
+                raise
+            recording.end()
+            await asyncio.to_thread(store_._recorded, recording)
+            return
+
+        num_yielded = [0]
+        async for x in _replay(recording, num_yielded):
+            yield x
+        if recording.error is not None:
+            raise recording.error
+        if recording.abandoned:
+            num_skipped = 0
+            async for x in aiter(elements):
+                if num_skipped < num_yielded[0]:
+                    num_skipped += 1
+                else:
+                    yield x
+
+    return link(_cache, _cache_sync)
+
+
 # TBD:
 #
 # permutations
@@ -518,57 +4606,100 @@ def dispatch(*chains: Chain[Any, Any]) -> Chain[Any, AsyncIterator[Any]]:
 #
 # Multisequences:
 #
-# mix (tagged mixing)
-# interleave
-# zip, zip_longest, separate
+# separate
 # product
-# join.inner, join.outer, join.left, join.anti
-# groupby
 # dispatch
 # cond
 # select
 # cat
-# dup
-#
-# Text:
-#
-# read, write (files)
-# lines
-# split
-# glue (join)
 
 
 __all__ = [
+    "afilter",
+    "agg",
+    "Aggregator",
+    "amap",
+    "amapargs",
     "batch",
+    "batch_array",
+    "cache",
+    "Cache",
     "Chain",
     "clamp",
+    "count_distinct",
     "concurrently",
     "cut",
     "cumulate",
     "dispatch",
+    "distinct",
     "drain",
+    "dup",
     "extend",
     "filter",
+    "filter_mask",
+    "glue",
+    "groupby",
+    "Handoff",
+    "HANDOFF_DEFAULT",
     "head",
+    "HyperLogLog",
+    "interleave",
     "is_iterator_bicolor",
+    "iter_through_thread",
+    "join",
+    "ChainIteration",
+    "Checkpointing",
     "IteratorBicolor",
     "Link",
+    "lines",
     "link",
+    "LinkMetrics",
+    "LinkSync",
     "map",
+    "map_batch",
     "mapargs",
+    "mix",
     "name",
     "ngrams",
+    "nlargest",
+    "nsmallest",
+    "pmap",
+    "quantiles",
+    "read",
     "reduce",
+    "Reservoir",
+    "Report",
+    "Resumable",
     "reverse",
+    "Runtime",
+    "runtime_active",
+    "sample",
+    "set_runtime_default",
+    "set_shared_thread_pool",
+    "shared_thread_pool",
+    "Sketch",
     "sort",
     "slice_",
+    "split",
+    "Sorting",
+    "Stage",
     "strip",
     "tag",
     "Tagged",
     "TaggedIterable",
     "tail",
+    "TDigest",
+    "tmap",
+    "topk",
     "truncate",
+    "unbatch",
+    "uniq",
     "value_at",
+    "window",
+    "Window",
     "with_name",
     "WrapperBicolor",
+    "write",
+    "zip",
+    "zip_longest",
 ]
@@ -1,3 +1,5 @@
+import asyncio
+
 from itercat import link
 
 
@@ -5,3 +7,26 @@ from itercat import link
 async def increment(nums):
     async for num in nums:
         yield num + 1
+
+
+def collect_async(iteration):
+    async def _collect():
+        return [x async for x in iteration]
+
+    return asyncio.run(_collect())
+
+
+async def count_async(n):
+    for i in range(n):
+        yield i
+
+
+async def each_async(elements):
+    for x in elements:
+        yield x
+
+
+async def slowly(elements, delay):
+    for x in elements:
+        await asyncio.sleep(delay)
+        yield x
@@ -0,0 +1,242 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on caching streams")
+
+with app.setup:
+    import asyncio
+    import marimo as mo  # noqa
+    import pytest
+    import tempfile
+    import threading
+    import time
+
+    from itercat import (  # type: ignore
+        cache,
+        Cache,
+        head,
+        map,
+    )
+    from _test import collect_async, each_async
+
+
+@app.function
+def counting_():
+    reads = []
+
+    def _source(n, delay=0.0):
+        for i in range(n):
+            if delay:
+                time.sleep(delay)
+            reads.append(i)
+            yield i
+
+    return reads, _source
+
+
+@app.function
+def test_cache_replays():
+    reads, source = counting_()
+    chain = map(lambda n: n * 2) | cache() | map(lambda n: n + 1)
+    expected = [2 * n + 1 for n in range(10)]
+    assert expected == list(source(10) > chain)
+    assert expected == list(source(10) > chain)
+    assert expected == collect_async(each_async(source(10)) > chain)
+    assert list(range(10)) == reads
+
+
+@app.function
+def test_cache_async_records():
+    reads, source = counting_()
+    chain = cache()
+    assert list(range(10)) == collect_async(each_async(source(10)) > chain)
+    assert list(range(10)) == list(source(10) > chain)
+    assert list(range(10)) == reads
+
+
+@app.function
+def test_cache_keys_share_store():
+    store = Cache()
+    assert [0, 1, 2] == list(range(3) > cache("a", store=store))
+    assert [0, 1, 2] == list(range(5) > cache("a", store=store))
+    assert [0, 1, 2, 3, 4] == list(range(5) > cache("b", store=store))
+    assert 2 == len(store)
+    store.discard("a")
+    assert [0, 1, 2, 3] == list(range(4) > cache("a", store=store))
+    store.clear()
+    assert 0 == len(store)
+
+
+@app.function
+def test_cache_lru():
+    store = Cache(max_bytes=2000)
+    for key in "abc":
+        list(range(40) > cache(key, store=store))
+    # Each stream takes up about 1.3 kB, so only the last one fits.
+    assert "a" not in store and "b" not in store and "c" in store
+
+
+@app.function
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_cache_spill(asynchronous, tmp_path, monkeypatch):
+    num_spilled = 0
+    temporary_file = tempfile.TemporaryFile
+
+    def _counting(*args, **kwargs):
+        nonlocal num_spilled
+        num_spilled += 1
+        assert str(tmp_path) == str(kwargs["dir"])
+        return temporary_file(*args, **kwargs)
+
+    monkeypatch.setattr(tempfile, "TemporaryFile", _counting)
+    reads, source = counting_()
+    chain = cache(max_bytes=10000, spill_dir=tmp_path)
+    n = 10000
+    if asynchronous:
+        assert list(range(n)) == collect_async(each_async(source(n)) > chain)
+    else:
+        assert list(range(n)) == list(source(n) > chain)
+    assert 1 == num_spilled
+    assert list(range(n)) == list(source(n) > chain)
+    assert list(range(n)) == collect_async(each_async(source(n)) > chain)
+    assert list(range(n)) == reads
+
+
+@app.function
+def test_cache_spilled_lru(tmp_path, monkeypatch):
+    files = []
+    temporary_file = tempfile.TemporaryFile
+
+    def _keeping(*args, **kwargs):
+        files.append(temporary_file(*args, **kwargs))
+        return files[-1]
+
+    monkeypatch.setattr(tempfile, "TemporaryFile", _keeping)
+    store = Cache(max_bytes=50_000, spill_dir=tmp_path, max_bytes_disk=100_000)
+    assert list(range(5000)) == list(range(5000) > cache("first", store=store))
+    replaying = iter(range(5000) > cache("first", store=store))
+    assert [0, 1, 2] == [next(replaying) for _ in range(3)]
+    for key in range(20):
+        assert list(range(5000)) == list(range(5000) > cache(key, store=store))
+    assert 20 == len(files) - 1
+    # Only the most recent spilled streams remain, within the disk limit.
+    assert 19 in store and "first" not in store and len(store) < 20
+    assert all(file.closed for file in files[1:-len(store)])
+    # The evicted stream's file stays open for the replay underway, until it's over.
+    assert not files[0].closed
+    assert list(range(3, 5000)) == list(replaying)
+    del replaying
+    assert files[0].closed
+    assert 16 * 1000 == Cache(max_bytes=1000).max_bytes_disk
+
+
+@app.function
+def test_cache_shared_pass():
+    reads, source = counting_()
+    chain = cache()
+    results = [None, None]
+
+    def _run(i):
+        results[i] = list(source(20, 0.005) > chain)
+
+    threads = [threading.Thread(target=_run, args=(i,)) for i in range(2)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    assert [list(range(20))] * 2 == results
+    assert list(range(20)) == reads
+
+
+@app.function
+def test_cache_shared_pass_async():
+    reads, source = counting_()
+    chain = cache()
+
+    async def _slowly():
+        for x in source(20):
+            await asyncio.sleep(0.001)
+            yield x
+
+    async def _both():
+        async def _collect():
+            return [x async for x in _slowly() > chain]
+
+        return await asyncio.gather(_collect(), _collect())
+
+    assert [list(range(20))] * 2 == asyncio.run(_both())
+    assert list(range(20)) == reads
+
+
+@app.function
+def test_cache_leader_stops_early():
+    reads, source = counting_()
+    chain = cache()
+    following = []
+    started = threading.Event()
+
+    def _follow():
+        started.wait()
+        following.extend(source(10, 0.001) > chain)
+
+    th = threading.Thread(target=_follow)
+    th.start()
+    iteration = iter(source(10, 0.001) > chain)
+    assert [0, 1] == [next(iteration), next(iteration)]
+    started.set()
+    time.sleep(0.02)
+    iteration.close()
+    th.join()
+    assert list(range(10)) == following
+    # Stopped early, the stream isn't cached: the next iteration records it.
+    assert list(range(10)) == list(source(10) > chain)
+
+
+@app.function
+def test_cache_same_thread():
+    chain = cache()
+    first = iter(range(5) > chain)
+    second = iter(range(5) > chain)
+    assert [(0, 0), (1, 1)] == [(next(first), next(second)) for _ in range(2)]
+    assert [2, 3, 4] == list(second)
+    assert [2, 3, 4] == list(first)
+
+
+@app.function
+def test_cache_error_not_kept():
+    attempts = []
+
+    def _flaky():
+        attempts.append(None)
+        yield 1
+        if len(attempts) == 1:
+            raise RuntimeError("oops")
+        yield 2
+
+    chain = cache()
+    with pytest.raises(RuntimeError):
+        list(_flaky() > chain)
+    assert [1, 2] == list(_flaky() > chain)
+    assert [1, 2] == list(_flaky() > chain)
+    assert 2 == len(attempts)
+
+
+@app.function
+def test_cache_head():
+    chain = cache() | head(3)
+    assert [0, 1, 2] == list(range(10) > chain)
+    assert [0, 1, 2] == list(range(10) > chain)
+
+
+@app.function
+def test_cache_invalid():
+    with pytest.raises(ValueError):
+        cache(max_bytes=0)
+    with pytest.raises(ValueError):
+        cache(max_bytes=100, store=Cache())
+    with pytest.raises(ValueError):
+        Cache(max_bytes_disk=0)
+
+
+if __name__ == "__main__":
+    app.run()
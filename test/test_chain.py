@@ -4,15 +4,24 @@ __generated_with = "0.13.9"
 app = marimo.App(width="full", app_title="Unit tests on basic chains")
 
 with app.setup:
+    import asyncio
+    from collections import deque
+    from collections.abc import Sequence
     import itertools as it
     import marimo as mo  # noqa
     from math import sqrt
     from operator import add, mul, neg
     import pytest
-    from typing import cast
+    import tempfile
+    import threading
+    import time
+    from typing import Any, cast
 
+    import itercat  # type: ignore
     from itercat import (  # type: ignore
         batch,
+        Chain,
+        ChainIteration,
         clamp,
         concurrently,
         cut,
@@ -21,25 +30,32 @@ with app.setup:
         drain,
         extend,
         filter,
+        Handoff,
         head,
         is_iterator_bicolor,
         map,
         mapargs,
         ngrams,
+        nlargest,
+        nsmallest,
+        Predicate,
         reduce,
         reverse,
         sort,
         slice_,
+        Stage,
         strip,
         tag,
         Tagged,
         TaggedIterable,
         tail,
+        topk,
         truncate,
         value_at,
         with_name,
+        WrapperBicolor,
     )
-    from _test import increment
+    from _test import collect_async, count_async, each_async, increment
 
 
 @app.function
@@ -114,6 +130,15 @@ def test_map_filter_reduce():
     assert [3] == list((4, -2, 0, 1, -1) > _seq)
 
 
+@app.function
+def test_reduce_drops_none():
+    chain = reduce(lambda a, b: None)
+    assert [] == list([1, 2] > chain)
+    assert [] == collect_async(each_async([1, 2]) > chain)
+    assert [] == list([None] > reduce(add))
+    assert [] == list([] > reduce(add, None))
+
+
 @app.function
 def test_cumulate_no_initial():
     assert [3, 7, 12] == list([3, 4, 5] > cumulate(add))
@@ -305,6 +330,28 @@ def test_strip():
     )
 
 
+@app.function
+def test_tagged_compact():
+    tagd = Tagged("a", 1)
+    assert not hasattr(tagd, "__dict__")
+    with pytest.raises(AttributeError):
+        tagd.extra = None
+
+
+@app.function
+@pytest.mark.parametrize("memory_limit", [None, 64])
+def test_sort_tagged_by_label(memory_limit, monkeypatch):
+    def _no_lt(self, other):
+        raise AssertionError("Tagged elements compared through __lt__")
+
+    monkeypatch.setattr(Tagged, "__lt__", _no_lt)
+    tagged = [Tagged(n % 3, n) for n in range(12)]
+    expected = [0, 3, 6, 9, 1, 4, 7, 10, 2, 5, 8, 11]
+    sorting = sort(memory_limit=memory_limit)
+    assert expected == [t.data for t in tagged > sorting]
+    assert expected == [t.data for t in collect_async(tagged > sorting)]
+
+
 @app.function
 def test_sort():
     assert ["asdf", "ghgh", "poiu", "qwer", "zxcv"] == list(
@@ -443,5 +490,453 @@ def test_dispatch_anonymous_1for1():
     assert [[0, 1, 3, 6, 10], [1, 2, 3, 4, 5, 6, 7, 8], [0, 2, 4]] == [list(i) for i in iters]
 
 
+@app.function
+@pytest.mark.parametrize(
+    "input,chain",
+    [
+        (range(15), map(lambda x: x * 2)),
+        ([(n, n + 1) for n in range(15)], mapargs(add)),
+        (range(15), filter(lambda x: x % 3 == 0)),
+        (range(15), cumulate(add, None)),
+        (range(15), cumulate(mul, 1)),
+        (range(15), reduce(add, None)),
+        ([], reduce(add, None)),
+        (range(15), batch(4)),
+        (range(15), ngrams(3)),
+        (range(2), ngrams(3)),
+        (range(15), slice_(2, 13, 3)),
+        (range(15), head(4)),
+        (range(15), tail(3)),
+        (range(15), cut(lambda x: x < 7)),
+        (range(15), clamp(lambda x: x < 7)),
+        (range(15), tag(lambda x: x % 2) | sort | cast(Chain[Any, Any], strip)),
+        (range(15), reverse),
+        (range(15), extend([100, 101])),
+        (range(15), drain),
+        (range(15), truncate),
+    ],
+)
+def test_synchronous_same_as_asynchronous(input, chain):
+    iteration_sync = input > chain
+    assert cast(ChainIteration, iteration_sync).is_synchronous
+    assert collect_async(input > chain) == list(iteration_sync)
+
+
+@app.function
+def test_synchronous_runs_in_calling_thread():
+    threads = []
+
+    def record_thread(x):
+        threads.append(threading.get_ident())
+        return x
+
+    assert [0, 2, 4] == list(range(5) > map(record_thread) | filter(lambda x: x % 2 == 0))
+    assert threads == [threading.get_ident()] * 5
+
+
+@app.function
+def test_asynchronous_source_not_synchronous():
+    async def _iter():
+        yield 3
+        yield 4
+
+    iteration = _iter() > map(lambda x: x + 1)
+    assert not cast(ChainIteration, iteration).is_synchronous
+    assert [4, 5] == list(iteration)
+
+
+@app.function
+def test_custom_link_not_synchronous():
+    iteration = [1, 2] > map(lambda x: x * 10) | increment
+    assert not cast(ChainIteration, iteration).is_synchronous
+    assert [11, 21] == list(iteration)
+
+
+@app.function
+def test_synchronous_iteration_as_input():
+    iteration = (range(5) > map(lambda x: x * 3)) > filter(lambda x: x % 2 == 0)
+    assert cast(ChainIteration, iteration).is_synchronous
+    assert [0, 6, 12] == list(iteration)
+
+
+@app.function
+@pytest.mark.parametrize("capacity,size_chunk", [(1, 1), (2, 5), (16, 128)])
+def test_handoff_chunks(capacity, size_chunk):
+    async def _iter():
+        for n in range(1000):
+            yield n
+
+    handoff = Handoff(capacity=capacity, size_chunk=size_chunk)
+    assert list(range(1000)) == list(WrapperBicolor(_iter(), handoff))
+
+
+@app.function
+def test_handoff_backpressure():
+    produced = []
+
+    async def _iter():
+        for n in it.count():
+            produced.append(n)
+            yield n
+
+    iteration = iter(WrapperBicolor(_iter(), Handoff(capacity=2, size_chunk=10)))
+    assert 0 == next(iteration)
+    time.sleep(0.3)
+    assert len(produced) <= 10 * 4
+    iteration.close()
+
+
+@app.function
+def test_handoff_stops_producer_on_early_exit():
+    stopped = threading.Event()
+
+    async def _iter():
+        try:
+            for n in it.count():
+                yield n
+        finally:
+            stopped.set()
+
+    threads_before = set(threading.enumerate())
+    elements = iter(WrapperBicolor(_iter(), Handoff(capacity=1)))
+    assert [0, 1, 2] == [next(elements) for _ in range(3)]
+    producers = set(threading.enumerate()) - threads_before
+    assert producers
+    elements.close()
+    assert stopped.wait(timeout=5.0)
+    for producer in producers:
+        producer.join(timeout=5.0)
+        assert not producer.is_alive()
+
+
+@app.function
+def test_handoff_latency_flushes_incomplete_chunk():
+    async def _iter():
+        yield 1
+        await asyncio.sleep(1.0)
+        yield 2
+
+    iteration = iter(WrapperBicolor(_iter(), Handoff(size_chunk=100, latency=0.01)))
+    start = time.monotonic()
+    assert 1 == next(iteration)
+    assert time.monotonic() - start < 0.5
+    assert [2] == list(iteration)
+
+
+@app.function
+def test_handoff_exception_after_elements():
+    async def _iter():
+        yield 1
+        yield 2
+        raise RuntimeError("boom")
+
+    elements = []
+    with pytest.raises(RuntimeError):
+        for x in WrapperBicolor(_iter(), Handoff(size_chunk=100)):
+            elements.append(x)
+    assert [1, 2] == elements
+
+
+@app.function
+@pytest.mark.parametrize(
+    "capacity,size_chunk,latency", [(0, 1, 0.0), (1, 0, 0.0), (1, 1, -1.0)]
+)
+def test_handoff_bad_settings(capacity, size_chunk, latency):
+    with pytest.raises(ValueError):
+        Handoff(capacity, size_chunk, latency)
+
+
+@app.function
+def test_concurrently_with_handoff():
+    handoff = Handoff(capacity=1, size_chunk=1)
+    iters = list(concurrently(asdf=range(5)).with_handoff(handoff))
+    assert [handoff] == [cast(TaggedIterable, i).handoff for i in iters]
+    assert [[0, 1, 2, 3, 4]] == [list(i) for i in iters]
+
+
+@app.function
+@pytest.mark.parametrize(
+    "chain",
+    [
+        map(lambda x: x * 3) | filter(lambda x: x % 2 == 0) | map(lambda x: x + 1),
+        map(lambda x: (x, x)) | mapargs(mul) | cut(lambda x: x < 50),
+        tag(lambda x: x % 3)
+        | filter(cast(Predicate[Tagged[int, int]], lambda t: t.label == 1))
+        | strip,
+        map(lambda x: x + 1) | increment | map(lambda x: x * 2) | filter(bool),
+        filter(lambda x: x > 4) | batch(2) | map(sum) | map(neg),
+    ],
+)
+def test_fusion_same_as_unfused(chain):
+    expected = collect_async(count_async(20) > chain.unfused())
+    assert expected == collect_async(count_async(20) > chain)
+    assert expected == list(count_async(20) > chain)
+
+
+@app.function
+def test_fusion_makes_single_loop():
+    chain = map(lambda x: x + 1) | filter(lambda x: x % 2 == 0) | map(str)
+    assert "_fused" == aiter(count_async(5) > chain).__name__
+    assert "_fused" != aiter(count_async(5) > chain.unfused()).__name__
+    assert "_fused" != aiter(count_async(5) > map(str)).__name__
+
+
+@app.function
+def test_fusion_custom_link_barrier():
+    chain = map(lambda x: x + 1) | increment
+    assert "increment" == aiter(count_async(5) > chain).__name__
+
+
+@app.function
+def test_unfused_composition():
+    assert not (map(str).unfused() | filter(bool)).fuse
+    assert not (map(str) | filter(bool).unfused()).fuse
+    assert (map(str) | filter(bool)).fuse
+
+
+@app.function
+def test_tail_long():
+    assert list(range(99_000, 100_000)) == list(range(100_000) > tail(1000))
+    assert list(range(99_000, 100_000)) == collect_async(count_async(100_000) > tail(1000))
+
+
+@app.function
+def test_tail_consumes_lazily():
+    consumed = []
+
+    def _elements():
+        for n in range(5):
+            consumed.append(n)
+            yield n
+
+    [stage] = tail(2).links
+    tailing = cast(Stage, stage).synchronous(_elements())
+    assert [] == consumed
+    assert [3, 4] == list(tailing)
+
+
+@app.function
+@pytest.mark.parametrize("k", [0, 1, 3, 10, 100])
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("key", [None, lambda x: x % 7])
+def test_topk_as_sort_head(k, reverse, key):
+    elements = [(n * 37) % 50 for n in range(50)]
+    expected = sorted(elements, key=key, reverse=reverse)[:k]
+    assert expected == list(elements > topk(k, key, reverse))
+    assert expected == collect_async(elements > topk(k, key, reverse))
+
+
+@app.function
+def test_topk_stable():
+    elements = [("b", 1), ("a", 2), ("b", 3), ("a", 4), ("c", 5), ("a", 6)]
+    expected = [("a", 2), ("a", 4), ("a", 6), ("b", 1)]
+    assert expected == list(elements > topk(4, key=value_at(0)))
+    assert expected == collect_async(elements > topk(4, key=value_at(0)))
+
+
+@app.function
+@pytest.mark.parametrize("reverse", [False, True])
+def test_topk_never_compares_elements(reverse):
+    # Dictionaries don't order, so only their keys and indices may get compared.
+    elements = [{"n": n % 3, "i": i} for i, n in enumerate(range(30, 0, -1))]
+    expected = sorted(elements, key=lambda d: d["n"], reverse=reverse)[:5]
+    chain = topk(5, key=lambda d: d["n"], reverse=reverse)
+    assert expected == list(elements > chain)
+    assert expected == collect_async(each_async(elements) > chain)
+    assert [] == collect_async(each_async([]) > chain)
+
+
+@app.function
+def test_nsmallest_nlargest():
+    assert [0, 1, 2] == list(range(10, -1, -1) > nsmallest(3))
+    assert [10, 9, 8] == list(range(11) > nlargest(3))
+    assert ["ccc", "bb"] == list(["a", "ccc", "bb"] > nlargest(2, key=len))
+
+
+@app.function
+def test_topk_negative():
+    with pytest.raises(ValueError):
+        topk(-1)
+
+
+@app.function
+def shuffled_():
+    yield [(n * 7919) % 1000 for n in range(1000)]
+
+
+@app.function
+@pytest.mark.parametrize("memory_limit", [None, 1, 1000, 10_000, 10**9])
+@pytest.mark.parametrize("key,reverse", [(None, False), (None, True), (lambda x: x % 10, False)])
+def test_sort_key_reverse_memory_limit(memory_limit, key, reverse):
+    for shuffled in shuffled_():
+        expected = sorted(shuffled, key=key, reverse=reverse)
+        chain = sort(key=key, reverse=reverse, memory_limit=memory_limit)
+        assert expected == list(shuffled > chain)
+        assert expected == collect_async(shuffled > chain)
+
+
+@app.function
+def test_sort_spilled_stable():
+    elements = [Tagged(n % 3, n) for n in range(100)]
+    assert [t.data for t in sorted(elements)] == list(
+        elements > sort(memory_limit=500) | strip
+    )
+
+
+@app.function
+@pytest.mark.parametrize("memory_limit", [0, -5])
+def test_sort_bad_memory_limit(memory_limit):
+    with pytest.raises(ValueError):
+        sort(memory_limit=memory_limit)
+
+
+@app.function
+@pytest.mark.parametrize("synchronous", [True, False])
+def test_sort_removes_spill_files_on_early_stop(monkeypatch, synchronous):
+    files = []
+    make_temporary_file = tempfile.TemporaryFile
+
+    def _temporary_file():
+        files.append(make_temporary_file())
+        return files[-1]
+
+    monkeypatch.setattr(itercat.tempfile, "TemporaryFile", _temporary_file)
+    for shuffled in shuffled_():
+        input = shuffled if synchronous else count_async(1000)
+        assert [0, 1, 2] == list(input > sort(memory_limit=2000) | head(3))
+    assert len(files) > 1
+    assert all(f.closed for f in files)
+
+
+@app.function
+@pytest.mark.parametrize("n", [1, 3, 5])
+@pytest.mark.parametrize("step", [1, 2, 3, 7])
+@pytest.mark.parametrize("length", [0, 4, 17])
+def test_ngrams_step(n, step, length):
+    elements = list(range(length))
+    expected = [tuple(elements[i:i + n]) for i in range(0, length - n + 1, step)]
+    assert expected == list(elements > ngrams(n, step))
+    assert expected == collect_async(count_async(length) > ngrams(n, step))
+
+
+@app.function
+@pytest.mark.parametrize("numpy", [True, False])
+@pytest.mark.parametrize("step", [1, 2])
+def test_ngrams_views(monkeypatch, numpy, step):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(itercat, "np", None)
+    expected = [[float(x) for x in range(i, i + 4)] for i in range(0, 7, step)]
+    assert expected == [w.tolist() for w in range(10) > ngrams(4, step, "d")]
+
+    async def _collect_copies():
+        return [w.tolist() async for w in count_async(10) > ngrams(4, step, "d")]
+
+    assert expected == asyncio.run(_collect_copies())
+
+
+@app.function
+@pytest.mark.parametrize("numpy", [True, False])
+@pytest.mark.parametrize("step", [1, 3])
+def test_ngrams_views_kept(monkeypatch, numpy, step):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(itercat, "np", None)
+    # Long enough for the windows to span several blocks of the buffer.
+    expected = list(range(3000) > ngrams(5, step))
+    windows = list(range(3000) > ngrams(5, step, "l"))
+    assert expected == [tuple(w.tolist()) for w in windows]
+
+    async def _collect():
+        return [w async for w in count_async(3000) > ngrams(5, step, "l")]
+
+    assert expected == [tuple(w.tolist()) for w in asyncio.run(_collect())]
+
+
+@app.function
+def test_ngrams_views_read_only():
+    for window in range(5) > ngrams(3, dtype="l"):
+        with pytest.raises((TypeError, ValueError)):
+            window[0] = 8
+
+
+@app.function
+def test_ngrams_step_too_small():
+    with pytest.raises(ValueError):
+        ngrams(3, 0)
+
+
+@app.function
+@pytest.mark.parametrize(
+    "chain",
+    [
+        slice_(3, 17, 4),
+        slice_(5, 2),
+        head(4) | reverse,
+        reverse | head(4),
+        tail(6) | slice_(1, 5, 2),
+        tail(100),
+        reverse | tail(3) | map(lambda x: x * 10),
+        slice_(2, 20) | filter(lambda x: x % 3 == 0) | head(2),
+    ],
+)
+@pytest.mark.parametrize("input", [list(range(20)), tuple(range(20)), range(20)])
+def test_pushdown_same_as_iteration(chain, input):
+    assert list(iter(input) > chain) == list(input > chain)
+
+
+@app.function
+def test_pushdown_huge_range():
+    big = range(10**18)
+    assert [10**9, 10**9 + 1] == list(big > slice_(10**9, 10**9 + 2))
+    assert [10**18 - 2, 10**18 - 1] == list(big > tail(2))
+    assert [10**18 - 1, 10**18 - 2] == list(big > reverse | head(2))
+    assert ["0", "3"] == list(big > head(5) | filter(lambda x: x % 3 == 0) | map(str))
+
+
+@app.function
+def test_pushdown_range_too_long_for_len():
+    huge = range(10**20)
+    assert [0, 1, 2] == list(huge > map(lambda x: x) | head(3))
+    assert [0, 1, 2] == list(huge > head(3))
+
+
+@app.function
+def test_pushdown_when_iteration_starts():
+    buf = []
+    tailing = buf > tail(2)
+    sliced = buf > slice_(1, 3)
+    buf.extend(range(5))
+    assert [3, 4] == list(tailing)
+    assert [1, 2] == list(sliced)
+    buf.append(5)
+    assert [4, 5] == list(tailing)
+
+
+@app.function
+def test_pushdown_user_source():
+    class Records(Sequence):
+        def __init__(self):
+            self.reads = []
+
+        def __len__(self):
+            return 1000
+
+        def __getitem__(self, index):
+            self.reads.append(index)
+            return f"record {index}"
+
+    records = Records()
+    assert ["record 997", "record 998", "record 999"] == list(records > tail(3))
+    assert [997, 998, 999] == records.reads
+
+
+@app.function
+def test_pushdown_not_on_deque():
+    assert [8, 9] == list(deque(range(10)) > tail(2))
+
+
 if __name__ == "__main__":
     app.run()
@@ -0,0 +1,218 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on checkpointed chains")
+
+with app.setup:
+    import asyncio
+    import marimo as mo  # noqa
+    import operator
+    import pytest
+    import threading
+
+    from itercat import (  # type: ignore
+        cumulate,
+        filter,
+        map,
+        ngrams,
+        reduce,
+        sort,
+        tail,
+    )
+
+
+@app.class_definition
+class Crash(Exception):
+    pass
+
+
+@app.function
+def crashing(n, at):
+    for i in range(n):
+        if i == at:
+            raise Crash()
+        yield i
+
+
+@app.function
+async def crashing_async(n, at):
+    for i in range(n):
+        if i == at:
+            raise Crash()
+        yield i
+
+
+@app.function
+def collect(input, chain, asynchronous):
+    if not asynchronous:
+        return list(input > chain)
+
+    async def _collect():
+        return [x async for x in input > chain]
+
+    return asyncio.run(_collect())
+
+
+@app.function
+def chain_(calls):
+    def _double(n):
+        calls.append(n)
+        return 2 * n
+
+    return map(_double) | cumulate(operator.add) | ngrams(3) | tail(4)
+
+
+@app.function
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_checkpoint_resumes(tmp_path, asynchronous):
+    path = tmp_path / "checkpoint"
+    expected = list(range(1000) > chain_([]))
+    calls = []
+    chain = chain_(calls).checkpointed(path, every=100)
+    source = crashing_async if asynchronous else crashing
+    with pytest.raises(Crash):
+        collect(source(1000, 555), chain, asynchronous)
+    assert path.exists()
+
+    calls.clear()
+    assert expected == collect(source(1000, None), chain, asynchronous)
+    # The first checkpoint gets written for sure, later ones may get skipped.
+    assert 500 <= len(calls) <= 900
+    assert 555 > calls[0] >= 100
+    assert not path.exists()
+
+
+@app.function
+def test_checkpoint_seeks_sequence(tmp_path):
+    path = tmp_path / "checkpoint"
+    chain = (map(lambda n: n + 1) | reduce(operator.add, 0)).checkpointed(path, every=10)
+    with pytest.raises(Crash):
+        list(crashing(100, 50) > chain)
+
+    class Sequence_(list):
+        def __getitem__(self, index):
+            read.append(index)
+            return super().__getitem__(index)
+
+    read = []
+    assert [sum(range(1, 101))] == list(Sequence_(range(100)) > chain)
+    assert 10 <= min(read) < 50
+
+
+@app.function
+def test_checkpoint_ngrams_numeric(tmp_path):
+    path = tmp_path / "checkpoint"
+    chain = ngrams(4, 2, dtype="d") | map(lambda w: tuple(w.tolist()))
+    expected = list(range(50) > chain)
+    checkpointed = chain.checkpointed(path, every=7)
+    with pytest.raises(Crash):
+        list(crashing(50, 30) > checkpointed)
+    assert expected[-1] == list(range(50) > checkpointed)[-1]
+
+
+@app.function
+def test_checkpoint_cumulate_initial(tmp_path):
+    path = tmp_path / "checkpoint"
+    chain = cumulate(operator.add, 100).checkpointed(path, every=3)
+    with pytest.raises(Crash):
+        list(crashing(10, 5) > chain)
+    # Resuming does not yield the initial value again.
+    assert [106, 110, 115, 121, 128, 136, 145] == list(range(10) > chain)
+
+
+@app.class_definition
+class Pickled:
+    """
+    Number that notes the thread where it gets pickled.
+    """
+    threads: list[str] = []
+
+    def __init__(self, n):
+        self.n = n
+
+    def __copy__(self):
+        return Pickled(self.n)
+
+    def __reduce__(self):
+        Pickled.threads.append(threading.current_thread().name)
+        return Pickled, (self.n,)
+
+
+@app.function
+def test_checkpoint_pickles_off_the_consumer(tmp_path):
+    path = tmp_path / "checkpoint"
+    chain = reduce(lambda acc, n: Pickled(acc.n + n), Pickled(0)) | map(lambda p: p.n)
+    Pickled.threads.clear()
+    assert [sum(range(100))] == list(range(100) > chain.checkpointed(path, every=10))
+    assert Pickled.threads
+    assert all(name.startswith("itercat-checkpoint") for name in Pickled.threads)
+
+
+@app.function
+def test_checkpoint_snowball_grown_in_place(tmp_path):
+    path = tmp_path / "checkpoint"
+    chain = (map(lambda n: [n]) | reduce(lambda acc, x: acc.extend(x) or acc)).checkpointed(
+        path, every=10
+    )
+    with pytest.raises(Crash):
+        list(crashing(100, 95) > chain)
+    assert [list(range(100))] == list(range(100) > chain)
+
+
+@app.function
+def test_checkpoint_torn_record(tmp_path):
+    path = tmp_path / "checkpoint"
+    chain = reduce(operator.add).checkpointed(path, every=10)
+    with pytest.raises(Crash):
+        list(crashing(100, 95) > chain)
+    with open(path, "ab") as file:
+        file.write(b"\x80\x05\x95torn")
+    assert [sum(range(100))] == list(range(100) > chain)
+
+
+@app.function
+def test_checkpoint_other_chain(tmp_path):
+    path = tmp_path / "checkpoint"
+    with pytest.raises(Crash):
+        list(crashing(100, 50) > reduce(operator.add).checkpointed(path, every=10))
+    with pytest.raises(ValueError):
+        list(range(100) > tail(3).checkpointed(path))
+
+
+@app.function
+def test_checkpoint_instrumented(tmp_path):
+    path = tmp_path / "checkpoint"
+    reports = []
+    chain = (filter(lambda n: n % 2 == 0) | tail(2)).checkpointed(path, every=10)
+    with pytest.raises(Crash):
+        list(crashing(100, 50) > chain)
+    assert [96, 98] == list(range(100) > chain.instrumented(reports.append))
+    [report] = reports
+    assert ["filter", "tail"] == [metrics.name for metrics in report.links]
+    assert 100 > report.links[0].num_in >= 50
+
+
+@app.function
+def test_checkpoint_composes(tmp_path):
+    chain = map(lambda n: n).checkpointed(tmp_path / "checkpoint") | tail(1)
+    assert chain.checkpointing is not None
+    assert [9] == list(range(10) > chain.unfused())
+    assert not (tmp_path / "checkpoint").exists()
+
+
+@app.function
+@pytest.mark.parametrize(
+    "make",
+    [
+        lambda path: sort.checkpointed(path),
+        lambda path: map(str).checkpointed(path, every=0),
+        lambda path: (map(str) | sort).checkpointed(path),
+    ]
+)
+def test_checkpoint_invalid(tmp_path, make):
+    with pytest.raises(ValueError):
+        make(tmp_path / "checkpoint")
+
+
+if __name__ == "__main__":
+    app.run()
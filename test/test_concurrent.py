@@ -0,0 +1,259 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on stages running work concurrently")
+
+with app.setup:
+    import asyncio
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    import itertools as it
+    import marimo as mo  # noqa
+    import multiprocessing
+    from operator import neg
+    import pytest
+    import threading
+    import time
+
+    from itercat import (  # type: ignore
+        afilter,
+        amap,
+        amapargs,
+        head,
+        map,
+        pmap,
+        set_shared_thread_pool,
+        shared_thread_pool,
+        tmap,
+    )
+    from _test import count_async
+
+
+@app.function
+async def delayed(x, delay=0.0):
+    await asyncio.sleep(delay)
+    return x
+
+
+@app.function
+@pytest.mark.parametrize("concurrency", [1, 3, 100])
+def test_amap_ordered(concurrency):
+    delays = [0.03, 0.0, 0.02, 0.01, 0.0, 0.03]
+    assert list(range(6)) == list(
+        range(6) > amap(lambda i: delayed(i, delays[i]), concurrency)
+    )
+
+
+@app.function
+def test_amap_unordered_as_completed():
+    delays = [0.3, 0.0, 0.2, 0.1]
+    assert [1, 3, 2, 0] == list(
+        range(4) > amap(lambda i: delayed(i, delays[i]), 4, ordered=False)
+    )
+
+
+@app.function
+@pytest.mark.parametrize("ordered", [True, False])
+def test_amap_bounded_in_flight(ordered):
+    in_flight = 0
+    most_in_flight = 0
+
+    async def _track(x):
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.001 * (x % 4))
+        in_flight -= 1
+        return x
+
+    assert list(range(50)) == sorted(range(50) > amap(_track, 5, ordered=ordered))
+    assert 5 == most_in_flight
+
+
+@app.function
+def test_amap_overlaps_calls():
+    start = time.monotonic()
+    assert list(range(10)) == list(range(10) > amap(lambda x: delayed(x, 0.2), 10))
+    assert time.monotonic() - start < 1.0
+
+
+@app.function
+def test_amap_backpressure():
+    drawn = []
+    assert [0, 1] == list(
+        it.count() > map(lambda x: drawn.append(x) or x) | amap(delayed, 4) | head(2)
+    )
+    assert len(drawn) <= 2 + 4
+
+
+@app.function
+@pytest.mark.parametrize("ordered", [True, False])
+def test_amap_exception(ordered):
+    async def _fail_on_3(x):
+        if x == 3:
+            raise ValueError(x)
+        return x
+
+    with pytest.raises(ValueError):
+        list(range(10) > amap(_fail_on_3, 2, ordered=ordered))
+
+
+@app.function
+def test_amapargs():
+    async def _add(a, b):
+        await asyncio.sleep(0.01 * a)
+        return a + b
+
+    assert [3, 7, 11] == list([(1, 2), (3, 4), (5, 6)] > amapargs(_add, 2))
+
+
+@app.function
+@pytest.mark.parametrize("ordered", [True, False])
+def test_afilter(ordered):
+    async def _even(x):
+        await asyncio.sleep(0.001 * (x % 3))
+        return x % 2 == 0
+
+    evens = list(range(20) > afilter(_even, 4, ordered=ordered))
+    assert list(range(0, 20, 2)) == (evens if ordered else sorted(evens))
+
+
+@app.function
+@pytest.mark.parametrize("stage", [amap, amapargs, afilter])
+def test_bad_concurrency(stage):
+    with pytest.raises(ValueError):
+        stage(delayed, 0)
+
+
+@app.function
+def fail_on_13(x):
+    if x == 13:
+        raise ValueError("unlucky")
+    return x
+
+
+@app.function
+@pytest.mark.parametrize("n,chunksize", [(0, 4), (1, 4), (100, 1), (100, 7), (100, 200)])
+def test_pmap_ordered(n, chunksize):
+    assert [-x for x in range(n)] == list(range(n) > pmap(neg, 2, chunksize))
+
+
+@app.function
+def test_pmap_unordered():
+    assert sorted(-x for x in range(100)) == sorted(
+        range(100) > pmap(neg, 3, 5, ordered=False)
+    )
+
+
+@app.function
+def test_pmap_asynchronous_source():
+    assert [-x for x in range(50)] == list(count_async(50) > pmap(neg, 2, 8))
+
+
+@app.function
+def test_pmap_shared_executor():
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        chain = pmap(neg, 2, 10, executor=pool)
+        assert [0, -1, -2] == list(range(3) > chain)
+        assert [-5, -6] == list(range(5, 7) > chain)
+        assert [-x for x in range(30)] == list(count_async(30) > chain)
+
+
+@app.function
+@pytest.mark.parametrize("input", [range(30), count_async(30)])
+def test_pmap_worker_exception(input):
+    with pytest.raises(ValueError, match="unlucky") as exc_info:
+        list(input > pmap(fail_on_13, 2, 4))
+    assert "fail_on_13" in str(exc_info.value.__cause__)
+
+
+@app.function
+@pytest.mark.parametrize("workers,chunksize", [(0, 1), (1, 0)])
+def test_pmap_bad_arguments(workers, chunksize):
+    with pytest.raises(ValueError):
+        pmap(neg, workers, chunksize)
+
+
+@app.function
+def sleep_then_return(x, delay=0.1):
+    time.sleep(delay)
+    return x
+
+
+@app.function
+@pytest.mark.parametrize("input", [range(20), count_async(20)])
+def test_tmap_overlaps_blocking_calls(input):
+    start = time.monotonic()
+    assert list(range(20)) == list(input > tmap(sleep_then_return, 20))
+    assert time.monotonic() - start < 1.0
+
+
+@app.function
+def test_tmap_unordered():
+    delays = [0.3, 0.0, 0.2, 0.1]
+    assert [1, 3, 2, 0] == list(
+        range(4) > tmap(lambda i: sleep_then_return(i, delays[i]), 4, ordered=False)
+    )
+
+
+@app.function
+def test_tmap_keeps_event_loop_going():
+    ticks = 0
+
+    async def _tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    async def _run():
+        ticker = asyncio.create_task(_tick())
+        result = [x async for x in count_async(3) > tmap(sleep_then_return, 1)]
+        ticker.cancel()
+        return result
+
+    assert [0, 1, 2] == asyncio.run(_run())
+    assert ticks >= 10
+
+
+@app.function
+@pytest.mark.parametrize("input", [range(100), count_async(100)])
+def test_tmap_cancels_pending_calls(input):
+    called = []
+
+    def _record(x):
+        called.append(x)
+        return sleep_then_return(x, 0.05)
+
+    with ThreadPoolExecutor(2) as pool:
+        assert [0, 1] == list(input > tmap(_record, 10, executor=pool) | head(2))
+    assert len(called) < 20
+
+
+@app.function
+def test_tmap_shared_thread_pool():
+    names = set()
+
+    def _record_thread(x):
+        names.add(threading.current_thread().name)
+        return x
+
+    pool_previous = shared_thread_pool()
+    with ThreadPoolExecutor(2, thread_name_prefix="test-pool") as pool:
+        set_shared_thread_pool(pool)
+        try:
+            assert shared_thread_pool() is pool
+            for chain in [tmap(_record_thread, 4), tmap(_record_thread, 2)]:
+                assert list(range(10)) == list(range(10) > chain)
+        finally:
+            set_shared_thread_pool(pool_previous)
+    assert names and all(name.startswith("test-pool") for name in names)
+
+
+@app.function
+def test_tmap_bad_workers():
+    with pytest.raises(ValueError):
+        tmap(sleep_then_return, 0)
+
+
+if __name__ == "__main__":
+    app.run()
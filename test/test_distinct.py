@@ -0,0 +1,99 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on deduplication")
+
+with app.setup:
+    import marimo as mo  # noqa
+    import pytest
+
+    from itercat import (  # type: ignore
+        distinct,
+        uniq,
+    )
+    from _test import collect_async, each_async
+
+
+@app.function
+def both_(elements, chain):
+    sync = list(elements > chain)
+    assert sync == collect_async(each_async(elements) > chain)
+    return sync
+
+
+@app.function
+def test_uniq():
+    assert [1, 2, 1, 3] == both_([1, 1, 2, 2, 2, 1, 3, 3], uniq())
+    assert ["ab", "c", "de"] == both_(["ab", "xy", "c", "de", "fg"], uniq(len))
+    assert [] == both_([], uniq())
+    assert [None, 0] == both_([None, None, 0], uniq())
+
+
+@app.function
+def test_distinct_exact():
+    assert [3, 1, 2, 5] == both_([3, 1, 3, 2, 1, 5, 2], distinct())
+    assert ["apple", "kiwi", "fig"] == both_(
+        ["apple", "kiwi", "pear", "fig", "plum"],
+        distinct(len)
+    )
+
+
+@app.function
+def test_distinct_lru():
+    # Only the 2 keys seen most recently are remembered.
+    assert [1, 2, 3, 1, 2] == both_([1, 2, 3, 1, 1, 3, 2], distinct(max_size=2))
+
+
+@app.function
+def test_distinct_ttl():
+    now = [0.0]
+    chain = distinct(ttl=10.0, clock=lambda: now[0])
+
+    def _stamped():
+        for t, x in [(0, "a"), (1, "b"), (5, "a"), (14, "a"), (14, "b"), (30, "a")]:
+            now[0] = float(t)
+            yield x
+
+    # "a" stays recent as it keeps being seen; "b" expires.
+    assert ["a", "b", "b", "a"] == list(_stamped() > chain)
+
+
+@app.function
+def test_distinct_bloom():
+    elements = [n % 5000 for n in range(20000)]
+    kept = both_(elements, distinct(mode="bloom", capacity=5000, error_rate=0.01))
+    assert len(set(kept)) == len(kept)
+    assert len(kept) >= 5000 * 0.97
+
+
+@app.function
+def test_distinct_bloom_max_bytes():
+    kept = list(range(1000) > distinct(mode="bloom", max_bytes=64))
+    # A filter this small fills up: many new elements get dropped, but never twice.
+    assert len(set(kept)) == len(kept) < 1000
+    kept_capped = list(
+        range(1000) > distinct(mode="bloom", capacity=1_000_000, max_bytes=1024)
+    )
+    assert len(kept_capped) > 900
+
+
+@app.function
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"mode": "fuzzy"},
+        {"max_size": 0},
+        {"ttl": 0},
+        {"mode": "bloom"},
+        {"mode": "bloom", "capacity": 0},
+        {"mode": "bloom", "max_bytes": 0},
+        {"mode": "bloom", "capacity": 10, "error_rate": 1.0},
+    ]
+)
+def test_distinct_invalid(params):
+    with pytest.raises(ValueError):
+        distinct(**params)
+
+
+if __name__ == "__main__":
+    app.run()
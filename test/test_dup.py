@@ -0,0 +1,184 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on fanning out iterations")
+
+with app.setup:
+    import asyncio
+    import marimo as mo  # noqa
+    import pytest
+    import tempfile
+    import time
+
+    from itercat import (  # type: ignore
+        concurrently,
+        cumulate,
+        dispatch,
+        dup,
+        filter,
+        head,
+        map,
+        mix,
+        zip,
+    )
+    from _test import slowly
+
+
+@app.function
+def add(a, b):
+    return a + b
+
+
+@app.function
+def test_dup_zip():
+    assert [(n, 2 * n, n * (n + 1) // 2) for n in range(10)] == list(
+        range(10) > dup(map(lambda n: n), map(lambda n: 2 * n), cumulate(add, None)) | zip()
+    )
+
+
+@app.function
+def test_dup_mix():
+    mixed = list(
+        range(100) > dup(filter(lambda n: n % 2 == 0), filter(lambda n: n % 2 == 1)) | mix()
+    )
+    assert list(range(0, 100, 2)) == [t.data for t in mixed if t.label == 0]
+    assert list(range(1, 100, 2)) == [t.data for t in mixed if t.label == 1]
+
+
+@app.function
+def test_dup_reads_once():
+    num_read = 0
+
+    def _counted():
+        nonlocal num_read
+        for n in range(50):
+            num_read += 1
+            yield n
+
+    list(_counted() > dup(map(str), map(float), map(lambda n: n)) | zip())
+    assert 50 == num_read
+
+
+@app.function
+def test_dup_bounded():
+    num_read = 0
+
+    async def _counted():
+        nonlocal num_read
+        for n in range(1000):
+            num_read += 1
+            yield n
+
+    async def _run():
+        async for x in _counted() > dup(map(str), map(float), size_buffer=4) | zip():
+            if x[1] >= 10.0:
+                break
+
+    asyncio.run(_run())
+    # The feeder stays a few buffers ahead of the consumer at most.
+    assert num_read <= 10 + 3 * 4 + 2
+
+
+@app.function
+def test_dup_stop_branch_early():
+    assert list(range(100)) == [
+        t.data
+        for t in range(100) > dup(head(3), map(lambda n: n), size_buffer=2) | mix()
+        if t.label == 1
+    ]
+
+
+@app.function
+def test_dup_exception():
+    def _failing():
+        yield 1
+        raise RuntimeError("oops")
+
+    with pytest.raises(RuntimeError):
+        list(_failing() > dup(map(str), map(float)) | mix())
+
+
+@app.function
+@pytest.mark.parametrize("size_buffer", [1, 3, 16])
+def test_dup_spill_sequential(size_buffer, monkeypatch):
+    num_spilled = 0
+    temporary_file = tempfile.TemporaryFile
+
+    def _counting(*args, **kwargs):
+        nonlocal num_spilled
+        num_spilled += 1
+        return temporary_file(*args, **kwargs)
+
+    monkeypatch.setattr(tempfile, "TemporaryFile", _counting)
+
+    async def _sequential():
+        branches = [
+            b async for b in range(200) > dup(
+                map(lambda n: n), map(lambda n: -n), size_buffer=size_buffer, spill=True
+            )
+        ]
+        return [[x async for x in branch] for branch in branches]
+
+    first, second = asyncio.run(_sequential())
+    assert list(range(200)) == first
+    assert [-n for n in range(200)] == second
+    assert num_spilled >= 1
+
+
+@app.function
+def test_dispatch_concurrent():
+    delay = 0.05
+    start = time.perf_counter()
+    dispatched = list(
+        concurrently(slowly(range(4), delay), slowly(range(4), delay))
+        > dispatch(map(lambda n: n + 1), map(lambda n: -n), concurrent=True) | zip()
+    )
+    assert [(n + 1, -n) for n in range(4)] == dispatched
+    assert time.perf_counter() - start < 7 * delay
+
+
+@app.function
+def test_dispatch_concurrent_runs_eagerly():
+    seen = []
+
+    async def _noting(name, n):
+        for i in range(n):
+            seen.append((name, i))
+            yield i
+
+    async def _run():
+        iterations = [
+            i async for i in concurrently(_noting("a", 3), _noting("b", 3))
+            > dispatch(map(lambda n: n), map(lambda n: n), concurrent=True)
+        ]
+        await asyncio.sleep(0.01)
+        # Both dispatched iterations ran ahead before either gets consumed.
+        assert {"a", "b"} == {name for name, _ in seen}
+        return [[x async for x in i] for i in iterations]
+
+    assert [[0, 1, 2], [0, 1, 2]] == asyncio.run(_run())
+
+
+@app.function
+def test_dispatch_keeps_names():
+    def _mixed(concurrent):
+        mixed = list(
+            concurrently(a=range(3), b=range(10, 12))
+            > dispatch(map(lambda n: n + 1), map(lambda n: -n), concurrent=concurrent)
+            | mix()
+        )
+        return sorted((t.label, t.data) for t in mixed)
+
+    expected = [("a", 1), ("a", 2), ("a", 3), ("b", -11), ("b", -10)]
+    assert expected == _mixed(False) == _mixed(True)
+
+
+@app.function
+@pytest.mark.parametrize("make", [lambda: dup(size_buffer=0), lambda: dispatch(size_buffer=0)])
+def test_dup_invalid(make):
+    with pytest.raises(ValueError):
+        make()
+
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,151 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on file stages")
+
+with app.setup:
+    import marimo as mo  # noqa
+    import pytest
+
+    from itercat import (  # type: ignore
+        glue,
+        lines,
+        map,
+        read,
+        split,
+        write,
+    )
+    from _test import each_async
+
+
+@app.function
+def contents_():
+    yield "first line\nsecond, longer line\n\nfourth line after an empty one\nlast"
+
+
+@app.function
+@pytest.mark.parametrize("size_buffer", [1, 3, 7, 64, 1 << 16])
+@pytest.mark.parametrize("trailing", ["", "\n"])
+def test_read_lines_text(tmp_path, size_buffer, trailing):
+    for contents in contents_():
+        path = tmp_path / "text.txt"
+        path.write_text(contents + trailing, encoding="utf-8")
+        expected = (contents + trailing).splitlines()
+        assert expected == list([path] > read(size_buffer) | lines)
+        assert expected == list(each_async([path]) > read(size_buffer) | lines)
+
+
+@app.function
+@pytest.mark.parametrize("size_buffer", [1, 5, 64])
+@pytest.mark.parametrize("mmap", [False, True])
+def test_read_lines_binary(tmp_path, size_buffer, mmap):
+    for contents in contents_():
+        path = tmp_path / "binary.dat"
+        path.write_bytes(contents.encode("utf-8"))
+        expected = contents.encode("utf-8").splitlines()
+        chain = read(size_buffer, binary=True, mmap=mmap) | lines | map(bytes)
+        assert expected == list([path] > chain)
+        assert expected == list(each_async([path]) > chain)
+
+
+@app.function
+@pytest.mark.parametrize("mmap", [False, True])
+def test_read_binary_records_are_views(tmp_path, mmap):
+    path = tmp_path / "records.dat"
+    path.write_bytes(b"ab\ncd\nef\n")
+    records = list([path] > read(binary=True, mmap=mmap) | lines)
+    assert all(isinstance(record, memoryview) for record in records)
+    assert [b"ab", b"cd", b"ef"] == [bytes(record) for record in records]
+
+
+@app.function
+@pytest.mark.parametrize("binary", [False, True])
+def test_read_empty_file(tmp_path, binary):
+    path = tmp_path / "empty"
+    path.write_bytes(b"")
+    assert [] == list([path] > read(binary=binary) | lines)
+    assert [] == list([path] > read(binary=True, mmap=True) | lines)
+
+
+@app.function
+def test_read_several_files(tmp_path):
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"file{i}.txt")
+        paths[-1].write_text(f"{i}a\n{i}b\n")
+    assert ["0a", "0b", "1a", "1b", "2a", "2b"] == list(paths > read(4) | lines)
+
+
+@app.function
+@pytest.mark.parametrize("size_buffer", [1, 2, 3, 100])
+def test_split_multichar_separator(tmp_path, size_buffer):
+    path = tmp_path / "records.dat"
+    path.write_bytes(b"one||two|||three||")
+    expected = [b"one", b"two", b"|three"]
+    assert expected == list(
+        [path] > read(size_buffer, binary=True) | split(b"||") | map(bytes)
+    )
+    assert expected == list(
+        [b"one||two|", b"||three", b"||"] > split(b"||")
+    )
+    assert ["a", "b", "", "c"] == list(["a\r", "\nb\r\n\r", "\nc"] > split("\r\n"))
+
+
+@app.function
+def test_split_empty_separator():
+    with pytest.raises(ValueError):
+        split("")
+
+
+@app.function
+def test_glue():
+    assert ["a\nb\n", "c\n"] == list(["a", "b", "c"] > glue(size_batch=2))
+    assert [b"x;y;"] == list([b"x", memoryview(b"y")] > glue(b";"))
+
+
+@app.function
+@pytest.mark.parametrize("synchronous", [True, False])
+def test_write_text_roundtrip(tmp_path, synchronous):
+    records = [f"record {i}" for i in range(100)]
+    path = tmp_path / "out.txt"
+    input = records if synchronous else each_async(records)
+    assert [] == list(input > glue(size_batch=7) | write(path, size_batch=3))
+    assert records == path.read_text(encoding="utf-8").splitlines()
+    assert records == list([path] > read(16) | lines)
+
+
+@app.function
+@pytest.mark.parametrize("synchronous", [True, False])
+def test_write_binary_append(tmp_path, synchronous):
+    path = tmp_path / "out.dat"
+    path.write_bytes(b"start\n")
+    input = [b"a", b"b"] if synchronous else each_async([b"a", b"b"])
+    assert [] == list(input > glue() | write(path, binary=True, append=True))
+    assert b"start\na\nb\n" == path.read_bytes()
+
+
+@app.function
+def test_transform_file(tmp_path):
+    source, destination = tmp_path / "in.txt", tmp_path / "out.txt"
+    source.write_text("alpha\nbeta\ngamma\n")
+    list([source] > read(4) | lines | map(str.upper) | glue() | write(destination))
+    assert "ALPHA\nBETA\nGAMMA\n" == destination.read_text()
+
+
+@app.function
+@pytest.mark.parametrize(
+    "make",
+    [
+        lambda: read(0),
+        lambda: read(mmap=True),
+        lambda: glue(size_batch=0),
+        lambda: write("nowhere", size_batch=0),
+    ],
+)
+def test_bad_arguments(make):
+    with pytest.raises(ValueError):
+        make()
+
+
+if __name__ == "__main__":
+    app.run()
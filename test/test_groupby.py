@@ -0,0 +1,166 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on grouping")
+
+with app.setup:
+    import asyncio
+    import marimo as mo  # noqa
+    import pytest
+    import tempfile
+
+    from itercat import (  # type: ignore
+        agg,
+        Aggregator,
+        groupby,
+        map,
+        Tagged,
+    )
+    from _test import each_async
+
+
+@app.function
+def results_(tagged):
+    return {t.label: t.data for t in tagged}
+
+
+@app.function
+def words_():
+    return "the quick brown fox jumps over the lazy dog then the fox sleeps".split()
+
+
+@app.function
+def test_groupby_lists():
+    assert [Tagged(3, None), Tagged(5, None), Tagged(4, None), Tagged(6, None)] == list(
+        words_() > groupby(len)
+    )
+    assert ["the", "fox", "the", "dog", "the", "fox"] == results_(
+        words_() > groupby(len)
+    )[3]
+
+
+@app.function
+def test_groupby_labels():
+    tagged = [Tagged("a", 1), Tagged("b", 2), Tagged("a", 3)]
+    assert {"a": 4, "b": 2} == results_(tagged > groupby(aggregate=agg.sum()))
+
+
+@app.function
+@pytest.mark.parametrize(
+    "aggregator,expected",
+    [
+        (agg.count(), {0: 5, 1: 5}),
+        (agg.sum(), {0: 20, 1: 25}),
+        (agg.min(), {0: 0, 1: 1}),
+        (agg.max(), {0: 8, 1: 9}),
+        (agg.mean(), {0: 4.0, 1: 5.0}),
+        (agg.sum(of=lambda n: n * n), {0: 120, 1: 165}),
+        (agg.fold(lambda acc, n: acc * 10 + n, 0), {0: 2468, 1: 13579}),
+    ]
+)
+def test_groupby_aggregators(aggregator, expected):
+    parity = groupby(lambda n: n % 2, aggregator)
+    assert expected == results_(range(10) > parity)
+    assert expected == results_(each_async(range(10)) > parity)
+
+
+@app.function
+def test_groupby_composed():
+    assert {
+        0: (5, 0, 8),
+        1: (5, 1, 9),
+    } == results_(range(10) > groupby(lambda n: n % 2, (agg.count(), agg.min(), agg.max())))
+    assert {
+        0: {"n": 5, "mean": 4.0},
+        1: {"n": 5, "mean": 5.0},
+    } == results_(range(10) > groupby(
+        lambda n: n % 2,
+        {"n": agg.count(), "mean": agg.mean()}
+    ))
+
+
+@app.function
+def test_groupby_sorted():
+    elements = [1, 1, 2, 3, 3, 3, 1]
+    expected = [(1, 2), (2, 1), (3, 3), (1, 1)]
+    grouping = groupby(lambda n: n, agg.count(), sorted=True)
+    assert expected == [(t.label, t.data) for t in elements > grouping]
+    assert expected == [(t.label, t.data) for t in each_async(elements) > grouping]
+    assert [] == list([] > grouping)
+
+
+@app.function
+def test_groupby_sorted_streams():
+    def _forever():
+        n = 0
+        while True:
+            yield n // 3
+            n += 1
+
+    grouping = groupby(lambda n: n, agg.count(), sorted=True)
+    assert [3] * 5 == [t.data for t, _ in zip(_forever() > grouping, range(5))]
+
+
+@app.function
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_groupby_spill(asynchronous, monkeypatch):
+    num_spilled = 0
+    temporary_file = tempfile.TemporaryFile
+
+    def _counting(*args, **kwargs):
+        nonlocal num_spilled
+        num_spilled += 1
+        return temporary_file(*args, **kwargs)
+
+    monkeypatch.setattr(tempfile, "TemporaryFile", _counting)
+    elements = [n * 7919 % 1000 for n in range(5000)]
+    aggregation = {"n": agg.count(), "total": agg.sum(), "all": agg.list()}
+    grouping = groupby(lambda n: n % 300, aggregation, memory_limit=2048, num_partitions=4)
+    if asynchronous:
+        async def _collect():
+            return [t async for t in each_async(elements) > grouping]
+
+        spilled = results_(asyncio.run(_collect()))
+    else:
+        spilled = results_(elements > grouping)
+    assert 4 == num_spilled
+    expected = results_(elements > groupby(lambda n: n % 300, aggregation))
+    assert expected.keys() == spilled.keys()
+    for k, result in expected.items():
+        assert result["n"] == spilled[k]["n"]
+        assert result["total"] == spilled[k]["total"]
+        assert sorted(result["all"]) == sorted(spilled[k]["all"])
+
+
+@app.function
+def test_groupby_spill_needs_merge():
+    with pytest.raises(ValueError):
+        groupby(len, agg.fold(lambda a, b: a + b, 0), memory_limit=1024)
+    groupby(len, agg.fold(lambda a, b: a + b, 0, merge=lambda a, b: a + b), memory_limit=1024)
+
+
+@app.function
+def test_groupby_custom_aggregator():
+    longest = Aggregator(lambda: "", lambda a, w: max(a, w, key=len), str.upper)
+    assert {"t": "THEN", "f": "FOX", "q": "QUICK"} == {
+        k: v
+        for k, v in results_(words_() > groupby(lambda w: w[0], longest)).items()
+        if k in "tfq"
+    }
+
+
+@app.function
+def test_groupby_tagged_input():
+    tagging = map(lambda w: Tagged(w[0], len(w)))
+    assert 5 == results_(words_() > tagging | groupby(aggregate=agg.max()))["q"]
+
+
+@app.function
+@pytest.mark.parametrize("params", [{"memory_limit": 0}, {"num_partitions": 0}])
+def test_groupby_invalid(params):
+    with pytest.raises(ValueError):
+        groupby(len, agg.count(), **params)
+
+
+if __name__ == "__main__":
+    app.run()
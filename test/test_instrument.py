@@ -0,0 +1,142 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on chain instrumentation")
+
+with app.setup:
+    import asyncio
+    import contextlib
+    import marimo as mo  # noqa
+    import pytest
+    import time
+
+    from itercat import (  # type: ignore
+        filter,
+        head,
+        map,
+        Report,
+        reverse,
+        Runtime,
+        sort,
+        tail,
+    )
+    from _test import each_async
+
+
+@app.function
+def chain_():
+    return map(lambda n: n * 2) | filter(lambda n: n % 3 == 0) | sort | tail(5)
+
+
+@app.function
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_instrumented_counts(asynchronous):
+    reports = []
+    iteration = (
+        each_async(range(1000)) if asynchronous else range(1000)
+    ) > chain_().instrumented(reports.append)
+    assert [1974, 1980, 1986, 1992, 1998] == list(iteration)
+    assert [iteration.report] == reports
+    report = iteration.report
+    assert ["map", "filter", "sort", "tail"] == [m.name for m in report.links]
+    assert [1000, 1000, 334, 334] == [m.num_in for m in report.links]
+    assert [1000, 334, 334, 5] == [m.num_out for m in report.links]
+    assert [None, None, 334, 5] == [m.high_water for m in report.links]
+    assert (report.high_water_handoff is not None) == asynchronous
+    for m in report.links:
+        assert 0.0 <= m.time_upstream <= m.time_inside <= report.time_total
+        assert m.time_first is not None
+
+
+@app.function
+def test_instrumented_async_consumer():
+    iteration = each_async(range(10)) > reverse.instrumented()
+
+    async def _collect():
+        return [x async for x in iteration]
+
+    assert list(range(9, -1, -1)) == asyncio.run(_collect())
+    assert 10 == iteration.report.links[0].high_water
+    assert iteration.report.high_water_handoff is None
+
+
+@app.function
+def test_instrumented_upstream_time():
+    def _slow():
+        for n in range(5):
+            time.sleep(0.02)
+            yield n
+
+    iteration = _slow() > map(lambda n: n).instrumented()
+    list(iteration)
+    metrics = iteration.report.links[0]
+    assert metrics.time_upstream >= 0.08
+    assert metrics.time_self < metrics.time_upstream
+
+
+@app.function
+def test_instrumented_stopped_early():
+    reports = []
+    iteration = range(1000) > map(lambda n: n).instrumented(reports.append) | head(3)
+    assert [0, 1, 2] == list(iteration)
+    assert 1 == len(reports)
+    assert 3 == reports[0].links[-1].num_out
+
+
+@app.function
+@pytest.mark.parametrize("runtime", [False, True])
+def test_instrumented_async_stopped_early(runtime):
+    seen = []
+
+    def _on_report(report):
+        seen.append((report.time_total, report.high_water_handoff))
+
+    iteration = each_async(range(10**6)) > map(lambda n: n).instrumented(_on_report)
+    with Runtime() if runtime else contextlib.nullcontext():
+        elements = iter(iteration)
+        assert [0, 1, 2] == [next(elements) for _ in range(3)]
+        elements.close()
+        # Reported in full by the time the consumer is done.
+        [(time_total, high_water_handoff)] = seen
+    assert 0.0 < time_total == iteration.report.time_total
+    assert high_water_handoff is not None
+
+
+@app.function
+def test_instrumented_composes():
+    chain = map(lambda n: n + 1).instrumented() | filter(lambda n: n % 2 == 0)
+    iteration = range(10) > chain
+    list(iteration)
+    assert ["map", "filter"] == [m.name for m in iteration.report.links]
+    assert isinstance(iteration.report, Report)
+
+
+@app.function
+def test_instrumented_each_run():
+    iteration = range(5) > map(lambda n: n).instrumented()
+    list(iteration)
+    first = iteration.report
+    list(iteration)
+    assert first is not iteration.report
+    assert 5 == iteration.report.links[0].num_out
+
+
+@app.function
+def test_not_instrumented():
+    iteration = range(5) > chain_()
+    list(iteration)
+    assert iteration.report is None
+
+
+@app.function
+def test_report_as_dict():
+    iteration = range(5) > sort.instrumented()
+    list(iteration)
+    exported = iteration.report.as_dict()
+    assert {"links", "time_total", "high_water_handoff"} == set(exported)
+    assert 5 == exported["links"][0]["high_water"]
+    assert "time_self" in exported["links"][0]
+
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,158 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on joins")
+
+with app.setup:
+    import asyncio
+    import marimo as mo  # noqa
+    import pytest
+    import tempfile
+
+    from itercat import (  # type: ignore
+        concurrently,
+        join,
+        map,
+        Tagged,
+    )
+
+
+@app.function
+def pairs_(tagged):
+    return sorted(((t.label, t.data) for t in tagged), key=repr)
+
+
+@app.function
+def sides_():
+    left = [Tagged("a", 1), Tagged("b", 2), Tagged("b", 3), Tagged("d", 4)]
+    right = [Tagged("b", 10), Tagged("c", 20), Tagged("d", 30), Tagged("d", 40)]
+    return left, right
+
+
+@app.function
+def expected_(kind):
+    return {
+        "inner": [("b", (2, 10)), ("b", (3, 10)), ("d", (4, 30)), ("d", (4, 40))],
+        "left": [
+            ("a", (1, None)),
+            ("b", (2, 10)),
+            ("b", (3, 10)),
+            ("d", (4, 30)),
+            ("d", (4, 40)),
+        ],
+        "outer": [
+            ("a", (1, None)),
+            ("b", (2, 10)),
+            ("b", (3, 10)),
+            ("c", (None, 20)),
+            ("d", (4, 30)),
+            ("d", (4, 40)),
+        ],
+    }[kind]
+
+
+@app.function
+@pytest.mark.parametrize("kind", ["inner", "left", "outer"])
+@pytest.mark.parametrize("strategy", ["hash", "merge"])
+@pytest.mark.parametrize("swap", [False, True])
+def test_join_labels(kind, strategy, swap):
+    left, right = sides_()
+    if swap:
+        # Making the left side the larger one builds the table on the right.
+        left = left + [Tagged("e", 5), Tagged("e", 6)]
+    expected = expected_(kind)
+    if swap and kind != "inner":
+        expected = expected + [("e", (5, None)), ("e", (6, None))]
+    expected = sorted(expected, key=repr)
+    assert expected == pairs_(
+        concurrently(l=left, r=right) > getattr(join, kind)(strategy=strategy)
+    )
+
+
+@app.function
+@pytest.mark.parametrize("strategy", ["hash", "merge"])
+def test_join_anti(strategy):
+    left, right = sides_()
+    assert ["a"] == [t.label for t in concurrently(left, right) > join.anti(strategy=strategy)]
+
+
+@app.function
+@pytest.mark.parametrize("strategy", ["hash", "merge"])
+def test_join_key(strategy):
+    left = [(1, "one"), (2, "two"), (3, "three")]
+    right = [(2, "deux"), (3, "trois"), (4, "quatre")]
+    assert [
+        (2, ((2, "two"), (2, "deux"))),
+        (3, ((3, "three"), (3, "trois"))),
+    ] == pairs_(
+        concurrently(left, right) > join.inner(key=lambda p: p[0], strategy=strategy)
+    )
+
+
+@app.function
+def test_join_async():
+    left, right = sides_()
+
+    async def _collect():
+        return [t async for t in concurrently(left, right) > join.outer()]
+
+    assert sorted(expected_("outer"), key=repr) == pairs_(asyncio.run(_collect()))
+
+
+@app.function
+@pytest.mark.parametrize("kind", ["inner", "left", "outer"])
+def test_join_grace(kind, monkeypatch):
+    num_spilled = 0
+    temporary_file = tempfile.TemporaryFile
+
+    def _counting(*args, **kwargs):
+        nonlocal num_spilled
+        num_spilled += 1
+        return temporary_file(*args, **kwargs)
+
+    monkeypatch.setattr(tempfile, "TemporaryFile", _counting)
+    left = range(0, 3000, 2)
+    right = range(0, 3000, 3)
+    tagging = map(lambda n: Tagged(n % 100, n))
+    joined = pairs_(
+        concurrently(left > tagging, right > tagging)
+        > getattr(join, kind)(memory_limit=4096, num_partitions=4)
+    )
+    assert 8 == num_spilled
+    assert pairs_(
+        concurrently(left > tagging, right > tagging) > getattr(join, kind)()
+    ) == joined
+
+
+@app.function
+def test_join_merge_bounded():
+    def _left():
+        for n in range(1000):
+            yield Tagged(n, n)
+
+    def _right():
+        for n in range(0, 1000, 10):
+            yield Tagged(n, -n)
+
+    joined = concurrently(_left(), _right()) > join.left(strategy="merge")
+    assert 1000 == sum(1 for _ in joined)
+
+
+@app.function
+def test_join_not_two():
+    with pytest.raises(ValueError):
+        list(concurrently([1], [2], [3]) > join.inner(key=lambda x: x))
+
+
+@app.function
+@pytest.mark.parametrize(
+    "params",
+    [{"strategy": "nested"}, {"memory_limit": 0}, {"num_partitions": 0}]
+)
+def test_join_invalid(params):
+    with pytest.raises(ValueError):
+        join.inner(**params)
+
+
+if __name__ == "__main__":
+    app.run()
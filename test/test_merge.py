@@ -0,0 +1,154 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on merging concurrent iterations")
+
+with app.setup:
+    import asyncio
+    import marimo as mo  # noqa
+    import pytest
+    import time
+
+    from itercat import (  # type: ignore
+        concurrently,
+        head,
+        interleave,
+        mix,
+        zip,
+        zip_longest,
+    )
+    from _test import slowly
+
+
+@app.function
+def test_mix():
+    mixed = list(concurrently(a=range(5), b="xyz") > mix())
+    assert list(range(5)) == [t.data for t in mixed if t.label == "a"]
+    assert list("xyz") == [t.data for t in mixed if t.label == "b"]
+    assert {0, 1} == {t.label for t in concurrently(range(3), "ab") > mix()}
+
+
+@app.function
+def test_mix_first_available():
+    mixed = [
+        t.label
+        for t in concurrently(slow=slowly(range(3), 0.2), fast=slowly(range(3), 0.01))
+        > mix(1)
+    ]
+    assert ["fast"] * 3 + ["slow"] * 3 == mixed
+
+
+@app.function
+def test_mix_buffer_per_source():
+    produced = []
+
+    async def _fast():
+        n = 0
+        while True:
+            produced.append(n)
+            yield n
+            n += 1
+
+    async def _slow():
+        await asyncio.sleep(0.05)
+        yield "slow"
+
+    async def _run():
+        mixed = aiter(concurrently(fast=_fast(), slow=_slow()) > mix(4))
+        try:
+            assert 0 == (await anext(mixed)).data
+            await asyncio.sleep(0.1)
+            # One element consumed, 4 buffered, and one waiting for room.
+            assert len(produced) <= 6
+            # The fast source has not filled the buffer ahead of the slow one.
+            return [(await anext(mixed)).data for _ in range(5)]
+        finally:
+            await mixed.aclose()
+
+    assert "slow" in asyncio.run(_run())
+
+
+@app.function
+def test_interleave():
+    assert [0, "a", 1, "b", 2, 3] == list(concurrently(range(4), "ab") > interleave())
+    assert [0, 1] == list(concurrently(range(2), [], []) > interleave())
+    assert [] == list(concurrently() > interleave())
+
+
+@app.function
+def test_zip():
+    assert [(0, "a", True), (1, "b", False)] == list(
+        concurrently(range(4), "ab", [True, False, True]) > zip()
+    )
+    assert [] == list(concurrently() > zip())
+    assert [] == list(concurrently(range(3), []) > zip())
+
+
+@app.function
+def test_zip_longest():
+    assert [(0, "a"), (1, "b"), (2, "-"), (3, "-")] == list(
+        concurrently(range(4), "ab") > zip_longest("-")
+    )
+    assert [] == list(concurrently([], []) > zip_longest())
+
+
+@app.function
+@pytest.mark.parametrize(
+    "merging,num_expected",
+    [(mix(), 8), (interleave(), 8), (zip(), 4), (zip_longest(), 4)]
+)
+def test_merge_concurrent(merging, num_expected):
+    delay = 0.05
+    start = time.perf_counter()
+    merged = list(concurrently(slowly(range(4), delay), slowly(range(4), delay)) > merging)
+    # Pulling from both iterations in sequence would take 8 delays.
+    assert time.perf_counter() - start < 7 * delay
+    assert num_expected == len(merged)
+
+
+@app.function
+@pytest.mark.parametrize("merging", [mix(), interleave(), zip(), zip_longest()])
+def test_merge_exception(merging):
+    async def _failing():
+        yield 1
+        raise RuntimeError("oops")
+
+    with pytest.raises(RuntimeError):
+        list(concurrently(slowly(range(10), 0.01), _failing()) > merging)
+
+
+@app.function
+@pytest.mark.parametrize("merging", [mix(), interleave(), zip(), zip_longest()])
+def test_merge_stop_early(merging):
+    cancelled = []
+
+    async def _endless(name):
+        n = 0
+        try:
+            while True:
+                await asyncio.sleep(0)
+                yield n
+                n += 1
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    async def _take():
+        return [
+            x
+            async for x in concurrently(_endless("a"), _endless("b")) > merging | head(5)
+        ]
+
+    assert 5 == len(asyncio.run(_take()))
+    assert ["a", "b"] == sorted(cancelled)
+
+
+@app.function
+@pytest.mark.parametrize("make", [mix, interleave, zip])
+def test_merge_invalid(make):
+    with pytest.raises(ValueError):
+        make(0)
+
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,96 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on numeric batch stages")
+
+with app.setup:
+    from array import array
+    import marimo as mo  # noqa
+    from pathlib import Path
+    import pytest
+    import subprocess
+    import sys
+
+    import itercat  # type: ignore
+    from itercat import (  # type: ignore
+        batch_array,
+        filter_mask,
+        map,
+        map_batch,
+        unbatch,
+    )
+    from _test import count_async
+
+
+@app.function
+def test_batch_array_numpy():
+    np = pytest.importorskip("numpy")
+    batches = list(range(10) > batch_array(4, "q"))
+    assert all(isinstance(b, np.ndarray) and b.dtype == np.int64 for b in batches)
+    assert [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]] == [b.tolist() for b in batches]
+
+
+@app.function
+def test_numpy_pipeline():
+    np = pytest.importorskip("numpy")
+    chain = (
+        batch_array(8)
+        | map_batch(lambda b: b * 2.0)
+        | filter_mask(lambda b: np.remainder(b, 3.0) == 0.0)
+        | unbatch
+    )
+    expected = [float(x) for x in range(0, 60, 6)]
+    assert expected == list(range(30) > chain)
+    assert expected == list(count_async(30) > chain)
+
+
+@app.function
+def test_without_numpy(monkeypatch):
+    monkeypatch.setattr(itercat, "np", None)
+    batches = list(range(5) > batch_array(2, "l"))
+    assert all(isinstance(b, array) and b.typecode == "l" for b in batches)
+    assert [[0, 1], [2, 3], [4]] == [b.tolist() for b in batches]
+
+    chain = (
+        batch_array(4)
+        | map_batch(lambda b: array("d", (x * x for x in b)))
+        | filter_mask(lambda b: [x > 10.0 for x in b])
+        | unbatch
+    )
+    assert [16.0, 25.0, 36.0] == list(range(7) > chain)
+    assert [16.0, 25.0, 36.0] == list(count_async(7) > chain)
+
+
+@app.function
+def test_filter_mask_drops_empty_batches(monkeypatch):
+    monkeypatch.setattr(itercat, "np", None)
+    assert [array("d", [5.0]), array("d", [6.0])] == list(
+        range(7) > batch_array(3) | filter_mask(lambda b: [x > 4 for x in b])
+    )
+
+
+@app.function
+def test_unbatch_tuples():
+    assert [0, 1, 2, 3, 4] == list([(0, 1), (), (2, 3, 4)] > map(tuple) | unbatch)
+
+
+@app.function
+def test_batch_array_bad_size():
+    with pytest.raises(ValueError):
+        batch_array(0)
+
+
+@app.function
+def test_import_without_numpy():
+    code = "import sys; sys.modules['numpy'] = None; import itercat; print(itercat.np)"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=str(Path(itercat.__file__).parent.parent),
+    )
+    assert "None" == result.stdout.strip()
+
+
+if __name__ == "__main__":
+    app.run()
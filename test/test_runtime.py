@@ -0,0 +1,225 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on the shared event loop runtime")
+
+with app.setup:
+    import asyncio
+    import itertools as it
+    import marimo as mo  # noqa
+    from operator import add
+    import pytest
+    import threading
+    import time
+
+    from itercat import (  # type: ignore
+        concurrently,
+        cumulate,
+        dispatch,
+        map,
+        Runtime,
+        runtime_active,
+        set_runtime_default,
+        WrapperBicolor,
+    )
+    from _test import increment
+
+
+@app.function
+async def count_slowly(n):
+    for i in range(n):
+        await asyncio.sleep(0)
+        yield i
+
+
+@app.function
+def test_runtime_active_within_block():
+    assert runtime_active() is None
+    with Runtime() as runtime:
+        assert runtime_active() is runtime
+        assert runtime.is_running
+    assert runtime_active() is None
+    assert not runtime.is_running
+
+
+@app.function
+def test_runtime_nested_blocks():
+    with Runtime() as outer:
+        with Runtime() as inner:
+            assert runtime_active() is inner
+        assert runtime_active() is outer
+
+
+@app.function
+def test_runtime_bad_num_loops():
+    with pytest.raises(ValueError):
+        Runtime(0)
+
+
+@app.function
+@pytest.mark.parametrize("num_loops", [1, 3])
+def test_runtime_iterations(num_loops):
+    with Runtime(num_loops):
+        threads_before = set(threading.enumerate())
+        for _ in range(20):
+            assert [1, 2, 3, 4, 5] == list(count_slowly(5) > increment)
+        # Threads left over from earlier tests may end meanwhile; none may start.
+        assert not set(threading.enumerate()) - threads_before
+
+
+@app.function
+def test_runtime_transfer_on_loop_thread():
+    names = []
+
+    def record_thread(x):
+        names.append(threading.current_thread().name)
+        return x
+
+    with Runtime():
+        assert [0, 1, 2] == list(count_slowly(3) > map(record_thread))
+    assert all(name.startswith("itercat-runtime-") for name in names)
+
+
+@app.function
+def test_runtime_nested_synchronous_iteration():
+    def sum_of_range(n):
+        return sum(WrapperBicolor(count_slowly(n)))
+
+    with Runtime(num_loops=1):
+        assert [0, 0, 1, 3] == list(count_slowly(4) > map(sum_of_range))
+
+
+@app.function
+def test_runtime_concurrently_dispatch():
+    with Runtime():
+        iters = list(
+            concurrently(range(5), count_slowly(3))
+            > dispatch(cumulate(add, 0), increment)
+        )
+        assert [[0, 0, 1, 3, 6, 10], [1, 2, 3]] == [list(i) for i in iters]
+
+
+@app.function
+def test_runtime_early_exit():
+    closed = threading.Event()
+
+    async def _count():
+        try:
+            for n in it.count():
+                await asyncio.sleep(0)
+                yield n
+        finally:
+            closed.set()
+
+    with Runtime():
+        source = _count()  # Held, so that only closing it can run its finally clause.
+        elements = iter(WrapperBicolor(source))
+        assert [0, 1, 2] == [next(elements) for _ in range(3)]
+        elements.close()
+        assert closed.wait(timeout=5.0)
+
+
+@app.function
+def test_runtime_active_in_its_thread_only():
+    seen = []
+    with Runtime() as runtime:
+        th = threading.Thread(target=lambda: seen.append(runtime_active()))
+        th.start()
+        th.join()
+        assert runtime_active() is runtime
+    assert [None] == seen
+
+
+@app.function
+def in_threads(num_threads, target):
+    errors = []
+
+    def _run():
+        try:
+            target()
+        except Exception as ex:
+            errors.append(ex)
+
+    threads = [threading.Thread(target=_run) for _ in range(num_threads)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join(timeout=10.0)
+    assert not errors
+
+
+@app.function
+def test_runtime_shared_by_threads():
+    barrier = threading.Barrier(4)
+
+    def _enter_and_iterate():
+        with runtime:
+            barrier.wait(timeout=5.0)
+            assert [1, 2, 3] == list(count_slowly(3) > increment)
+            assert runtime_active() is runtime
+        # Leaving a block that didn't start the runtime leaves it running.
+        assert runtime_active() is None
+
+    with Runtime() as runtime:
+        in_threads(4, _enter_and_iterate)
+        assert runtime.is_running
+    assert not runtime.is_running
+
+
+@app.function
+def test_runtime_activate():
+    names = []
+
+    def _record_thread(x):
+        names.append(threading.current_thread().name)
+        return x
+
+    def _iterate_activated():
+        with runtime.activate():
+            assert runtime_active() is runtime
+            assert [0, 1] == list(count_slowly(2) > map(_record_thread))
+        assert runtime_active() is None
+
+    with Runtime() as runtime:
+        in_threads(2, _iterate_activated)
+        assert runtime.is_running
+    assert 4 == len(names)
+    assert all(name.startswith("itercat-runtime-") for name in names)
+
+
+@app.function
+def test_runtime_default():
+    seen = []
+    runtime = Runtime().start()
+    previous = set_runtime_default(runtime)
+    try:
+        in_threads(2, lambda: seen.append(runtime_active()))
+        with Runtime() as inner:
+            assert runtime_active() is inner
+        assert runtime_active() is runtime
+    finally:
+        assert runtime is set_runtime_default(previous)
+        runtime.shutdown()
+    assert [runtime, runtime] == seen
+    assert runtime_active() is None
+
+
+@app.function
+def test_runtime_shutdown_interrupts_iteration():
+    async def _forever():
+        yield 0
+        await asyncio.sleep(3600)
+        yield 1
+
+    with Runtime() as runtime:
+        iteration = iter(WrapperBicolor(_forever()))
+        assert 0 == next(iteration)
+        threading.Timer(0.1, runtime.shutdown).start()
+        start = time.monotonic()
+        with pytest.raises(RuntimeError):
+            next(iteration)
+        assert time.monotonic() - start < 5.0
+
+
+if __name__ == "__main__":
+    app.run()
@@ -0,0 +1,177 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on streaming sketches")
+
+with app.setup:
+    from collections import Counter
+    import marimo as mo  # noqa
+    import math
+    import pickle
+    import pytest
+    import random
+
+    from itercat import (  # type: ignore
+        agg,
+        count_distinct,
+        groupby,
+        HyperLogLog,
+        quantiles,
+        Reservoir,
+        sample,
+        TDigest,
+    )
+    from _test import collect_async, each_async
+
+
+@app.function
+def test_sample():
+    [picked] = list(range(1000) > sample(10, seed=3))
+    assert 10 == len(picked) == len(set(picked))
+    assert set(picked) <= set(range(1000))
+    assert [picked] == collect_async(each_async(range(1000)) > sample(10, seed=3))
+    assert [[0, 1, 2]] == [sorted(s) for s in range(3) > sample(10)]
+
+
+@app.function
+def test_sample_uniform():
+    counts = Counter()
+    for seed in range(2000):
+        for [picked] in [list(range(10) > sample(2, seed=seed))]:
+            counts.update(picked)
+    # Each element gets picked with probability 1/5.
+    assert all(abs(counts[n] / 2000 - 0.2) < 0.04 for n in range(10))
+
+
+@app.function
+def test_sample_weighted():
+    counts = Counter()
+    for seed in range(2000):
+        [picked] = list(["heavy", "light", "none"] > sample(
+            1,
+            weight={"heavy": 9.0, "light": 1.0, "none": 0.0}.get,
+            seed=seed
+        ))
+        counts.update(picked)
+    assert 0 == counts["none"]
+    assert abs(counts["heavy"] / 2000 - 0.9) < 0.03
+
+
+@app.function
+def test_sample_merge():
+    left = Reservoir(5, seed=1)
+    right = Reservoir(5, seed=2)
+    for n in range(100):
+        left.add(n)
+        right.add(100 + n)
+    merged = left.merge(right).result()
+    assert 5 == len(set(merged))
+    assert set(merged) <= set(range(200))
+
+
+@app.function
+@pytest.mark.parametrize("precision", [10, 14])
+def test_count_distinct(precision):
+    for n in [0, 10, 1000, 100_000]:
+        [estimate] = list((i % n for i in range(2 * n)) > count_distinct(precision))
+        error = 1.04 / math.sqrt(2 ** precision)
+        assert abs(estimate - n) <= max(4 * error * n, 1)
+
+
+@app.function
+def test_count_distinct_key_strings():
+    words = [f"word{i % 500}" for i in range(5000)]
+    [estimate] = list(words > count_distinct(key=str.upper))
+    assert abs(estimate - 500) < 10
+
+
+@app.function
+def test_count_distinct_merge():
+    [left] = list(range(0, 60_000) > count_distinct(sketch=True))
+    [right] = collect_async(each_async(range(40_000, 100_000)) > count_distinct(sketch=True))
+    assert abs(left.merge(right).result() - 100_000) < 4000
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+
+
+@app.function
+def test_count_distinct_running():
+    estimates = list(range(100) > count_distinct(every=25))
+    assert 4 == len(estimates)
+    assert estimates == sorted(estimates)
+    assert abs(estimates[-1] - 100) <= 2
+
+
+@app.function
+def test_quantiles():
+    rng = random.Random(8)
+    xs = [rng.gauss(0.0, 1.0) for _ in range(50_000)]
+    expected = sorted(xs)
+    qs = [0.001, 0.01, 0.5, 0.99, 0.999]
+    [estimates] = list(xs > quantiles(qs))
+    for q, estimate in zip(qs, estimates):
+        rank = sum(1 for x in expected if x <= estimate) / len(xs)
+        assert abs(rank - q) < max(0.01, q * (1 - q) * 0.05)
+
+
+@app.function
+def test_quantiles_small():
+    assert [[1.0]] == list([0, 1, 2] > quantiles([0.5]))
+    assert [[0.0, 4.5, 9.0]] == list(range(10) > quantiles([0.0, 0.5, 1.0]))
+    [[nothing]] = list([] > quantiles([0.5]))
+    assert math.isnan(nothing)
+
+
+@app.function
+def test_quantiles_running():
+    assert [[1.0], [2.5], [4.0], [4.5]] == list(range(10) > quantiles([0.5], every=3))
+    assert [[1.0], [2.5]] == list(range(6) > quantiles([0.5], every=3))
+
+
+@app.function
+def test_quantiles_merge():
+    [left] = list(range(0, 10_000, 2) > quantiles([0.5], sketch=True))
+    [right] = list(range(1, 10_000, 2) > quantiles([0.5], sketch=True))
+    [median] = left.merge(right).result()
+    assert abs(median - 4999.5) < 50
+    assert isinstance(left, TDigest)
+
+
+@app.function
+def test_sketch_aggregator_spills():
+    aggregation = {
+        "distinct": agg.sketch(lambda: HyperLogLog(10), of=lambda n: n // 2),
+        "median": agg.sketch(lambda: TDigest(qs=[0.5])),
+    }
+    grouping = groupby(lambda n: n % 3, aggregation, memory_limit=256, num_partitions=2)
+    results = {t.label: t.data for t in range(30_000) > grouping}
+    assert {0, 1, 2} == set(results)
+    for k, result in results.items():
+        assert abs(result["distinct"] - 10_000) < 1000
+        assert abs(result["median"][0] - 15_000) < 300
+
+
+@app.function
+def test_sketches_pickle():
+    for s in [Reservoir(3).add(1), HyperLogLog(8).add("a"), TDigest().add(1.0)]:
+        assert s.result() == pickle.loads(pickle.dumps(s)).result()
+
+
+@app.function
+@pytest.mark.parametrize(
+    "make",
+    [
+        lambda: sample(0),
+        lambda: count_distinct(3),
+        lambda: count_distinct(every=0),
+        lambda: quantiles([1.5]),
+        lambda: quantiles([0.5], compression=1),
+    ]
+)
+def test_sketch_invalid(make):
+    with pytest.raises(ValueError):
+        make()
+
+
+if __name__ == "__main__":
+    app.run()
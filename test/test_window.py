@@ -0,0 +1,216 @@
+import marimo
+
+__generated_with = "0.13.9"
+app = marimo.App(width="full", app_title="Unit tests on event-time windows")
+
+with app.setup:
+    import marimo as mo  # noqa
+    import pytest
+    import random
+
+    from itercat import (  # type: ignore
+        agg,
+        Aggregator,
+        tag,
+        Tagged,
+        window,
+        Window,
+    )
+    from _test import collect_async, each_async
+
+
+@app.function
+def at(event):
+    return event[0]
+
+
+@app.function
+def test_window_tumbling():
+    events = [(t, t * 10) for t in range(10)]
+    expected = [
+        Window(0, 4, [0, 10, 20, 30]),
+        Window(4, 8, [40, 50, 60, 70]),
+        Window(8, 12, [80, 90]),
+    ]
+    assert expected == [
+        Window(w.start, w.end, [v for _, v in w.result]) for w in events > window(at, 4)
+    ]
+    assert [6, 22, 17] == [
+        w.result for w in collect_async(each_async(range(10)) > window(
+            lambda t: t, 4, aggregate=agg.sum()
+        ))
+    ]
+
+
+@app.function
+def test_window_sliding():
+    assert [
+        Window(-2, 2, 2),
+        Window(0, 4, 4),
+        Window(2, 6, 4),
+        Window(4, 8, 2),
+        Window(6, 10, 1),
+        Window(8, 12, 1),
+    ] == list([0, 1, 2, 3, 4, 5, 9] > window(lambda t: t, 4, 2, aggregate=agg.count()))
+
+
+@app.function
+def test_window_negative_times():
+    assert [
+        Window(-6, -2, 1),
+        Window(-4, 0, 2),
+        Window(-2, 2, 1),
+        Window(2, 6, 1),
+        Window(4, 8, 1),
+    ] == list([-3, -1, 5] > window(lambda t: t, 4, 2, aggregate=agg.count()))
+
+
+@app.function
+def test_window_skips_empty():
+    assert [(10, 13), (11, 14), (12, 15), (100, 103), (101, 104), (102, 105)] == [
+        (w.start, w.end) for w in [12, 102] > window(lambda t: t, 3, 1)
+    ]
+
+
+@app.function
+def brute_force(times, size, slide, lateness):
+    """
+    Windows of the given times, each folded anew from the elements admitted by the
+    watermark, in the order they come out.
+    """
+    admitted = []
+    time_max = None
+    for t in times:
+        # Dropped when its pane ends before the watermark.
+        if time_max is not None and t // slide < (time_max - lateness) // slide:
+            continue
+        admitted.append(t)
+        time_max = t if time_max is None else max(time_max, t)
+    panes = sorted({t // slide for t in admitted})
+    num = size // slide
+    ends = sorted({p + i for p in panes for i in range(num)})
+    return [
+        Window(
+            (e - num + 1) * slide,
+            (e + 1) * slide,
+            sorted(t for t in admitted if (e - num + 1) * slide <= t < (e + 1) * slide)
+        )
+        for e in ends
+    ]
+
+
+@app.function
+@pytest.mark.parametrize("size,slide", [(5, 5), (6, 2), (10, 1), (12, 4)])
+def test_window_matches_brute_force(size, slide):
+    rng = random.Random(size * 100 + slide)
+    times = [max(0, t + rng.randint(-3, 0)) for t in range(0, 300, 2)]
+    windows = [
+        Window(w.start, w.end, sorted(w.result))
+        for w in times > window(lambda t: t, size, slide, lateness=3)
+    ]
+    assert brute_force(times, size, slide, 3) == windows
+
+
+@app.function
+def test_window_mixed_signs_match_brute_force():
+    rng = random.Random(7)
+    times = [t + rng.randint(-3, 0) for t in range(-100, 100, 2)]
+    windows = [
+        Window(w.start, w.end, sorted(w.result))
+        for w in times > window(lambda t: t, 6, 2, lateness=3)
+    ]
+    assert brute_force(times, 6, 2, 3) == windows
+
+
+@app.function
+def test_window_late_dropped():
+    assert [[1, 0], [2, 3], [5], [20, 21]] == [
+        w.result for w in [1, 2, 0, 5, 3, 20, 4, 21] > window(lambda t: t, 2, lateness=2)
+    ]
+    assert [[1], [2], [5], [20, 21]] == [
+        w.result for w in [1, 2, 0, 5, 3, 20, 4, 21] > window(lambda t: t, 2)
+    ]
+
+
+@app.function
+def test_window_emits_as_watermark_advances():
+    emitted = []
+
+    def _events():
+        for t in range(0, 20, 3):
+            emitted.append(t)
+            yield t
+
+    for w in _events() > window(lambda t: t, 5, lateness=1):
+        # A window comes out once the watermark passes its end, not at the end.
+        assert w.end <= emitted[-1] - 1 or len(emitted) == 7
+        if w.start == 0:
+            assert 3 == len(emitted)
+
+
+@app.function
+def test_window_composed_aggregators():
+    assert [
+        Window(0, 10, {"n": 10, "mean": 4.5, "max": 9}),
+        Window(5, 15, {"n": 10, "mean": 9.5, "max": 14}),
+        Window(10, 20, {"n": 5, "mean": 12.0, "max": 14}),
+    ] == list(range(15) > window(
+        lambda t: t,
+        10,
+        5,
+        aggregate={"n": agg.count(), "mean": agg.mean(), "max": agg.max()}
+    ))[1:]
+
+
+@app.function
+def test_window_merge_in_place():
+    def _extend(xs, ys):
+        xs.extend(ys)
+        return xs
+
+    def _append(xs, x):
+        xs.append(x)
+        return xs
+
+    gather = Aggregator(list, _append, merge=_extend)
+    times = list(range(40))
+    assert brute_force(times, 8, 2, 0) == [
+        Window(w.start, w.end, sorted(w.result))
+        for w in times > window(lambda t: t, 8, 2, aggregate=gather)
+    ]
+
+
+@app.function
+def test_window_by_label():
+    events = [("a", 0), ("b", 1), ("a", 3), ("b", 7), ("a", 9)]
+    windows = list(
+        events > (
+            tag(lambda e: e[0])
+            | window(lambda e: e[1], 5, aggregate=agg.count(), by_label=True)
+        )
+    )
+    assert all(isinstance(w, Tagged) for w in windows)
+    assert {("a", 0, 2), ("a", 5, 1), ("b", 0, 1), ("b", 5, 1)} == {
+        (w.label, w.data.start, w.data.result) for w in windows
+    }
+
+
+@app.function
+@pytest.mark.parametrize(
+    "params",
+    [
+        dict(size=0),
+        dict(size=5, slide=0),
+        dict(size=5, slide=2),
+        dict(size=2, slide=4),
+        dict(size=5, slide=1, aggregate=Aggregator(lambda: 0, lambda a, _: a)),
+        dict(size=5, lateness=-1),
+    ]
+)
+def test_window_invalid(params):
+    with pytest.raises(ValueError):
+        window(lambda t: t, **params)
+
+
+if __name__ == "__main__":
+    app.run()